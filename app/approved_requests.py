@@ -1,23 +1,92 @@
+import os
 import uuid
+import hashlib
 import requests
 import logging
 import json
-import requests
 import threading
-from flask import Blueprint, render_template, jsonify, redirect, url_for, request
-from db import requests_collection, deposit_requests_collection, transactions_collection
+from datetime import timedelta
+from functools import lru_cache
+from flask import Blueprint, Response, make_response, render_template, jsonify, redirect, url_for, request
+from db import requests_collection, deposit_requests_collection, transactions_collection, daily_rollups_collection
 from time_utils import now_bangkok, now_bangkok_and_utc
-from http_utils import build_correlation_headers, get_rest_api_ci_base_for_branch
-from services.request_status_service import enrich_request_status_records
+from http_utils import branch_id_for_base, build_correlation_headers, canonical_branch_id
+from branch_client import get_branch_client, get_breaker_states
+from circuit_breaker import CircuitOpenError
+from services.request_status_service import (
+    BRANCHES,
+    DATE_RANGES,
+    SECTIONS,
+    add_display_fields,
+    build_status_query,
+    enrich_request_status_records,
+    fetch_page,
+    resolve_date_range,
+)
+from services.status_transition_service import transition_status
+from metrics import observe_status_transition
+from services.daily_close_service import ClosedDayCache, dates_between, get_daily_close, sum_daily_close
+from services.export_service import EXPORTS, build_export_query, iter_csv
 from id_utils import generate_request_id
-
-# ✅ ตั้งค่า Logging ให้ใช้งานได้
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from branch_workers import BranchWorkerPool
+from cashout_sweeper import CashoutSweeper
+from socket_fanout import SocketFanout
+from pending_watcher import PendingWatcher
+from socket_cache import read_socket_latest, socket_latest_cache
+from sse import StreamSlots, iter_sse
+from config import Config
+from daily_rollups import (
+    ROLLUP_DEPOSIT_COMPLETED,
+    ROLLUP_EXPENSE,
+    ROLLUP_WITHDRAW_APPROVED,
+    get_daily_totals,
+    record_rollup,
+)
+
+# ✅ ตั้งค่า Logging ที่ main.py (log_utils.setup_logging: เขียนผ่านคิว ไม่ block request)
 logger = logging.getLogger(__name__)  # ✅ แก้ไขให้ประกาศ logger ที่นี่
 
 # สร้าง Blueprint สำหรับ Web UI / LIFF เงิน
 approved_requests_bp = Blueprint("approved_requests", __name__, template_folder="templates")
 
+# สถานที่รับเงิน -> branch_id ของเครื่อง REST_API_CI
+WITHDRAW_BRANCH_IDS = {
+    "โนนิโกะ": "NONIKO",
+    "คลังห้องเย็น": "Klangfrozen",
+}
+
+# worker สำหรับยิง /cashout/* ใน background (หนึ่งคิวต่อสาขา)
+cashout_workers = BranchWorkerPool(
+    "cashout",
+    workers_per_branch=Config.CASHOUT_WORKERS_PER_BRANCH,
+    queue_size=Config.CASHOUT_QUEUE_SIZE,
+)
+
+# ผลปิดยอดของวันที่ผ่านไปแล้ว (ไม่เปลี่ยน) ต่อ process
+daily_close_cache = ClosedDayCache()
+
+def _socket_session_end(session_key):
+    """
+    สถานะสุดท้ายของ session ฝากเงิน (completed / cancelled / error) จาก deposit_requests
+    None = ยังฝากอยู่ หรือไม่มีเอกสาร (session_id คือ deposit_request_id ทั้ง LIFF และ LINE bot)
+    LIFF บันทึกเอกสารตอนจบฝากเท่านั้น: ยกเลิกจาก LIFF ไม่มีเอกสาร poller ของ worker อื่นหยุดเมื่อไม่มีผู้ดูเกิน idle_timeout
+    """
+    doc = deposit_requests_collection.find_one({"deposit_request_id": session_key}, {"_id": 0, "status": 1})
+    status = (doc or {}).get("status")
+    return status if status and status != "replenishment_started" else None
+
+
+# poller /socket/latest หนึ่งตัวต่อ session ฝากเงิน (ต่อ process) กระจายยอดให้ทุกหน้าจอผ่าน SSE
+# จบ/ยกเลิกที่ worker ใดก็ตาม: poller ของทุก worker เห็นสถานะใน deposit_requests แล้วหยุดเอง
+socket_fanout = SocketFanout(
+    interval=Config.SOCKET_STREAM_POLL_INTERVAL,
+    idle_timeout=Config.SOCKET_STREAM_IDLE_TIMEOUT,
+    session_ended=_socket_session_end,
+    end_check_interval=Config.SOCKET_STREAM_END_CHECK_INTERVAL,
+)
+# SSE ทุก route ของ worker นี้ใช้โควตาเดียวกัน (แต่ละ stream ถือ thread ของ gthread ไว้ตลอด)
+sse_slots = StreamSlots(Config.SSE_MAX_STREAMS_PER_WORKER)
+
 def _is_withdraw_success(response_json: dict) -> bool:
     """
     Accept both legacy shape {\"transaction_status\":\"success\"}
@@ -41,6 +110,7 @@ def save_expense_to_transactions(request_data, location, amount, reason, date_bk
     """
     บันทึกค่าใช้จ่ายเงินสดลง transactions_collection สำหรับใช้ในระบบบัญชี
     ตามรูปแบบที่ใช้ใน klangfrozen (หน้า สรุปยอดเงินสิ้นวัน)
+    หนึ่งรายการต่อ request_id: เรียกซ้ำ (เช่น sweeper ทำต่อหลัง worker ตาย) จะไม่บันทึกซ้ำ
     
     Args:
         request_data: ข้อมูลคำขอเบิกเงิน
@@ -50,6 +120,9 @@ def save_expense_to_transactions(request_data, location, amount, reason, date_bk
         date_bkk: วันที่อนุมัติ (YYYY-MM-DD)
         now_bkk: datetime object เวลาไทย
         now_utc: datetime object UTC
+
+    Returns:
+        True ถ้ามีรายการค่าใช้จ่ายของคำขอนี้แล้ว (บันทึกใหม่หรือมีอยู่ก่อน)
     """
     try:
         # แปลง selectedStorage ตาม location
@@ -77,13 +150,29 @@ def save_expense_to_transactions(request_data, location, amount, reason, date_bk
             "created_at_utc": now_utc.isoformat(),
         }
         
-        # บันทึกลง transactions_collection
-        transactions_collection.insert_one(expense_doc)
+        # บันทึกลง transactions_collection (upsert ตาม request_id: มีอยู่แล้วก็ไม่เพิ่ม)
+        result = transactions_collection.update_one(
+            {"type": "expense", "request_id": expense_doc["request_id"]},
+            {"$setOnInsert": expense_doc},
+            upsert=True,
+        )
+        if result.upserted_id is None:
+            logger.warning(f"⚠️ มีค่าใช้จ่ายของคำขอ {expense_doc['request_id']} อยู่แล้ว ข้ามการบันทึกซ้ำ")
+            return True
+        record_rollup(
+            daily_rollups_collection,
+            date_bkk=date_bkk,
+            location=selected_storage,
+            rollup_type=ROLLUP_EXPENSE,
+            amount=amount,
+        )
         logger.info(f"✅ บันทึกค่าใช้จ่ายเงินสดลง transactions_collection สำเร็จ: request_id={request_data.get('request_id')}, location={selected_storage}, amount={amount}")
+        return True
         
     except Exception as e:
         logger.error(f"❌ ไม่สามารถบันทึกค่าใช้จ่ายเงินสดลง transactions_collection ได้: {str(e)}")
-        # ไม่ throw error เพราะการบันทึกค่าใช้จ่ายไม่ควรทำให้การอนุมัติล้มเหลว
+        # ไม่ throw error เพราะการบันทึกค่าใช้จ่ายไม่ควรทำให้การอนุมัติล้มเหลว (sweeper บันทึกให้ภายหลัง)
+        return False
 
 
 @approved_requests_bp.route("/money/liff", methods=["GET"])
@@ -96,56 +185,197 @@ def money_liff_home():
     """
     return render_template("money_liff.html")
 
+# field ที่หน้ารออนุมัติใช้ (ไม่ดึง status_history / cashout_*_response)
+PENDING_PROJECTION = {
+    "_id": 0,
+    "request_id": 1,
+    "location": 1,
+    "amount": 1,
+    "reason": 1,
+    "status": 1,
+    "created_at_bkk": 1,
+}
+
+
+def _pending_etag():
+    """
+    ETag ของรายการ pending จากจำนวน + เวลาสร้าง/อัปเดตล่าสุด
+    คำนวณด้วย $group อย่างเดียว ไม่ต้องอ่านรายการทั้งหมด
+    """
+    stats = next(
+        requests_collection.aggregate([
+            {"$match": {"status": "pending"}},
+            {
+                "$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "max_created": {"$max": "$created_at_utc"},
+                    "max_updated": {"$max": "$updated_at_utc"},
+                }
+            },
+        ]),
+        None,
+    ) or {}
+    raw = f"{stats.get('count', 0)}|{stats.get('max_created')}|{stats.get('max_updated')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=1)
+def _html_version():
+    """
+    เวอร์ชันของหน้า HTML: APP_VERSION + hash ของ template (คำนวณครั้งเดียวต่อ process)
+    template/JS เปลี่ยนแต่รายการ pending เหมือนเดิม ต้องไม่ได้ 304 กับหน้าเก่าที่ browser cache ไว้
+    """
+    path = os.path.join(os.path.dirname(__file__), "templates", "approved_requests.html")
+    with open(path, "rb") as f:
+        template_hash = hashlib.sha1(f.read()).hexdigest()[:8]
+    return f"{Config.APP_VERSION}{template_hash}"
+
+
+# change stream ของ withdraw_requests (ต่อ process) แจ้งหน้าอนุมัติทุกหน้าจอเมื่อมีคำขอใหม่/สถานะเปลี่ยน
+pending_watcher = PendingWatcher(
+    requests_collection,
+    fingerprint=lambda: _pending_etag(),
+    poll_interval=Config.PENDING_STREAM_POLL_INTERVAL,
+    idle_timeout=Config.PENDING_STREAM_IDLE_TIMEOUT,
+)
+
+
+def _pending_requests():
+    return list(requests_collection.find({"status": "pending"}, PENDING_PROJECTION).sort("created_at_bkk", -1))
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _sse_busy():
+    """stream เต็มโควตาของ worker: ให้หน้าเว็บ poll แทน"""
+    logger.warning(f"⚠️ [SSE] stream เต็ม ({sse_slots.limit} ต่อ worker): ตอบ 503")
+    response = jsonify({"status": "error", "message": "stream เต็ม กรุณาลองใหม่อีกครั้ง"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+def _sse_response(stream):
+    """
+    ห่อ generator เป็น response แบบ text/event-stream
+    คืนที่ใน sse_slots เมื่อ server ปิด response (รวมกรณี client ตัดก่อน generator เริ่ม)
+    """
+    response = Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(sse_slots.release)
+    return response
+
+
 @approved_requests_bp.route("/money/approved-requests", methods=["GET"])
 def get_approved_requests():
-    """ แสดงรายการที่รออนุมัติ (เรียงตามวันที่ล่าสุดก่อน) """
-    pending_requests = list(
-        requests_collection.find({"status": "pending"}, {"_id": 0}).sort("created_at_bkk", -1)
-    )
-    return render_template("approved_requests.html", requests=pending_requests)
+    """ แสดงรายการที่รออนุมัติ (เรียงตามวันที่ล่าสุดก่อน) ตอบ 304 ถ้ารายการไม่เปลี่ยน """
+    etag = f"html-{_html_version()}-{_pending_etag()}"
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+
+    response = make_response(render_template("approved_requests.html", requests=_pending_requests()))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
-@approved_requests_bp.route("/money/request-status", methods=["GET"])
-def request_status():
+
+@approved_requests_bp.route("/money/api/pending-requests", methods=["GET"])
+def api_pending_requests():
+    """ รายการที่รออนุมัติแบบ JSON (หน้าอนุมัติ poll แทนการ reload ทั้งหน้า) ตอบ 304 ถ้าไม่เปลี่ยน """
+    etag = f"json-{_pending_etag()}"
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+
+    response = jsonify({"status": "ok", "etag": etag, "data": _pending_requests()})
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@approved_requests_bp.route("/money/api/pending-stream", methods=["GET"])
+def api_pending_stream():
     """
-    แสดงสถานะคำขอ (สำเร็จ / ปฏิเสธ) แบบมีตัวกรอง:
-    - วันที่ (default = วันนี้ ตามเวลาไทย)
-    - สาขา (สถานที่รับเงิน) : ทั้งหมด / คลังห้องเย็น / โนนิโกะ
+    SSE ของรายการรออนุมัติ: event "pending" ทุกครั้งที่มีคำขอใหม่หรือสถานะเปลี่ยน
+    หน้าอนุมัติรับ event แล้วดึง /money/api/pending-requests ใหม่ (แทนการ reload/poll)
+    stream เต็มโควตาของ worker ตอบ 503 (หน้าอนุมัติ poll แทน)
     """
-    selected_date = request.args.get("date")
-    selected_branch = request.args.get("branch", "all")
+    if not sse_slots.try_acquire():
+        return _sse_busy()
+    try:
+        q = pending_watcher.subscribe()
+    except Exception:
+        sse_slots.release()
+        raise
 
-    # ถ้าไม่ส่งวันที่มา ให้ใช้วันที่ปัจจุบันตามเวลาไทย
-    if not selected_date:
-        selected_date = now_bangkok().date().isoformat()
+    def stream():
+        try:
+            yield from iter_sse(q)
+        finally:
+            pending_watcher.unsubscribe(q)
 
-    # คำขอเบิกเงิน (withdraw) จาก collection withdraw_requests
-    query = {
-        "status": {"$in": ["approved", "rejected", "awaiting_machine"]},
-        "created_date_bkk": selected_date,
-    }
+    return _sse_response(stream())
 
-    if selected_branch in ("คลังห้องเย็น", "โนนิโกะ"):
-        query["location"] = selected_branch
 
-    cursor = requests_collection.find(query, {"_id": 0}).sort("created_at_bkk", -1)
-    all_requests = list(cursor)
+def _request_status_filters():
+    """
+    อ่านตัวกรองของหน้า/API request-status จาก query string
+    คืนค่า (date, range, branch, วันเริ่ม, วันสิ้นสุด); ValueError ถ้าวันที่ไม่ถูกต้อง
+    """
+    selected_date = request.args.get("date") or now_bangkok().date().isoformat()
+    selected_range = request.args.get("range", "day")
+    if selected_range not in DATE_RANGES:
+        selected_range = "day"
+    selected_branch = request.args.get("branch", "all")
+    start_date, end_date = resolve_date_range(selected_date, selected_range)
+    return selected_date, selected_range, selected_branch, start_date, end_date
+
+
+def _request_status_page(section, start_date, end_date, branch, *, limit, cursor=None):
+    """อ่านหนึ่งหน้าของ section (approved / rejected / awaiting_machine / deposit)"""
+    kind, statuses, id_field = SECTIONS[section]
+    collection = requests_collection if kind == "withdraw" else deposit_requests_collection
+    query = build_status_query(start_date=start_date, end_date=end_date, statuses=statuses, branch=branch)
+    return fetch_page(collection, query, id_field=id_field, limit=limit, cursor=cursor)
 
-    approved_requests = [r for r in all_requests if r.get("status") == "approved"]
-    rejected_requests = [r for r in all_requests if r.get("status") == "rejected"]
 
+@approved_requests_bp.route("/money/request-status", methods=["GET"])
+def request_status():
+    """
+    แสดงสถานะคำขอ (สำเร็จ / ปฏิเสธ) แบบมีตัวกรอง:
+    - วันที่ (default = วันนี้ ตามเวลาไทย) และช่วง: วัน / สัปดาห์ / เดือน
+    - สาขา (สถานที่รับเงิน) : ทั้งหมด / คลังห้องเย็น / โนนิโกะ
+    แต่ละ section แสดงหน้าแรก แล้วโหลดเพิ่มผ่าน /money/api/request-status
+    """
+    try:
+        selected_date, selected_range, selected_branch, start_date, end_date = _request_status_filters()
+    except ValueError:
+        # วันที่ไม่ถูกต้อง: กลับไปใช้วันนี้
+        selected_date = now_bangkok().date().isoformat()
+        selected_range = "day"
+        selected_branch = request.args.get("branch", "all")
+        start_date = end_date = selected_date
+
+    limit = Config.REQUEST_STATUS_PAGE_SIZE
+    approved_requests, approved_cursor = _request_status_page(
+        "approved", start_date, end_date, selected_branch, limit=limit
+    )
+    rejected_requests, rejected_cursor = _request_status_page(
+        "rejected", start_date, end_date, selected_branch, limit=limit
+    )
     # ข้อมูลฝากเงิน (deposit) จาก collection deposit_requests (ระบบใหม่ - replenishment)
     # แสดงเฉพาะรายการที่เสร็จสิ้นแล้ว (status = "completed")
-    deposit_requests_query = {
-        "created_date_bkk": selected_date,
-        "status": "completed",
-    }
-    if selected_branch in ("คลังห้องเย็น", "โนนิโกะ"):
-        deposit_requests_query["location"] = selected_branch
-
-    deposit_requests_cursor = deposit_requests_collection.find(
-        deposit_requests_query, {"_id": 0}
-    ).sort("created_at_bkk", -1)
-    deposit_requests = list(deposit_requests_cursor)
+    deposit_requests, deposit_cursor = _request_status_page(
+        "deposit", start_date, end_date, selected_branch, limit=limit
+    )
 
     approved_requests, rejected_requests, deposit_requests = enrich_request_status_records(
         approved_requests=approved_requests,
@@ -153,487 +383,665 @@ def request_status():
         deposit_requests=deposit_requests,
     )
 
+    # ยอดรวมของช่วงที่เลือกจาก daily_rollups (ไม่ต้อง aggregate ข้อมูลดิบ)
+    try:
+        totals = get_daily_totals(
+            daily_rollups_collection,
+            start_date=start_date,
+            end_date=end_date,
+            location=selected_branch if selected_branch in BRANCHES else None,
+        )
+    except Exception as e:
+        logger.error(f"❌ [ROLLUP] อ่านยอดรวมไม่สำเร็จ: {str(e)}")
+        totals = None
+
     return render_template(
         "request_status.html",
+        totals=totals,
         approved_requests=approved_requests,
         rejected_requests=rejected_requests,
         deposit_requests=deposit_requests,
         selected_date=selected_date,
         selected_branch=selected_branch,
+        selected_range=selected_range,
+        range_start=start_date,
+        range_end=end_date,
+        approved_cursor=approved_cursor,
+        rejected_cursor=rejected_cursor,
+        deposit_cursor=deposit_cursor,
+    )
+
+
+@approved_requests_bp.route("/money/api/request-status", methods=["GET"])
+def api_request_status():
+    """
+    JSON ของหน้า request-status ทีละหน้า (keyset pagination ตาม created_at_bkk)
+    params: section, date, range (day/week/month), branch, cursor, limit
+    """
+    section = request.args.get("section", "approved")
+    if section not in SECTIONS:
+        return jsonify({"status": "error", "message": f"unknown section: {section}"}), 400
+
+    try:
+        _, selected_range, selected_branch, start_date, end_date = _request_status_filters()
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid date (YYYY-MM-DD)"}), 400
+
+    try:
+        limit = int(request.args.get("limit", Config.REQUEST_STATUS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid limit"}), 400
+    limit = max(1, min(limit, Config.REQUEST_STATUS_MAX_PAGE_SIZE))
+
+    try:
+        items, next_cursor = _request_status_page(
+            section, start_date, end_date, selected_branch, limit=limit, cursor=request.args.get("cursor")
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({
+        "status": "ok",
+        "section": section,
+        "range": {"name": selected_range, "start": start_date, "end": end_date},
+        "data": add_display_fields(items),
+        "next_cursor": next_cursor,
+    })
+
+
+@approved_requests_bp.route("/money/api/daily-rollups", methods=["GET"])
+def api_daily_rollups():
+    """
+    ยอดรวมรายวันต่อสาขา/ประเภทจาก daily_rollups (สำหรับ dashboard)
+    params: date, range (day/week/month), branch
+    """
+    try:
+        _, selected_range, selected_branch, start_date, end_date = _request_status_filters()
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid date (YYYY-MM-DD)"}), 400
+
+    query = {"created_date_bkk": {"$gte": start_date, "$lte": end_date}}
+    if selected_branch in BRANCHES:
+        query["location"] = selected_branch
+
+    rows = list(
+        daily_rollups_collection.find(query, {"_id": 0}).sort([("created_date_bkk", 1), ("location", 1), ("type", 1)])
+    )
+    return jsonify({
+        "status": "ok",
+        "range": {"name": selected_range, "start": start_date, "end": end_date},
+        "data": rows,
+        "totals": get_daily_totals(
+            daily_rollups_collection,
+            start_date=start_date,
+            end_date=end_date,
+            location=selected_branch if selected_branch in BRANCHES else None,
+        ),
+    })
+
+
+@approved_requests_bp.route("/money/api/daily-close", methods=["GET"])
+def api_daily_close():
+    """
+    ปิดยอดเงินสดสิ้นวันต่อสาขา: ยอดเบิก (approved), ยอดฝาก (completed), ค่าใช้จ่าย (transactions)
+    พร้อม net_cash และผลต่างเบิก-ค่าใช้จ่าย สำหรับกระทบยอด
+    params: date, range (day/week/month), branch, refresh=1 (ไม่ใช้ cache ของวันที่ปิดแล้ว)
+    """
+    try:
+        _, selected_range, selected_branch, start_date, end_date = _request_status_filters()
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid date (YYYY-MM-DD)"}), 400
+
+    try:
+        rows, cached_days = get_daily_close(
+            requests_collection,
+            deposit_collection=deposit_requests_collection,
+            transactions_collection_name=transactions_collection.name,
+            dates=dates_between(start_date, end_date),
+            today=now_bangkok().date().isoformat(),
+            cache=daily_close_cache,
+            location=selected_branch if selected_branch in BRANCHES else None,
+            refresh=request.args.get("refresh") == "1",
+        )
+    except Exception as e:
+        logger.error(f"❌ [DAILY-CLOSE] Error: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return jsonify({
+        "status": "ok",
+        "range": {"name": selected_range, "start": start_date, "end": end_date},
+        "data": rows,
+        "totals": sum_daily_close(rows),
+        "cached_days": cached_days,
+    })
+
+
+@approved_requests_bp.route("/money/export/<dataset>.csv", methods=["GET"])
+def export_csv(dataset):
+    """
+    ส่งออก withdraw_requests / deposit_requests / transactions เป็น CSV (เปิดใน Excel ได้)
+    stream ทีละชุดจาก cursor: เริ่มดาวน์โหลดทันทีและไม่สร้างไฟล์ทั้งก้อนในหน่วยความจำ
+    params: start, end (YYYY-MM-DD) หรือ date + range, branch
+    """
+    if dataset not in EXPORTS:
+        return jsonify({"status": "error", "message": f"unknown dataset: {dataset}"}), 404
+
+    try:
+        _, _, selected_branch, start_date, end_date = _request_status_filters()
+        start_date = request.args.get("start") or start_date
+        end_date = request.args.get("end") or end_date
+        dates_between(start_date, end_date)  # ตรวจรูปแบบวันที่
+    except ValueError:
+        return jsonify({"status": "error", "message": "invalid date (YYYY-MM-DD)"}), 400
+
+    collections = {
+        "withdraw_requests": requests_collection,
+        "deposit_requests": deposit_requests_collection,
+        "transactions": transactions_collection,
+    }
+    query, projection, sort_field = build_export_query(
+        dataset,
+        start_date=start_date,
+        end_date=end_date,
+        branch=selected_branch if selected_branch in BRANCHES else None,
+    )
+    cursor = (
+        collections[dataset]
+        .find(query, projection)
+        .sort(sort_field, 1)
+        .batch_size(Config.EXPORT_BATCH_SIZE)
+    )
+    filename = f"{dataset}_{start_date}_{end_date}.csv"
+    logger.info(f"📤 [EXPORT] ส่งออก {filename} (สาขา: {selected_branch})")
+
+    return Response(
+        iter_csv(cursor, EXPORTS[dataset]["columns"], batch_rows=Config.EXPORT_BATCH_SIZE),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
     )
 
 
 @approved_requests_bp.route("/money/approve/<request_id>", methods=["POST"])
 def approve_request(request_id):
-    """ อนุมัติคำขอ และส่ง API ถ้าจำเป็น """
+    """
+    อนุมัติคำขอ: ตั้งสถานะเป็น awaiting_machine แล้วส่งงาน cashout เข้าคิวของสาขา
+    ตอบกลับทันที (202) ให้หน้า UI ติดตามผลผ่าน /money/api/withdraw-status
+    """
 
     logger.info(f"📢 กำลังอนุมัติคำขอ: {request_id}")
 
-    # ✅ ค้นหาคำขอจากฐานข้อมูล
-    request_data = requests_collection.find_one({"request_id": request_id})
+    # ✅ pending -> awaiting_machine แบบ atomic (กันผู้อนุมัติสองคนกดพร้อมกันแล้วยิงเครื่องซ้ำ)
+    # พร้อมสถานะงาน cashout ใน MongoDB: ถ้า process ตายก่อนงานเสร็จ sweeper เก็บกู้ต่อได้
+    try:
+        request_data = transition_status(
+            requests_collection,
+            {"request_id": request_id},
+            from_status="pending",
+            to_status="awaiting_machine",
+            by="approver_ui",
+            set_fields={"cashout_job": _new_cashout_job(attempt=1)},
+            extra_filter={
+                "amount": {"$nin": [None, "", 0]},
+                "location": {"$in": list(WITHDRAW_BRANCH_IDS)},
+            },
+        )
+    except Exception as e:
+        logger.error(f"❌ อัปเดตสถานะ awaiting_machine ไม่สำเร็จ: {str(e)}")
+        return jsonify({"status": "error", "message": "อัปเดตสถานะไม่สำเร็จ"}), 500
 
     if not request_data:
-        logger.error(f"❌ ไม่พบคำขอ {request_id} ในระบบ")
-        return jsonify({"status": "error", "message": f"ไม่พบคำขอ {request_id} ในระบบ"}), 404
-
-    # ✅ ดึงค่าจำนวนเงิน และสถานที่
-    amount = request_data.get("amount")
-    location = request_data.get("location")
-    reason = request_data.get("reason", "")  # ✅ ดึงข้อมูลเหตุผลจากคำขอ
-    current_status = request_data.get("status")
+        # ไม่ match: หาเหตุผลเพื่อตอบกลับให้ถูกต้อง (เส้นทางนี้เกิดไม่บ่อย)
+        existing = requests_collection.find_one({"request_id": request_id})
+        if not existing:
+            logger.error(f"❌ ไม่พบคำขอ {request_id} ในระบบ")
+            return jsonify({"status": "error", "message": f"ไม่พบคำขอ {request_id} ในระบบ"}), 404
+
+        current_status = existing.get("status")
+        if current_status != "pending":
+            # ✅ อนุญาตให้อนุมัติได้เฉพาะสถานะ pending เท่านั้น ป้องกันการกดย้ำ
+            logger.warning(f"⚠️ คำขอ {request_id} มีสถานะ {current_status} อยู่แล้ว ข้ามการยิง API ซ้ำ")
+            return jsonify({
+                "status": "error",
+                "message": f"คำขอ {request_id} มีสถานะ {current_status} อยู่แล้ว",
+                "request_status": current_status,
+            }), 409
 
-    if not amount or not location:
         logger.error("❌ ข้อมูลคำขอไม่สมบูรณ์")
         return jsonify({"status": "error", "message": "ข้อมูลคำขอไม่สมบูรณ์"}), 400
 
-    # ✅ อนุญาตให้อนุมัติได้เฉพาะสถานะ pending เท่านั้น ป้องกันการกดย้ำ
-    if current_status != "pending":
-        logger.warning(f"⚠️ คำขอ {request_id} มีสถานะ {current_status} อยู่แล้ว ข้ามการยิง API ซ้ำ")
-        return redirect("/money/approved-requests")
+    logger.info(f"⏳ ตั้งสถานะคำขอ {request_id} เป็น awaiting_machine แล้ว")
+
+    # ✅ ส่งงานให้ worker ของสาขา (ไม่ถือ HTTP worker ไว้ระหว่างรอเครื่อง)
+    branch_id = WITHDRAW_BRANCH_IDS[request_data.get("location")]
+    if not cashout_workers.submit(branch_id, _process_cashout, request_id, branch_id, request_data):
+        # คิวเต็ม: คืนสถานะเป็น pending ให้กดอนุมัติใหม่ได้
+        transition_status(
+            requests_collection,
+            {"request_id": request_id},
+            from_status="awaiting_machine",
+            to_status="pending",
+            by="cashout_queue_full",
+        )
+        return jsonify({"status": "error", "message": "เครื่องเบิกเงินมีคิวเต็ม กรุณาลองใหม่อีกครั้ง"}), 503
+
+    return jsonify({
+        "status": "accepted",
+        "request_id": request_id,
+        "request_status": "awaiting_machine",
+        "status_url": f"/money/api/withdraw-status?id={request_id}",
+    }), 202
+
+
+def _set_cashout_error(request_id, machine_error, by="approver_ui"):
+    """awaiting_machine -> error พร้อมข้อความจากเครื่อง"""
+    transition_status(
+        requests_collection,
+        {"request_id": request_id},
+        from_status="awaiting_machine",
+        to_status="error",
+        by=by,
+        set_fields={"machine_error": machine_error},
+    )
+
+
+# ขั้นของงาน cashout (withdraw_requests.cashout_job.stage)
+# queued -> planning -> dispensing (ยิง /cashout/request แล้ว) -> dispensed -> approved (รอบันทึกค่าใช้จ่าย) -> done
+CASHOUT_STAGES_BEFORE_DISPENSE = ("queued", "planning")
+
+
+def _new_cashout_job(attempt, branch_id=None):
+    _, now_utc = now_bangkok_and_utc()
+    job = {"attempt": attempt, "stage": "queued", "updated_at_utc": now_utc.isoformat()}
+    if branch_id:
+        job["branch_id"] = branch_id
+    return job
+
+
+def _advance_cashout_job(request_id, attempt, from_stage, to_stage, set_fields=None, status="awaiting_machine"):
+    """
+    เลื่อน stage ของงาน cashout แบบมีเงื่อนไข (สถานะ + attempt + stage เดิม)
+    คืนค่า False ถ้างานนี้ถูก sweeper ส่งใหม่ (attempt เปลี่ยน) หรือคำขอเปลี่ยนสถานะไปแล้ว
+    """
+    _, now_utc = now_bangkok_and_utc()
+    fields = {"cashout_job.stage": to_stage, "cashout_job.updated_at_utc": now_utc.isoformat()}
+    if set_fields:
+        fields.update(set_fields)
+    result = requests_collection.update_one(
+        {"request_id": request_id, "status": status, "cashout_job.attempt": attempt, "cashout_job.stage": from_stage},
+        {"$set": fields},
+    )
+    return bool(result.matched_count)
+
+
+def _process_cashout(request_id, branch_id, request_data, attempt=1):
+    """
+    ทำงานใน background worker ของสาขา:
+    ยิง /cashout/plan -> /cashout/request แล้วอัปเดตสถานะเป็น approved หรือ error
+    ทุกขั้นบันทึกลง cashout_job ก่อนไปขั้นถัดไป (ดู sweep_stale_cashouts)
+    """
+    amount = request_data.get("amount")
+
+    client = get_branch_client(branch_id)
+    headers, correlation = build_correlation_headers(sale_id=request_id)
+
+    # claim งาน: ไม่ match ถ้า sweeper ส่งงานนี้ใหม่ไปแล้ว หรือคำขอไม่ได้รอเครื่องแล้ว
+    if not _advance_cashout_job(
+        request_id,
+        attempt,
+        "queued",
+        "planning",
+        {"cashout_job.branch_id": branch_id, "cashout_job.correlation": correlation},
+    ):
+        logger.warning(f"⚠️ [CASHOUT] งาน {request_id} (attempt {attempt}) ไม่อยู่ในคิวแล้ว ข้าม")
+        return
+
+    # ส่ง /cashout/request ไปแล้วหรือยัง: หลังจากนี้ timeout ไม่ได้แปลว่าเครื่องไม่จ่าย
+    dispatched = False
+    try:
+        # Step 1: ยิง API /cashout/plan เพื่อคำนวณ denominations
+        plan_url = client.url("/cashout/plan")
+        plan_payload = {
+            "amount": float(amount)  # แปลงเป็น float ตามที่ API ต้องการ
+        }
+
+        logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {plan_url}")
+        logger.debug("📤 [CASHOUT] /cashout/plan payload: %s", plan_payload)
+
+        plan_response = client.post("/cashout/plan", json=plan_payload, headers=headers, timeout=10)
+        plan_response.raise_for_status()
+        plan_data = plan_response.json()
+
+        if not plan_data.get("success"):
+            error_msg = plan_data.get("error", "Unknown error from /cashout/plan")
+            logger.error(f"❌ [CASHOUT] /cashout/plan failed: {error_msg}")
+            _set_cashout_error(request_id, f"/cashout/plan failed: {error_msg}")
+            return
+
+        # Step 2: รับ denominations จาก response
+        denominations = plan_data.get("denominations")
+        if not denominations:
+            logger.error(f"❌ [CASHOUT] ไม่พบ denominations ใน response จาก /cashout/plan")
+            _set_cashout_error(request_id, "ไม่พบ denominations ใน response")
+            return
+
+        logger.info("✅ [CASHOUT] ได้รับ denominations จาก /cashout/plan")
+        logger.debug("✅ [CASHOUT] denominations: %s", denominations)
+
+        if not _advance_cashout_job(
+            request_id,
+            attempt,
+            "planning",
+            "dispensing",
+            {"denominations": denominations, "cashout_plan_response": plan_data},
+        ):
+            logger.warning(f"⚠️ [CASHOUT] งาน {request_id} (attempt {attempt}) ถูก sweeper เก็บกู้ไปแล้ว ไม่ยิง /cashout/request")
+            return
+
+        # Step 3: ส่ง denominations ไปที่ /cashout/request
+        request_url = client.url("/cashout/request")
+        request_payload = {
+            "denominations": denominations
+        }
+
+        logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {request_url}")
+        logger.debug("📤 [CASHOUT] /cashout/request payload: %s", request_payload)
+
+        dispatched = True
+        cashout_response = client.post("/cashout/request", json=request_payload, headers=headers, timeout=10)
+        cashout_response.raise_for_status()
+        cashout_data = cashout_response.json()
+
+        if not cashout_data.get("success"):
+            error_msg = cashout_data.get("error", "Unknown error from /cashout/request")
+            logger.error(f"❌ [CASHOUT] /cashout/request failed: {error_msg}")
+            _set_cashout_error(request_id, f"/cashout/request failed: {error_msg}")
+            return
+
+        logger.info("✅ [CASHOUT] ส่ง /cashout/request สำเร็จ")
+        logger.debug("✅ [CASHOUT] /cashout/request response: %s", cashout_data)
+
+        # เครื่องจ่ายเงินแล้ว: เก็บผลไว้ก่อน ถ้า process ตายก่อน Step 4 sweeper ทำต่อจากตรงนี้
+        _advance_cashout_job(
+            request_id, attempt, "dispensing", "dispensed", {"cashout_request_response": cashout_data}
+        )
 
-    # ✅ ตั้งสถานะเป็น "รอการตอบรับจากเครื่องถอนเงิน" ทันทีที่กดอนุมัติ
+        # Step 4: อัปเดตสถานะเป็น approved (สำเร็จ) แล้วบันทึกค่าใช้จ่าย
+        _finish_cashout(request_id, request_data, denominations, plan_data, cashout_data)
+        logger.info(f"✅ อนุมัติคำขอ {request_id} - Cashout สำเร็จ")
+
+    except requests.exceptions.RequestException as e:
+        if dispatched and not isinstance(e, requests.exceptions.HTTPError):
+            # timeout / connection หลุดหลังส่งคำสั่งจ่าย: ไม่รู้ว่าเครื่องจ่ายไปหรือยัง
+            # คงสถานะ awaiting_machine (stage dispensing) ให้ sweeper ถามผลจากเครื่อง
+            logger.error(f"❌ [CASHOUT] ไม่ทราบผล /cashout/request ของ {request_id}: {str(e)} (รอตรวจกับเครื่อง)")
+            return
+        logger.error(f"❌ [CASHOUT] Request Exception: {str(e)}")
+        _set_cashout_error(request_id, f"Request exception: {str(e)}")
+    except Exception as e:
+        if dispatched:
+            # ส่งคำสั่งจ่ายไปแล้ว (เช่น response อ่านไม่ได้ หรือบันทึกผลไม่สำเร็จ): เครื่องอาจจ่ายเงินไปแล้ว
+            # ห้ามตั้ง error (ผู้อนุมัติกดซ้ำแล้วจ่ายสองครั้ง) คง stage dispensing/dispensed ให้ sweeper เก็บกู้
+            logger.error(f"❌ [CASHOUT] Error หลังส่ง /cashout/request ของ {request_id}: {str(e)} (รอ sweeper ตรวจ)")
+            return
+        logger.error(f"❌ [CASHOUT] Error: {str(e)}")
+        _set_cashout_error(request_id, str(e))
+
+
+def _finish_cashout(request_id, request_data, denominations, plan_data, cashout_data, by="approver_ui"):
+    """Step 4 หลังเครื่องจ่ายเงิน: awaiting_machine -> approved แล้วบันทึกค่าใช้จ่าย"""
+    amount = request_data.get("amount")
+    location = request_data.get("location")
     now_bkk, now_utc = now_bangkok_and_utc()
     date_bkk = now_bkk.date().isoformat()
-    try:
+
+    approved = transition_status(
+        requests_collection,
+        {"request_id": request_id},
+        from_status="awaiting_machine",
+        to_status="approved",
+        by=by,
+        set_fields={
+            "denominations": denominations,
+            "cashout_plan_response": plan_data,
+            "cashout_request_response": cashout_data,
+            "cashout_job.stage": "approved",
+            "cashout_job.updated_at_utc": now_utc.isoformat(),
+            # หน้าปิดยอดนับยอดเบิกตามวันที่อนุมัติ (วันเดียวกับ selectedDate ของค่าใช้จ่าย)
+            "approved_date_bkk": date_bkk,
+        },
+        projection={"_id": 0, "request_id": 1},
+    )
+    if approved:
+        record_rollup(
+            daily_rollups_collection,
+            date_bkk=request_data.get("created_date_bkk") or date_bkk,
+            location=location,
+            rollup_type=ROLLUP_WITHDRAW_APPROVED,
+            amount=amount,
+        )
+    else:
+        # เครื่องจ่ายเงินไปแล้ว จึงยังบันทึกค่าใช้จ่ายต่อ แต่แจ้งเตือนไว้ตรวจสอบ
+        logger.error(f"❌ คำขอ {request_id} ไม่อยู่ในสถานะ awaiting_machine ขณะบันทึกผล approved")
+
+    _record_cashout_expense(request_id, request_data, date_bkk, now_bkk, now_utc)
+
+
+def _record_cashout_expense(request_id, request_data, date_bkk, now_bkk, now_utc):
+    """บันทึกค่าใช้จ่ายเงินสดลง transactions_collection แล้วปิดงาน cashout (stage approved -> done)"""
+    saved = save_expense_to_transactions(
+        request_data,
+        request_data.get("location"),
+        request_data.get("amount"),
+        request_data.get("reason", ""),
+        date_bkk,
+        now_bkk,
+        now_utc,
+    )
+    if saved:
         requests_collection.update_one(
-            {"request_id": request_id},
-            {
-                "$set": {
-                    "status": "awaiting_machine",
-                    "updated_at_bkk": now_bkk.isoformat(),
-                    "updated_at_utc": now_utc.isoformat(),
-                },
-                "$push": {
-                    "status_history": {
-                        "status": "awaiting_machine",
-                        "at_bkk": now_bkk.isoformat(),
-                        "at_utc": now_utc.isoformat(),
-                        "date_bkk": date_bkk,
-                        "by": "approver_ui",
-                    }
-                },
-            },
+            {"request_id": request_id, "cashout_job.stage": "approved"},
+            {"$set": {"cashout_job.stage": "done", "cashout_job.updated_at_utc": now_utc.isoformat()}},
         )
-        logger.info(f"⏳ ตั้งสถานะคำขอ {request_id} เป็น awaiting_machine แล้ว")
-    except Exception as e:
-        logger.error(f"❌ อัปเดตสถานะ awaiting_machine ไม่สำเร็จ: {str(e)}")
-        return jsonify({"status": "error", "message": "อัปเดตสถานะไม่สำเร็จ"}), 500
 
-    # ✅ กรณีสถานที่รับเงินเป็น "โนนิโกะ"
-    if location == "โนนิโกะ":
-        base = get_rest_api_ci_base_for_branch("NONIKO")
-        headers, meta = build_correlation_headers(sale_id=request_id)
-        trace_id = meta["trace_id"]
-        request_header_id = meta["request_id"]
 
-        try:
-            # Step 1: ยิง API /cashout/plan เพื่อคำนวณ denominations
-            plan_url = f"{base}/cashout/plan"
-            plan_payload = {
-                "amount": float(amount)  # แปลงเป็น float ตามที่ API ต้องการ
-            }
-            
-            logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {plan_url} ด้วย Payload: {plan_payload}")
-            
-            plan_response = requests.post(plan_url, json=plan_payload, headers=headers, timeout=10)
-            plan_response.raise_for_status()
-            plan_data = plan_response.json()
-            
-            if not plan_data.get("success"):
-                error_msg = plan_data.get("error", "Unknown error from /cashout/plan")
-                logger.error(f"❌ [CASHOUT] /cashout/plan failed: {error_msg}")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": f"/cashout/plan failed: {error_msg}",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": f"/cashout/plan failed: {error_msg}"}), 500
-            
-            # Step 2: รับ denominations จาก response
-            denominations = plan_data.get("denominations")
-            if not denominations:
-                logger.error(f"❌ [CASHOUT] ไม่พบ denominations ใน response จาก /cashout/plan")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": "ไม่พบ denominations ใน response",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": "ไม่พบ denominations ใน response"}), 500
-            
-            logger.info(f"✅ [CASHOUT] ได้รับ denominations จาก /cashout/plan: {denominations}")
-            
-            # Step 3: ส่ง denominations ไปที่ /cashout/request
-            request_url = f"{base}/cashout/request"
-            request_payload = {
-                "denominations": denominations
-            }
-            
-            logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {request_url} ด้วย Payload: {request_payload}")
-            
-            request_response = requests.post(request_url, json=request_payload, headers=headers, timeout=10)
-            request_response.raise_for_status()
-            request_data = request_response.json()
-            
-            if not request_data.get("success"):
-                error_msg = request_data.get("error", "Unknown error from /cashout/request")
-                logger.error(f"❌ [CASHOUT] /cashout/request failed: {error_msg}")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": f"/cashout/request failed: {error_msg}",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": f"/cashout/request failed: {error_msg}"}), 500
-            
-            logger.info(f"✅ [CASHOUT] ส่ง /cashout/request สำเร็จ: {request_data}")
-            
-            # Step 4: อัปเดตสถานะเป็น approved (สำเร็จ)
-            now_bkk, now_utc = now_bangkok_and_utc()
-            date_bkk = now_bkk.date().isoformat()
-            
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "approved",
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                        "denominations": denominations,
-                        "cashout_plan_response": plan_data,
-                        "cashout_request_response": request_data,
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "approved",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": date_bkk,
-                            "by": "approver_ui",
-                        }
-                    },
-                },
-            )
-            
-            # บันทึกค่าใช้จ่ายเงินสดลง transactions_collection สำหรับใช้ในระบบบัญชี
-            save_expense_to_transactions(request_data, location, amount, reason, date_bkk, now_bkk, now_utc)
-            logger.info(f"✅ อนุมัติคำขอ {request_id} - Cashout สำเร็จ")
-            return redirect("/money/approved-requests")
+# ผลการถามเครื่องเรื่องคำสั่งจ่ายที่ไม่รู้ผล
+MACHINE_DISPENSED = "dispensed"
+MACHINE_NOT_DISPENSED = "not_dispensed"
+MACHINE_UNKNOWN = "unknown"
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ [CASHOUT] Request Exception: {str(e)}")
-            now_bkk, now_utc = now_bangkok_and_utc()
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "error",
-                        "machine_error": f"Request exception: {str(e)}",
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "error",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": now_bkk.date().isoformat(),
-                            "by": "approver_ui",
-                        }
-                    },
-                },
+
+def _query_machine_cashout(branch_id, request_id, correlation=None):
+    """
+    ถามเครื่องว่าคำสั่งจ่ายของคำขอนี้ (X-Sale-Id = request_id) จ่ายไปแล้วหรือไม่
+    คืนค่า (ผล, response) โดยผลเป็น MACHINE_UNKNOWN เมื่อเครื่องตอบไม่ได้หรือไม่รองรับ
+    """
+    if not Config.CASHOUT_STATUS_PATH:
+        return MACHINE_UNKNOWN, None
+    correlation = correlation or {}
+    headers, _ = build_correlation_headers(sale_id=request_id, trace_id=correlation.get("trace_id"))
+    try:
+        response = get_branch_client(branch_id).get(
+            Config.CASHOUT_STATUS_PATH, params={"sale_id": request_id}, headers=headers, timeout=10
+        )
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, CircuitOpenError, ValueError) as e:
+        logger.error(f"❌ [CASHOUT-SWEEP] ถามผล cashout ของ {request_id} จากเครื่องไม่สำเร็จ: {str(e)}")
+        return MACHINE_UNKNOWN, None
+    if not data.get("success"):
+        return MACHINE_UNKNOWN, data
+    if data.get("found") is False:
+        return MACHINE_NOT_DISPENSED, data
+    if _is_withdraw_success(data):
+        return MACHINE_DISPENSED, data
+    return MACHINE_UNKNOWN, data
+
+
+def _requeue_cashout(doc, attempt):
+    """ส่งงานที่ยังไม่ถึงขั้นจ่ายเงินเข้าคิวใหม่ (attempt ถัดไป) หรือ error เมื่อครบจำนวนครั้ง"""
+    request_id = doc["request_id"]
+    if attempt > Config.CASHOUT_MAX_ATTEMPTS:
+        logger.error(f"❌ [CASHOUT-SWEEP] คำขอ {request_id} cashout ไม่สำเร็จครบ {Config.CASHOUT_MAX_ATTEMPTS} ครั้ง")
+        _set_cashout_error(
+            request_id, f"cashout ไม่เสร็จภายใน {Config.CASHOUT_MAX_ATTEMPTS} ครั้ง", by="cashout_sweeper"
+        )
+        return
+    branch_id = WITHDRAW_BRANCH_IDS[doc["location"]]
+    requests_collection.update_one(
+        {"request_id": request_id, "status": "awaiting_machine"},
+        {"$set": {"cashout_job": _new_cashout_job(attempt, branch_id)}},
+    )
+    if not cashout_workers.submit(branch_id, _process_cashout, request_id, branch_id, doc, attempt):
+        # คิวเต็ม: ยังเป็น queued รอ sweep รอบถัดไป
+        logger.warning(f"⚠️ [CASHOUT-SWEEP] คิวของสาขา {branch_id} เต็ม เลื่อนคำขอ {request_id} ไปรอบหน้า")
+
+
+def _recover_cashout(doc) -> bool:
+    """
+    เก็บกู้คำขอหนึ่งรายการที่งาน cashout ค้าง ตาม stage ล่าสุดใน cashout_job
+    คืนค่า False ถ้า sweeper ของ worker อื่นรับไปก่อน
+    """
+    request_id = doc["request_id"]
+    job = doc.get("cashout_job") or {}
+    stage = job.get("stage")
+
+    # claim แบบ atomic (ทุก worker รัน sweeper): ขยับ updated_at_utc ของงานให้ตัวอื่นไม่เห็นว่าค้าง
+    claim = {"request_id": request_id, "status": doc["status"]}
+    if job:
+        claim.update({
+            "cashout_job.stage": stage,
+            "cashout_job.attempt": job.get("attempt"),
+            "cashout_job.updated_at_utc": job.get("updated_at_utc"),
+        })
+    else:
+        claim["cashout_job"] = {"$exists": False}
+    now_bkk, now_utc = now_bangkok_and_utc()
+    if not requests_collection.update_one(claim, {"$set": {"cashout_job.updated_at_utc": now_utc.isoformat()}}).matched_count:
+        return False
+
+    logger.warning(f"⚠️ [CASHOUT-SWEEP] คำขอ {request_id} ค้างที่ {doc['status']}/{stage or 'ไม่มี cashout_job'}")
+
+    if stage == "approved":
+        # อนุมัติแล้วแต่ยังไม่มีค่าใช้จ่าย: วันที่ของค่าใช้จ่ายคือวันที่อนุมัติ
+        date_bkk = doc.get("approved_date_bkk") or now_bkk.date().isoformat()
+        _record_cashout_expense(request_id, doc, date_bkk, now_bkk, now_utc)
+    elif stage == "dispensed":
+        _finish_cashout(
+            request_id,
+            doc,
+            doc.get("denominations"),
+            doc.get("cashout_plan_response"),
+            doc.get("cashout_request_response"),
+            by="cashout_sweeper",
+        )
+    elif stage in CASHOUT_STAGES_BEFORE_DISPENSE:
+        # ยังไม่ได้ส่งคำสั่งจ่าย: ส่งใหม่ได้อย่างปลอดภัย
+        _requeue_cashout(doc, job.get("attempt", 0) + 1)
+    else:
+        # ส่งคำสั่งจ่ายไปแล้ว (หรือคำขอเก่าที่ไม่มี cashout_job): ต้องถามเครื่องก่อน ห้ามจ่ายซ้ำ
+        branch_id = job.get("branch_id") or WITHDRAW_BRANCH_IDS.get(doc.get("location"))
+        outcome, data = _query_machine_cashout(branch_id, request_id, job.get("correlation"))
+        if outcome == MACHINE_DISPENSED:
+            _finish_cashout(
+                request_id,
+                doc,
+                doc.get("denominations") or data.get("denominations"),
+                doc.get("cashout_plan_response"),
+                data,
+                by="cashout_sweeper",
             )
-            return jsonify({"status": "error", "message": f"Request exception: {str(e)}"}), 500
-        except Exception as e:
-            logger.error(f"❌ [CASHOUT] Error: {str(e)}")
-            now_bkk, now_utc = now_bangkok_and_utc()
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "error",
-                        "machine_error": str(e),
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "error",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": now_bkk.date().isoformat(),
-                            "by": "approver_ui",
-                        }
-                    },
-                },
+        elif outcome == MACHINE_NOT_DISPENSED:
+            _requeue_cashout(doc, job.get("attempt", 0) + 1)
+        else:
+            logger.error(f"❌ [CASHOUT-SWEEP] ไม่ทราบว่าเครื่องจ่ายเงินของคำขอ {request_id} แล้วหรือยัง: ต้องตรวจสอบกับเครื่อง")
+            _set_cashout_error(
+                request_id, "ไม่ทราบผลจากเครื่อง: ต้องตรวจสอบกับเครื่องก่อนอนุมัติใหม่", by="cashout_sweeper"
             )
-            return jsonify({"status": "error", "message": str(e)}), 500
-    elif location == "คลังห้องเย็น":
-        base = get_rest_api_ci_base_for_branch("Klangfrozen")
-        headers, meta = build_correlation_headers(sale_id=request_id)
-        trace_id = meta["trace_id"]
-        request_header_id = meta["request_id"]
+    return True
 
-        try:
-            # Step 1: ยิง API /cashout/plan เพื่อคำนวณ denominations
-            plan_url = f"{base}/cashout/plan"
-            plan_payload = {
-                "amount": float(amount)  # แปลงเป็น float ตามที่ API ต้องการ
-            }
-            
-            logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {plan_url} ด้วย Payload: {plan_payload}")
-            
-            plan_response = requests.post(plan_url, json=plan_payload, headers=headers, timeout=10)
-            plan_response.raise_for_status()
-            plan_data = plan_response.json()
-            
-            if not plan_data.get("success"):
-                error_msg = plan_data.get("error", "Unknown error from /cashout/plan")
-                logger.error(f"❌ [CASHOUT] /cashout/plan failed: {error_msg}")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": f"/cashout/plan failed: {error_msg}",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": f"/cashout/plan failed: {error_msg}"}), 500
-            
-            # Step 2: รับ denominations จาก response
-            denominations = plan_data.get("denominations")
-            if not denominations:
-                logger.error(f"❌ [CASHOUT] ไม่พบ denominations ใน response จาก /cashout/plan")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": "ไม่พบ denominations ใน response",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": "ไม่พบ denominations ใน response"}), 500
-            
-            logger.info(f"✅ [CASHOUT] ได้รับ denominations จาก /cashout/plan: {denominations}")
-            
-            # Step 3: ส่ง denominations ไปที่ /cashout/request
-            request_url = f"{base}/cashout/request"
-            request_payload = {
-                "denominations": denominations
-            }
-            
-            logger.info(f"📤 [CASHOUT] กำลังส่ง API ไปยัง {request_url} ด้วย Payload: {request_payload}")
-            
-            request_response = requests.post(request_url, json=request_payload, headers=headers, timeout=10)
-            request_response.raise_for_status()
-            request_data = request_response.json()
-            
-            if not request_data.get("success"):
-                error_msg = request_data.get("error", "Unknown error from /cashout/request")
-                logger.error(f"❌ [CASHOUT] /cashout/request failed: {error_msg}")
-                now_bkk, now_utc = now_bangkok_and_utc()
-                requests_collection.update_one(
-                    {"request_id": request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "machine_error": f"/cashout/request failed: {error_msg}",
-                            "updated_at_bkk": now_bkk.isoformat(),
-                            "updated_at_utc": now_utc.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk.isoformat(),
-                                "at_utc": now_utc.isoformat(),
-                                "date_bkk": now_bkk.date().isoformat(),
-                                "by": "approver_ui",
-                            }
-                        },
-                    },
-                )
-                return jsonify({"status": "error", "message": f"/cashout/request failed: {error_msg}"}), 500
-            
-            logger.info(f"✅ [CASHOUT] ส่ง /cashout/request สำเร็จ: {request_data}")
-            
-            # Step 4: อัปเดตสถานะเป็น approved (สำเร็จ)
-            now_bkk, now_utc = now_bangkok_and_utc()
-            date_bkk = now_bkk.date().isoformat()
-            
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "approved",
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                        "denominations": denominations,
-                        "cashout_plan_response": plan_data,
-                        "cashout_request_response": request_data,
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "approved",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": date_bkk,
-                            "by": "approver_ui",
-                        }
-                    },
-                },
-            )
-            
-            # บันทึกค่าใช้จ่ายเงินสดลง transactions_collection สำหรับใช้ในระบบบัญชี
-            save_expense_to_transactions(request_data, location, amount, reason, date_bkk, now_bkk, now_utc)
-            logger.info(f"✅ อนุมัติคำขอ {request_id} - Cashout สำเร็จ")
-            return redirect("/money/approved-requests")
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ [CASHOUT] Request Exception: {str(e)}")
-            now_bkk, now_utc = now_bangkok_and_utc()
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "error",
-                        "machine_error": f"Request exception: {str(e)}",
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "error",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": now_bkk.date().isoformat(),
-                            "by": "approver_ui",
-                        }
-                    },
-                },
-            )
-            return jsonify({"status": "error", "message": f"Request exception: {str(e)}"}), 500
+def sweep_stale_cashouts(stale_seconds=None, limit=100) -> int:
+    """
+    หาคำขอที่งาน cashout ไม่ขยับเกิน stale_seconds (worker ที่ถืองานตายไป) แล้วเก็บกู้ทีละรายการ
+    - awaiting_machine: ส่งใหม่ / ทำ Step 4 ต่อ / ถามผลจากเครื่อง ตาม stage
+    - approved ที่ยังไม่ได้บันทึกค่าใช้จ่าย: บันทึกให้
+    คืนค่าจำนวนคำขอที่เก็บกู้
+    """
+    stale_seconds = Config.CASHOUT_STALE_SECONDS if stale_seconds is None else stale_seconds
+    _, now_utc = now_bangkok_and_utc()
+    cutoff = (now_utc - timedelta(seconds=stale_seconds)).isoformat()
+    query = {
+        "$or": [
+            {"status": "awaiting_machine", "cashout_job.updated_at_utc": {"$lt": cutoff}},
+            {"status": "awaiting_machine", "cashout_job": {"$exists": False}, "updated_at_utc": {"$lt": cutoff}},
+            {"status": "approved", "cashout_job.stage": "approved", "cashout_job.updated_at_utc": {"$lt": cutoff}},
+        ]
+    }
+    recovered = 0
+    for doc in requests_collection.find(query, {"_id": 0, "status_history": 0}).limit(limit):
+        try:
+            if _recover_cashout(doc):
+                recovered += 1
         except Exception as e:
-            logger.error(f"❌ [CASHOUT] Error: {str(e)}")
-            now_bkk, now_utc = now_bangkok_and_utc()
-            requests_collection.update_one(
-                {"request_id": request_id},
-                {
-                    "$set": {
-                        "status": "error",
-                        "machine_error": str(e),
-                        "updated_at_bkk": now_bkk.isoformat(),
-                        "updated_at_utc": now_utc.isoformat(),
-                    },
-                    "$push": {
-                        "status_history": {
-                            "status": "error",
-                            "at_bkk": now_bkk.isoformat(),
-                            "at_utc": now_utc.isoformat(),
-                            "date_bkk": now_bkk.date().isoformat(),
-                            "by": "approver_ui",
-                        }
-                    },
-                },
-            )
-            return jsonify({"status": "error", "message": str(e)}), 500
+            logger.error(f"❌ [CASHOUT-SWEEP] เก็บกู้คำขอ {doc.get('request_id')} ไม่สำเร็จ: {str(e)}")
+    return recovered
+
+
+# เริ่มจาก main.py (และ post_fork ของ gunicorn) ไม่ใช่ตอน import: test ที่ import โมดูลนี้ไม่ต้องมี thread
+cashout_sweeper = CashoutSweeper(sweep_stale_cashouts, interval=Config.CASHOUT_SWEEP_INTERVAL)
+
+
+@approved_requests_bp.route("/money/api/withdraw-status", methods=["GET"])
+def api_withdraw_status():
+    """สถานะล่าสุดของคำขอเบิกเงิน สำหรับหน้า UI ที่รอผลจากเครื่อง (awaiting_machine -> approved / error)"""
+    request_id = request.args.get("id") or request.args.get("request_id")
+    if not request_id:
+        return jsonify({"status": "error", "message": "missing request_id"}), 400
+    doc = requests_collection.find_one(
+        {"request_id": request_id},
+        {"_id": 0, "request_id": 1, "status": 1, "machine_error": 1, "amount": 1, "location": 1, "updated_at_bkk": 1},
+    )
+    if not doc:
+        return jsonify({"status": "error", "message": "not found"}), 404
+    resp = {
+        "request_id": doc.get("request_id"),
+        "status": doc.get("status"),
+        "machine_error": doc.get("machine_error"),
+        "amount": doc.get("amount"),
+        "location": doc.get("location"),
+        "updated_at_bkk": doc.get("updated_at_bkk"),
+    }
+    return jsonify({"status": "ok", "data": resp})
 
 @approved_requests_bp.route("/money/reject/<request_id>", methods=["POST"])
 def reject_request(request_id):
-    """ ปฏิเสธคำขอและอัปเดตสถานะใน MongoDB """
-    now_bkk, now_utc = now_bangkok_and_utc()
-    date_bkk = now_bkk.date().isoformat()
-
-    requests_collection.update_one(
+    """
+    ปฏิเสธคำขอและอัปเดตสถานะใน MongoDB (เฉพาะคำขอที่ยัง pending)
+    สำเร็จ: redirect กลับหน้าอนุมัติ / ไม่ใช่ pending แล้ว: 409 / ไม่พบ: 404 (เหมือน approve)
+    """
+    rejected = transition_status(
+        requests_collection,
         {"request_id": request_id},
-        {
-            "$set": {
-                "status": "rejected",
-                "updated_at_bkk": now_bkk.isoformat(),
-                "updated_at_utc": now_utc.isoformat(),
-            },
-            "$push": {
-                "status_history": {
-                    "status": "rejected",
-                    "at_bkk": now_bkk.isoformat(),
-                    "at_utc": now_utc.isoformat(),
-                    "date_bkk": date_bkk,
-                    "by": "approver_ui",
-                }
-            },
-        },
+        from_status="pending",
+        to_status="rejected",
+        by="approver_ui",
+        projection={"_id": 0, "request_id": 1},
     )
+    if not rejected:
+        existing = requests_collection.find_one({"request_id": request_id}, {"_id": 0, "status": 1})
+        if not existing:
+            return jsonify({"status": "error", "message": f"ไม่พบคำขอ {request_id} ในระบบ"}), 404
+        current_status = existing.get("status")
+        logger.warning(f"⚠️ คำขอ {request_id} มีสถานะ {current_status} อยู่แล้ว ข้ามการปฏิเสธ")
+        return jsonify({
+            "status": "error",
+            "message": f"คำขอ {request_id} มีสถานะ {current_status} อยู่แล้ว",
+            "request_status": current_status,
+        }), 409
     return redirect("/money/approved-requests")
 
 
@@ -794,11 +1202,11 @@ def api_deposit_request():
 
     # กำหนด endpoint และ branch_id ตามสาขา
     if location_text == "โนนิโกะ":
-        base = get_rest_api_ci_base_for_branch("NONIKO")
         branch_id = "NONIKO"
     else:  # คลังห้องเย็น
-        base = get_rest_api_ci_base_for_branch("Klangfrozen")
         branch_id = "Klangfrozen"
+    client = get_branch_client(branch_id)
+    base = client.base_url
 
     # Use deposit_request_id as sale_id for downstream correlation
     deposit_request_id = f"d-{uuid.uuid4().hex[:8]}"
@@ -814,14 +1222,14 @@ def api_deposit_request():
 
     # ยิง API /replenishment/start
     try:
-        replenishment_start_url = f"{base}/replenishment/start"
+        replenishment_start_url = client.url("/replenishment/start")
         replenishment_payload = {
             "seq_no": seq_no,
             "session_id": session_id
         }
         
         logger.info(f"📤 [DEPOSIT] กำลังยิง /replenishment/start: {replenishment_start_url}")
-        start_response = requests.post(replenishment_start_url, json=replenishment_payload, headers=headers, timeout=10)
+        start_response = client.post("/replenishment/start", json=replenishment_payload, headers=headers, timeout=10)
         start_response.raise_for_status()
         start_data = start_response.json()
         
@@ -830,7 +1238,8 @@ def api_deposit_request():
             logger.error(f"❌ [DEPOSIT] /replenishment/start failed: {error_msg}")
             return jsonify({"status": "error", "message": f"/replenishment/start failed: {error_msg}"}), 500
         
-        logger.info(f"✅ [DEPOSIT] /replenishment/start สำเร็จ: {start_data}")
+        logger.info("✅ [DEPOSIT] /replenishment/start สำเร็จ")
+        logger.debug("✅ [DEPOSIT] /replenishment/start response: %s", start_data)
         
     except requests.exceptions.RequestException as e:
         logger.error(f"❌ [DEPOSIT] Request Exception: {str(e)}")
@@ -845,6 +1254,7 @@ def api_deposit_request():
         "deposit_request_id": deposit_request_id,
         "session_id": session_id,
         "seq_no": seq_no,
+        "branch_id": branch_id,
         "branch_base_url": base,
         "location": location_text,
         "reason": reason,
@@ -886,7 +1296,7 @@ def api_deposit_info():
     
     # กำหนด branch_base_url จาก branch_id
     branch_id = doc.get("branch_id")
-    branch_base_url = get_rest_api_ci_base_for_branch(branch_id) if branch_id else None
+    branch_base_url = get_branch_client(branch_id).base_url if canonical_branch_id(branch_id) else None
     
     resp = {
         "deposit_request_id": doc.get("deposit_request_id"),
@@ -924,16 +1334,11 @@ def api_replenishment_end():
     if not user_id or not reason_code or not location_text:
         return jsonify({"status": "error", "message": "missing required fields (user_id, reason_code, location)"}), 400
     
-    # กำหนด branch_id และ branch_base_url ตาม location
+    # กำหนด branch_id ตาม location
     if location_text == "โนนิโกะ":
         branch_id = "NONIKO"
-        branch_base_url = get_rest_api_ci_base_for_branch("NONIKO")
     else:  # คลังห้องเย็น
         branch_id = "Klangfrozen"
-        branch_base_url = get_rest_api_ci_base_for_branch("Klangfrozen")
-    
-    if not branch_base_url:
-        return jsonify({"status": "error", "message": "branch_base_url not found"}), 400
     
     # แม็ปเหตุผลให้เป็นข้อความอ่านง่าย
     if reason_code == "change":
@@ -947,15 +1352,16 @@ def api_replenishment_end():
     
     # ยิง API /replenishment/end
     try:
+        client = get_branch_client(branch_id)
         headers, meta = build_correlation_headers(sale_id=deposit_id)
-        end_url = f"{branch_base_url}/replenishment/end"
+        end_url = client.url("/replenishment/end")
         end_payload = {
             "seq_no": seq_no,
             "session_id": session_id
         }
         
         logger.info(f"📤 [REPLENISHMENT] กำลังยิง /replenishment/end: {end_url}")
-        end_response = requests.post(end_url, json=end_payload, headers=headers, timeout=10)
+        end_response = client.post("/replenishment/end", json=end_payload, headers=headers, timeout=10)
         end_response.raise_for_status()
         end_data = end_response.json()
         
@@ -964,13 +1370,14 @@ def api_replenishment_end():
             logger.error(f"❌ [REPLENISHMENT] /replenishment/end failed: {error_msg}")
             return jsonify({"status": "error", "message": f"/replenishment/end failed: {error_msg}"}), 500
         
-        logger.info(f"✅ [REPLENISHMENT] /replenishment/end สำเร็จ: {end_data}")
+        logger.info("✅ [REPLENISHMENT] /replenishment/end สำเร็จ")
+        logger.debug("✅ [REPLENISHMENT] /replenishment/end response: %s", end_data)
+        _stop_socket_stream(session_id, deposit_id, "completed")
         
         # ดึงยอดเงินจาก socket/latest (ถ้ายังไม่มี amount)
         if not amount or amount == 0:
             try:
-                socket_url = f"{branch_base_url}/socket/latest"
-                socket_response = requests.get(socket_url, headers=headers, timeout=5)
+                socket_response = client.get("/socket/latest", headers=headers, timeout=5)
                 if socket_response.status_code == 200:
                     socket_data = socket_response.json()
                     if socket_data.get("success") and socket_data.get("amount_baht"):
@@ -1014,7 +1421,16 @@ def api_replenishment_end():
         
         try:
             deposit_requests_collection.insert_one(deposit_doc)
+            observe_status_transition(deposit_requests_collection, "completed", True)
             logger.info(f"✅ [DEPOSIT] บันทึกข้อมูลการฝากเงินสำเร็จ: {deposit_id}, จำนวน: {amount} บาท")
+            # วันที่ของยอดรวม = created_date_bkk ของเอกสาร (วันที่จบฝาก) เหมือน rebuild / ปิดยอด / export
+            record_rollup(
+                daily_rollups_collection,
+                date_bkk=date_bkk,
+                location=location_text,
+                rollup_type=ROLLUP_DEPOSIT_COMPLETED,
+                amount=amount,
+            )
         except Exception as e:
             logger.error(f"❌ [DEPOSIT] ไม่สามารถบันทึกข้อมูลการฝากเงินได้: {str(e)}")
             # ไม่ return error เพราะ replenishment/end สำเร็จแล้ว
@@ -1045,38 +1461,34 @@ def api_replenishment_cancel():
     if not deposit_id:
         return jsonify({"status": "error", "message": "missing deposit_id"}), 400
     
-    # กำหนด branch_id และ branch_base_url ตาม location
+    # กำหนด branch_id ตาม location
     if location_text == "โนนิโกะ":
         branch_id = "NONIKO"
-        branch_base_url = get_rest_api_ci_base_for_branch("NONIKO")
     elif location_text == "คลังห้องเย็น":
         branch_id = "Klangfrozen"
-        branch_base_url = get_rest_api_ci_base_for_branch("Klangfrozen")
     else:
         # ถ้าไม่มี location ให้ลองดึงจาก doc (กรณีเก่า)
         doc = deposit_requests_collection.find_one({"deposit_request_id": deposit_id})
+        branch_id = canonical_branch_id(doc.get("branch_id")) if doc else None
         if doc:
-            branch_id = doc.get("branch_id")
-            branch_base_url = get_rest_api_ci_base_for_branch(branch_id) if branch_id else None
             session_id = session_id or doc.get("session_id")
             seq_no = seq_no or doc.get("seq_no", "1")
-        else:
-            branch_base_url = None
     
-    if not branch_base_url:
+    if not branch_id:
         return jsonify({"status": "error", "message": "branch_base_url not found"}), 400
     
     # ยิง API /replenishment/cancel
     try:
+        client = get_branch_client(branch_id)
         headers, meta = build_correlation_headers(sale_id=deposit_id)
-        cancel_url = f"{branch_base_url}/replenishment/cancel"
+        cancel_url = client.url("/replenishment/cancel")
         cancel_payload = {
             "seq_no": seq_no,
             "session_id": session_id
         }
         
         logger.info(f"📤 [REPLENISHMENT] กำลังยิง /replenishment/cancel: {cancel_url}")
-        cancel_response = requests.post(cancel_url, json=cancel_payload, headers=headers, timeout=10)
+        cancel_response = client.post("/replenishment/cancel", json=cancel_payload, headers=headers, timeout=10)
         cancel_response.raise_for_status()
         cancel_data = cancel_response.json()
         
@@ -1085,9 +1497,11 @@ def api_replenishment_cancel():
             logger.error(f"❌ [REPLENISHMENT] /replenishment/cancel failed: {error_msg}")
             return jsonify({"status": "error", "message": f"/replenishment/cancel failed: {error_msg}"}), 500
         
-        logger.info(f"✅ [REPLENISHMENT] /replenishment/cancel สำเร็จ: {cancel_data}")
+        logger.info("✅ [REPLENISHMENT] /replenishment/cancel สำเร็จ")
+        logger.debug("✅ [REPLENISHMENT] /replenishment/cancel response: %s", cancel_data)
         
         # ไม่ต้องบันทึกอะไรเมื่อยกเลิก เพราะยังไม่มีการฝากเงินจริง
+        _stop_socket_stream(session_id, deposit_id, "cancelled")
         
         return jsonify({"status": "ok", "message": "ยกเลิกการฝากเงินสำเร็จ"})
         
@@ -1113,23 +1527,20 @@ def api_socket_latest():
         if not doc:
             return jsonify({"status": "error", "message": "deposit request not found"}), 404
         
-        branch_id = doc.get("branch_id")
-        branch_base_url = get_rest_api_ci_base_for_branch(branch_id) if branch_id else None
-        
-        if not branch_base_url:
+        branch_id = canonical_branch_id(doc.get("branch_id"))
+        if not branch_id:
             return jsonify({"status": "error", "message": "branch_base_url not found"}), 400
         
-        # ยิง GET request ไปที่ /socket/latest
+        # ยิง GET request ไปที่ /socket/latest (ผ่าน cache ต่อ session)
         try:
+            client = get_branch_client(branch_id)
             headers, meta = build_correlation_headers(sale_id=deposit_id)
-            socket_url = f"{branch_base_url}/socket/latest"
+            socket_url = client.url("/socket/latest")
             
-            logger.debug(f"📤 [SOCKET] กำลังยิง /socket/latest: {socket_url}")
-            socket_response = requests.get(socket_url, headers=headers, timeout=5)
-            socket_response.raise_for_status()
-            socket_data = socket_response.json()
+            logger.debug("📤 [SOCKET] กำลังยิง /socket/latest: %s", socket_url)
+            socket_data = read_socket_latest(client, doc.get("session_id") or deposit_id, headers)
             
-            logger.debug(f"✅ [SOCKET] /socket/latest สำเร็จ: {socket_data}")
+            logger.debug("✅ [SOCKET] /socket/latest สำเร็จ: %s", socket_data)
             
             # Return response ตาม format เดิม
             return jsonify({
@@ -1139,6 +1550,16 @@ def api_socket_latest():
                 "ts": socket_data.get("ts", 0)
             })
             
+        except CircuitOpenError as e:
+            # เครื่องสาขานี้ล่มอยู่: ตอบกลับทันทีโดยไม่ยิงไปที่เครื่อง
+            logger.warning(f"⚠️ [SOCKET] {str(e)}")
+            return jsonify({
+                "status": "error",
+                "message": str(e),
+                "amount_baht": 0,
+                "success": False,
+                "ts": 0
+            }), 503
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ [SOCKET] Request Exception: {str(e)}")
             return jsonify({
@@ -1173,7 +1594,8 @@ def api_socket_latest():
 def api_socket_latest_proxy():
     """
     Proxy endpoint สำหรับ frontend เพื่อยิง API ไปที่ new_ci_api /socket/latest
-    รับ parameters: branch_base_url, trace_id, request_id, sale_id, seq_no, session_id
+    รับ parameters: branch_id หรือ branch_base_url, trace_id, request_id, sale_id, seq_no, session_id
+    (branch_base_url ต้องตรงกับ base URL ที่ตั้งค่าไว้ของสาขาใดสาขาหนึ่ง)
     """
     try:
         branch_base_url = request.args.get("branch_base_url")
@@ -1183,10 +1605,11 @@ def api_socket_latest_proxy():
         seq_no = request.args.get("seq_no")
         session_id = request.args.get("session_id")
         
-        if not branch_base_url:
+        branch_id = _requested_branch_id(request.args.get("branch_id"), branch_base_url)
+        if not branch_id:
             return jsonify({
                 "status": "error",
-                "message": "missing branch_base_url",
+                "message": "missing branch_base_url" if not branch_base_url else "unknown branch_base_url",
                 "amount_baht": 0,
                 "success": False,
                 "ts": 0
@@ -1208,16 +1631,15 @@ def api_socket_latest_proxy():
         if session_id:
             headers["X-Session-Id"] = session_id
         
-        # ยิง GET request ไปที่ /socket/latest
+        # ยิง GET request ไปที่ /socket/latest (ผ่าน cache ต่อ session)
         try:
-            socket_url = f"{branch_base_url}/socket/latest"
+            client = get_branch_client(branch_id)
+            socket_url = client.url("/socket/latest")
             
-            logger.debug(f"📤 [SOCKET-PROXY] กำลังยิง /socket/latest: {socket_url}")
-            socket_response = requests.get(socket_url, headers=headers, timeout=5)
-            socket_response.raise_for_status()
-            socket_data = socket_response.json()
+            logger.debug("📤 [SOCKET-PROXY] กำลังยิง /socket/latest: %s", socket_url)
+            socket_data = read_socket_latest(client, session_id or sale_id, headers)
             
-            logger.debug(f"✅ [SOCKET-PROXY] /socket/latest สำเร็จ: {socket_data}")
+            logger.debug("✅ [SOCKET-PROXY] /socket/latest สำเร็จ: %s", socket_data)
             
             # Return response ตาม format เดิม
             return jsonify({
@@ -1227,6 +1649,16 @@ def api_socket_latest_proxy():
                 "ts": socket_data.get("ts", 0)
             })
             
+        except CircuitOpenError as e:
+            # เครื่องสาขานี้ล่มอยู่: ตอบกลับทันทีโดยไม่ยิงไปที่เครื่อง
+            logger.warning(f"⚠️ [SOCKET-PROXY] {str(e)}")
+            return jsonify({
+                "status": "error",
+                "message": str(e),
+                "amount_baht": 0,
+                "success": False,
+                "ts": 0
+            }), 503
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ [SOCKET-PROXY] Request Exception: {str(e)}")
             return jsonify({
@@ -1255,6 +1687,105 @@ def api_socket_latest_proxy():
             "success": False,
             "ts": 0
         }), 500
+
+
+def _requested_branch_id(branch_id=None, branch_base_url=None):
+    """
+    สาขาที่ client ระบุ (branch_id หรือ branch_base_url จาก /money/api/deposit-request)
+    คืนค่า None ถ้าไม่รู้จัก: ไม่ยิง request ไปยัง URL ที่ client ส่งมาเอง
+    """
+    if branch_id:
+        return canonical_branch_id(branch_id)
+    return branch_id_for_base(branch_base_url)
+
+
+def _stop_socket_stream(session_id, deposit_id, reason):
+    """หยุด poller ของ session (ผู้ชมทุกหน้าจอจะได้ event: end)"""
+    for key in {session_id, deposit_id}:
+        socket_fanout.stop(key, reason)
+
+
+@approved_requests_bp.route("/money/api/socket-latest-stream", methods=["GET"])
+def api_socket_latest_stream():
+    """
+    SSE ยอดเงินล่าสุดจาก /socket/latest ของ session ฝากเงิน
+    server อ่านจากเครื่องรอบละครั้งต่อ session แล้วส่งต่อให้ทุกหน้าจอที่เปิดดูอยู่
+    รับ deposit_id (หน้า deposit-monitor) หรือ branch_id / branch_base_url + session_id (หน้า LIFF)
+    stream เต็มโควตาของ worker ตอบ 503 (หน้าเว็บ poll ผ่าน proxy แทน)
+    """
+    deposit_id = request.args.get("deposit_id")
+    branch_base_url = request.args.get("branch_base_url")
+    branch_id = _requested_branch_id(request.args.get("branch_id"), branch_base_url)
+    session_id = request.args.get("session_id")
+    seq_no = request.args.get("seq_no")
+
+    if (request.args.get("branch_id") or branch_base_url) and not branch_id:
+        return jsonify({"status": "error", "message": "unknown branch_base_url"}), 400
+
+    if not branch_id and deposit_id:
+        doc = deposit_requests_collection.find_one(
+            {"deposit_request_id": deposit_id},
+            {"_id": 0, "branch_id": 1, "session_id": 1, "seq_no": 1},
+        )
+        if not doc:
+            return jsonify({"status": "error", "message": "deposit request not found"}), 404
+        branch_id = canonical_branch_id(doc.get("branch_id"))
+        session_id = session_id or doc.get("session_id")
+        seq_no = seq_no or doc.get("seq_no")
+
+    session_key = session_id or deposit_id
+    if not branch_id or not session_key:
+        return jsonify({"status": "error", "message": "missing branch_base_url or session_id"}), 400
+
+    headers, _ = build_correlation_headers(
+        trace_id=request.args.get("trace_id"),
+        request_id=request.args.get("request_id"),
+        sale_id=request.args.get("sale_id") or deposit_id or session_key,
+    )
+    if seq_no:
+        headers["X-Seq-No"] = str(seq_no)
+    if session_id:
+        headers["X-Session-Id"] = session_id
+
+    if not sse_slots.try_acquire():
+        return _sse_busy()
+    try:
+        q = socket_fanout.subscribe(session_key, get_branch_client(branch_id), headers)
+    except Exception:
+        sse_slots.release()
+        raise
+
+    def stream():
+        try:
+            yield from iter_sse(q)
+        finally:
+            socket_fanout.unsubscribe(session_key, q)
+
+    return _sse_response(stream())
+
+
+@approved_requests_bp.route("/money/api/branch-health", methods=["GET"])
+def api_branch_health():
+    """
+    สถานะ circuit breaker ของเครื่อง REST_API_CI แต่ละสาขา (closed / open / half_open)
+    คิวงาน cashout ที่รอเครื่องของแต่ละสาขา และตัวนับ hit/miss ของ cache /socket/latest
+    """
+    # สร้าง client ของทั้งสองสาขาไว้ก่อน เพื่อให้แสดงครบแม้ยังไม่เคยถูกเรียกใน process นี้
+    get_branch_client("NONIKO")
+    get_branch_client("Klangfrozen")
+    return jsonify({
+        "status": "ok",
+        "data": get_breaker_states(),
+        "cashout_queues": cashout_workers.stats(),
+        "socket_streams": socket_fanout.active_sessions(),
+        "pending_stream": {
+            "mode": pending_watcher.mode,
+            "subscribers": pending_watcher.broadcaster.subscriber_count,
+        },
+        "socket_cache": socket_latest_cache.stats(),
+    })
+
+
 @approved_requests_bp.route("/money/deposit-monitor", methods=["GET"])
 def deposit_monitor():
     """หน้า UI สำหรับติดตามการฝากเงิน"""
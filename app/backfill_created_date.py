@@ -1,11 +1,27 @@
+import argparse
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 
-from time_utils import BANGKOK_TZ
+from time_utils import BANGKOK_TZ, now_bangkok_and_utc
+
+logger = logging.getLogger(__name__)
+
+# เอกสารเก่าที่ยังไม่มีวันที่ตามเวลาไทย
+LEGACY_FILTER = {"created_date_bkk": {"$exists": False}}
+# checkpoint ต่อ shard: {_id: "created_date_bkk/<จำนวน shard>/<ลำดับ>", lower, upper, last_id, done, ...}
+CHECKPOINT_COLLECTION = "backfill_checkpoints"
+JOB_NAME = "created_date_bkk"
+DEFAULT_BATCH_SIZE = 500
 
 
 def get_db():
@@ -20,59 +36,233 @@ def get_db():
     return client["kf_hr"]
 
 
-def backfill_created_dates():
+def build_update(doc: Dict[str, Any]) -> Dict[str, Any]:
     """
-    เติม created_at_* / created_date_bkk และ status_history ให้ document เก่าใน
-    collection withdraw_requests ที่ยังไม่มีฟิลด์ created_date_bkk
+    update ของเอกสารเก่าหนึ่งรายการ: created_at_* / created_date_bkk จากเวลาใน ObjectId
+    และ status_history เริ่มต้นถ้ายังไม่มี
     """
-    db = get_db()
-    col = db["withdraw_requests"]
+    _id = doc["_id"]
+    oid: ObjectId = _id if isinstance(_id, ObjectId) else ObjectId(str(_id))
 
-    cursor = col.find({"created_date_bkk": {"$exists": False}})
-    total = 0
-    updated = 0
+    # เวลาเดิมจาก ObjectId เป็น UTC
+    created_utc = oid.generation_time.replace(tzinfo=timezone.utc)
+    created_bkk = created_utc.astimezone(BANGKOK_TZ)
+    date_bkk = created_bkk.date().isoformat()
 
-    for doc in cursor:
-        total += 1
-        _id = doc["_id"]
-        oid: ObjectId = _id if isinstance(_id, ObjectId) else ObjectId(str(_id))
+    set_fields = {
+        "created_at_utc": created_utc.isoformat(),
+        "created_at_bkk": created_bkk.isoformat(),
+        "created_date_bkk": date_bkk,
+    }
+
+    # ถ้ายังไม่มี status_history ให้สร้างเริ่มต้นให้ด้วย
+    if "status_history" not in doc:
+        set_fields["status_history"] = [
+            {
+                "status": doc.get("status", "unknown"),
+                "at_bkk": created_bkk.isoformat(),
+                "at_utc": created_utc.isoformat(),
+                "date_bkk": date_bkk,
+                "by": "backfill_script",
+            }
+        ]
+    return {"$set": set_fields}
+
+
+def split_id_range(col, shards: int) -> List[Tuple[Optional[ObjectId], Optional[ObjectId]]]:
+    """
+    แบ่งช่วง _id ของเอกสารที่ต้อง backfill เป็น shard ละช่วงเวลาเท่า ๆ กัน (ตามเวลาใน ObjectId)
+    คืนค่า [(lower รวม, upper ไม่รวม), ...] โดย None = ไม่จำกัด
+    (_id ที่ไม่ใช่ ObjectId อยู่นอกทุกช่วงที่มีขอบเขต: ใช้ shards=1 ถ้ามีเอกสารแบบนั้น)
+    """
+    if shards <= 1:
+        return [(None, None)]
+    first = col.find_one(LEGACY_FILTER, {"_id": 1}, sort=[("_id", 1)])
+    last = col.find_one(LEGACY_FILTER, {"_id": 1}, sort=[("_id", -1)])
+    if not first or not isinstance(first["_id"], ObjectId) or not isinstance(last["_id"], ObjectId):
+        return [(None, None)]
+
+    start = first["_id"].generation_time
+    step = (last["_id"].generation_time - start) / shards
+    bounds = [ObjectId.from_datetime(start + step * i) for i in range(1, shards)]
+    lowers = [None] + bounds
+    uppers = bounds + [None]
+    return list(zip(lowers, uppers))
 
-        # เวลาเดิมจาก ObjectId เป็น UTC
-        created_utc = oid.generation_time.replace(tzinfo=timezone.utc)
-        created_bkk = created_utc.astimezone(BANGKOK_TZ)
-        date_bkk = created_bkk.date().isoformat()
 
-        status = doc.get("status", "unknown")
+def _range_filter(lower, upper, last_id) -> Dict[str, Any]:
+    id_filter: Dict[str, Any] = {}
+    if lower is not None:
+        id_filter["$gte"] = lower
+    if upper is not None:
+        id_filter["$lt"] = upper
+    if last_id is not None:
+        id_filter["$gt"] = last_id
+        id_filter.pop("$gte", None)
+    query = dict(LEGACY_FILTER)
+    if id_filter:
+        query["_id"] = id_filter
+    return query
 
-        set_fields = {
-            "created_at_utc": created_utc.isoformat(),
-            "created_at_bkk": created_bkk.isoformat(),
-            "created_date_bkk": date_bkk,
-        }
 
-        update = {"$set": set_fields}
+def backfill_shard(
+    col,
+    checkpoints,
+    *,
+    checkpoint_id: str,
+    lower=None,
+    upper=None,
+    last_id=None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    เดินเอกสารใน shard ตามลำดับ _id แล้วเขียนเป็น bulk_write ครั้งละ batch_size รายการ
+    หลังแต่ละ batch บันทึก _id สุดท้ายลง checkpoint (รันใหม่จะเริ่มต่อจากตรงนั้น)
+    dry_run: นับอย่างเดียว ไม่เขียนทั้งเอกสารและ checkpoint
+    """
+    stats = {"scanned": 0, "updated": 0, "batches": 0}
+    cursor = (
+        col.find(_range_filter(lower, upper, last_id), {"status": 1, "status_history": 1})
+        .sort("_id", 1)
+        .batch_size(batch_size)
+    )
 
-        # ถ้ายังไม่มี status_history ให้สร้างเริ่มต้นให้ด้วย
-        if "status_history" not in doc:
-            update["$set"]["status_history"] = [
+    def flush(ops, batch_last_id):
+        if not dry_run:
+            result = col.bulk_write(ops, ordered=False)
+            stats["updated"] += result.modified_count
+            _, now_utc = now_bangkok_and_utc()
+            checkpoints.update_one(
+                {"_id": checkpoint_id},
                 {
-                    "status": status,
-                    "at_bkk": created_bkk.isoformat(),
-                    "at_utc": created_utc.isoformat(),
-                    "date_bkk": date_bkk,
-                    "by": "backfill_script",
-                }
-            ]
+                    "$set": {"last_id": batch_last_id, "updated_at_utc": now_utc.isoformat()},
+                    "$inc": {"scanned": len(ops), "updated": result.modified_count},
+                },
+                upsert=True,
+            )
+        stats["batches"] += 1
 
-        result = col.update_one({"_id": _id}, update)
-        if result.modified_count:
-            updated += 1
+    ops: List[UpdateOne] = []
+    doc_id = None
+    for doc in cursor:
+        stats["scanned"] += 1
+        doc_id = doc["_id"]
+        # เงื่อนไขซ้ำใน filter: ถ้าแอปเขียนเอกสารนี้ไปแล้วระหว่างรัน จะไม่ทับ
+        ops.append(UpdateOne({"_id": doc_id, **LEGACY_FILTER}, build_update(doc)))
+        if len(ops) >= batch_size:
+            flush(ops, doc_id)
+            ops = []
+    if ops:
+        flush(ops, doc_id)
 
-    print(f"Found legacy documents without created_date_bkk: {total}")
-    print(f"Updated documents: {updated}")
+    if not dry_run:
+        checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"done": True}}, upsert=True)
+    return stats
 
 
-if __name__ == "__main__":
-    backfill_created_dates()
+def _plan(col, checkpoints, shards: int, restart: bool, dry_run: bool) -> List[Dict[str, Any]]:
+    """
+    ช่วง _id ของแต่ละ shard: ใช้ช่วงที่บันทึกไว้ใน checkpoint ถ้ามี (รันต่อ)
+    ไม่เช่นนั้นแบ่งใหม่แล้วบันทึกไว้ (dry_run ไม่อ่าน/เขียน checkpoint)
+    """
+    prefix = f"{JOB_NAME}/{shards}/"
+    if not dry_run:
+        if restart:
+            checkpoints.delete_many({"_id": {"$regex": f"^{prefix}"}})
+        saved = sorted(checkpoints.find({"_id": {"$regex": f"^{prefix}"}}), key=lambda c: c["shard"])
+        if len(saved) == shards:
+            return saved
 
+    plan = []
+    for index, (lower, upper) in enumerate(split_id_range(col, shards)):
+        plan.append({"_id": f"{prefix}{index}", "shard": index, "lower": lower, "upper": upper, "last_id": None, "done": False})
+    if not dry_run:
+        for shard in plan:
+            checkpoints.replace_one({"_id": shard["_id"]}, shard, upsert=True)
+    return plan
 
+
+def backfill_created_dates(
+    db=None,
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    shards: int = 1,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    เติม created_at_* / created_date_bkk และ status_history ให้ document เก่าใน
+    collection withdraw_requests ที่ยังไม่มีฟิลด์ created_date_bkk
+
+    - เขียนเป็น bulk_write ครั้งละ batch_size รายการ
+    - บันทึก checkpoint (_id สุดท้าย) ต่อ shard ใน backfill_checkpoints: รันซ้ำจะทำต่อจากเดิม
+      (restart=True เริ่มใหม่ทั้งหมด)
+    - shards > 1 แบ่งช่วง _id แล้วทำพร้อมกันหลาย thread
+    - dry_run นับจำนวนเอกสารและความเร็วโดยไม่เขียนอะไร
+    """
+    db = db if db is not None else get_db()
+    col = db["withdraw_requests"]
+    checkpoints = db[CHECKPOINT_COLLECTION]
+
+    pending = col.count_documents(LEGACY_FILTER)
+    plan = _plan(col, checkpoints, shards, restart, dry_run)
+    todo = [shard for shard in plan if not shard.get("done")]
+
+    totals = {"scanned": 0, "updated": 0, "batches": 0}
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    def run(shard):
+        stats = backfill_shard(
+            col,
+            checkpoints,
+            checkpoint_id=shard["_id"],
+            lower=shard.get("lower"),
+            upper=shard.get("upper"),
+            last_id=shard.get("last_id"),
+            batch_size=batch_size,
+            dry_run=dry_run,
+        )
+        with lock:
+            for key, value in stats.items():
+                totals[key] += value
+        logger.info(f"✅ [BACKFILL] shard {shard['shard']}: {stats}")
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=len(todo)) as pool:
+            list(pool.map(run, todo))
+
+    elapsed = time.monotonic() - started
+    return {
+        "dry_run": dry_run,
+        "legacy_documents": pending,
+        "shards": shards,
+        "shards_skipped": len(plan) - len(todo),
+        **totals,
+        "remaining": pending if dry_run else col.count_documents(LEGACY_FILTER),
+        "seconds": round(elapsed, 2),
+        "docs_per_second": round(totals["scanned"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="เติม created_date_bkk ให้ withdraw_requests เก่า")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--shards", type=int, default=1, help="จำนวนช่วง _id ที่ทำพร้อมกัน")
+    parser.add_argument("--dry-run", action="store_true", help="นับจำนวนและวัดความเร็วโดยไม่เขียน")
+    parser.add_argument("--restart", action="store_true", help="ไม่ใช้ checkpoint เดิม เริ่มใหม่ทั้งหมด")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = backfill_created_dates(
+        batch_size=args.batch_size,
+        shards=args.shards,
+        dry_run=args.dry_run,
+        restart=args.restart,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreaker
+from config import Config
+from http_utils import build_correlation_headers, canonical_branch_id, get_rest_api_ci_base_for_branch
+from metrics import BRANCH_REQUEST_SECONDS, branch_outcome
+
+
+class BranchClient:
+    """
+    HTTP client สำหรับ REST_API_CI ของสาขาหนึ่ง (หนึ่ง base URL)
+
+    ใช้ requests.Session ตัวเดียวที่มี connection pool แบบ keep-alive
+    เพื่อไม่ต้องเปิด TCP connection ใหม่ทุกครั้งที่ยิง /cashout/*, /replenishment/*, /socket/latest
+
+    ทุก request ผ่าน circuit breaker ของสาขา: เมื่อเครื่องล่ม จะ fast-fail ด้วย CircuitOpenError
+    แทนการรอ timeout เต็มเวลา
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        name: Optional[str] = None,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self.connect_timeout = connect_timeout or Config.REST_API_CI_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.REST_API_CI_READ_TIMEOUT
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections or Config.REST_API_CI_POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize or Config.REST_API_CI_POOL_MAXSIZE,
+            max_retries=0,  # ห้าม retry เอง: /cashout/request ไม่ idempotent
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker(
+            self.name,
+            failure_threshold=Config.REST_API_CI_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=Config.REST_API_CI_BREAKER_RESET_SECONDS,
+        )
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        sale_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        ยิง request ไปที่ REST_API_CI
+
+        - ถ้าไม่ส่ง headers มา จะสร้าง correlation headers ให้อัตโนมัติจาก build_correlation_headers(sale_id)
+        - timeout คือ read timeout (วินาที); connect timeout ใช้ค่าจาก Config
+        - connection error / timeout / HTTP 5xx นับเป็น failure ของ breaker
+          RequestException แบบอื่น (request ผิดรูป) และ exception ที่ไม่ใช่ของ requests ไม่นับ
+        """
+        if headers is None:
+            headers, _ = build_correlation_headers(sale_id=sale_id)
+        start = time.perf_counter()
+        try:
+            self.breaker.before_call()
+        except Exception as e:
+            self._observe(method, path, start, error=e)
+            raise
+        recorded = False
+        try:
+            response = self.session.request(
+                method,
+                self.url(path),
+                headers=headers,
+                timeout=self._timeout(timeout),
+                **kwargs,
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            self.breaker.record_failure(f"{type(e).__name__}: {e}")
+            recorded = True
+            self._observe(method, path, start, error=e)
+            raise
+        except requests.exceptions.RequestException as e:
+            # request ผิดรูป (URL, redirect, body) ไม่ได้บอกว่าเครื่องล่ม: ไม่นับเป็น failure
+            self._observe(method, path, start, error=e)
+            raise
+        else:
+            if response.status_code >= 500:
+                self.breaker.record_failure(f"HTTP {response.status_code} from {path}")
+            else:
+                self.breaker.record_success()
+            recorded = True
+            self._observe(method, path, start, status_code=response.status_code)
+        finally:
+            # KeyboardInterrupt / SystemExit / GeneratorExit หรือ error ข้างบน: คืน probe ของ half_open
+            if not recorded:
+                self.breaker.release_probe()
+        return response
+
+    def _observe(self, method: str, path: str, start: float, *, status_code=None, error=None) -> None:
+        BRANCH_REQUEST_SECONDS.labels(
+            branch=self.name,
+            method=method,
+            path=path.split("?", 1)[0],
+            outcome=branch_outcome(status_code, error),
+        ).observe(time.perf_counter() - start)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _timeout(self, read_timeout: Optional[float]) -> Tuple[float, float]:
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+
+# หนึ่ง client ต่อสาขา (ต่อ process): key คือชื่อหลักของสาขา จำนวนจึงคงที่
+# และชื่อ breaker ใน /money/api/branch-health กับ metrics ไม่เปลี่ยนตาม URL
+DEFAULT_BRANCH = "default"
+_clients: Dict[str, BranchClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_branch_client(branch_id: Optional[str]) -> BranchClient:
+    """
+    คืนค่า BranchClient ที่ใช้ร่วมกันของสาขา (สร้างครั้งแรกที่เรียก)
+    ชื่อเรียกอื่นของสาขาเดียวกันได้ client ตัวเดียวกัน; สาขาที่ไม่รู้จักใช้ REST_API_CI_BASE
+    """
+    key = canonical_branch_id(branch_id) or DEFAULT_BRANCH
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                base_url = get_rest_api_ci_base_for_branch(None if key == DEFAULT_BRANCH else key)
+                client = BranchClient(base_url, name=key)
+                _clients[key] = client
+    return client
+
+
+def get_breaker_states() -> List[Dict[str, Any]]:
+    """สถานะ circuit breaker ของทุกสาขาที่เคยถูกเรียกใน process นี้"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [dict(c.breaker.snapshot(), base_url=c.base_url) for c in clients]
+
+
+def close_branch_clients() -> None:
+    """ปิด session ทั้งหมด (เช่น หลัง fork ของ gunicorn worker หรือใน test)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
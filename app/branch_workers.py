@@ -0,0 +1,131 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from metrics import WORKER_POOL_IN_FLIGHT, WORKER_POOL_QUEUED
+
+logger = logging.getLogger(__name__)
+
+
+class BranchWorkerPool:
+    """
+    Worker pool แบบมีขอบเขต แยกคิวต่อสาขา (หนึ่งคิวต่อเครื่อง)
+
+    - แต่ละสาขามีคิวขนาด queue_size และ worker thread workers_per_branch ตัว
+    - งานของสาขาหนึ่งไม่ไปรอคิวของอีกสาขา → throughput โตตามจำนวนเครื่อง
+      ไม่ใช่ตามจำนวน gunicorn worker
+    - thread ถูกสร้างตอน submit ครั้งแรกใน process นั้น (ปลอดภัยกับ pre-fork server)
+    - ก่อน process จบ (เช่น gunicorn recycle worker) เรียก drain() ให้งานที่รับไว้ทำจนเสร็จ
+    """
+
+    def __init__(self, name: str, *, workers_per_branch: int = 1, queue_size: int = 20):
+        self.name = name
+        self.workers_per_branch = workers_per_branch
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._queues: Dict[str, "queue.Queue"] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._pid = os.getpid()
+        self._closing = False
+        self._unfinished = 0
+
+    def submit(self, branch_id: str, func: Callable[..., Any], *args, **kwargs) -> bool:
+        """
+        ส่งงานเข้าคิวของสาขา
+        คืนค่า False ทันทีถ้าคิวเต็ม หรือ pool กำลังปิด (ผู้เรียกควรตอบ 503 แทนการรอ)
+        """
+        if self._closing:
+            logger.warning(f"⚠️ [{self.name}] pool กำลังปิด ไม่รับงานของสาขา {branch_id}")
+            return False
+        q = self._get_queue(branch_id)
+        # งานรันใน context ของผู้ส่ง (correlation id ของ log ตามไปด้วย และไม่ค้างข้ามงาน)
+        ctx = contextvars.copy_context()
+        with self._lock:
+            self._unfinished += 1
+        try:
+            q.put_nowait((ctx, func, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._unfinished -= 1
+            logger.warning(f"⚠️ [{self.name}] คิวของสาขา {branch_id} เต็ม ({self.queue_size})")
+            return False
+        WORKER_POOL_QUEUED.labels(pool=self.name, branch=branch_id).inc()
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "branch_id": branch_id,
+                    "queued": q.qsize(),
+                    "in_flight": self._in_flight.get(branch_id, 0),
+                    "queue_size": self.queue_size,
+                    "workers": self.workers_per_branch,
+                }
+                for branch_id, q in self._queues.items()
+            ]
+
+    def pending(self) -> int:
+        """จำนวนงานที่ยังไม่เสร็จ (รอในคิว + กำลังทำ) ของทุกสาขาใน process นี้"""
+        with self._lock:
+            return self._unfinished if self._pid == os.getpid() else 0
+
+    def drain(self, timeout: float) -> bool:
+        """
+        หยุดรับงานใหม่ แล้วรอให้งานที่รับไว้แล้วทำจนเสร็จ (ไม่เกิน timeout วินาที)
+        คืนค่า True ถ้าไม่มีงานค้าง; งานที่ยังค้างอยู่ถูกเก็บกู้ด้วยสถานะใน MongoDB ของผู้ส่งงาน
+        """
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                logger.warning(f"⚠️ [{self.name}] drain ไม่ทันใน {timeout} วินาที เหลือ {self.pending()} งาน")
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _get_queue(self, branch_id: str) -> "queue.Queue":
+        with self._lock:
+            if self._pid != os.getpid():
+                # thread ไม่ตามมาหลัง fork: เริ่มใหม่ใน process ลูก
+                self._queues.clear()
+                self._in_flight.clear()
+                self._unfinished = 0
+                self._pid = os.getpid()
+            q = self._queues.get(branch_id)
+            if q is None:
+                q = queue.Queue(maxsize=self.queue_size)
+                self._queues[branch_id] = q
+                self._in_flight[branch_id] = 0
+                for i in range(self.workers_per_branch):
+                    t = threading.Thread(
+                        target=self._run,
+                        args=(branch_id, q),
+                        name=f"{self.name}-{branch_id}-{i}",
+                        daemon=True,
+                    )
+                    t.start()
+            return q
+
+    def _run(self, branch_id: str, q: "queue.Queue") -> None:
+        while True:
+            ctx, func, args, kwargs = q.get()
+            WORKER_POOL_QUEUED.labels(pool=self.name, branch=branch_id).dec()
+            in_flight = WORKER_POOL_IN_FLIGHT.labels(pool=self.name, branch=branch_id)
+            in_flight.inc()
+            with self._lock:
+                self._in_flight[branch_id] = self._in_flight.get(branch_id, 0) + 1
+            try:
+                ctx.run(func, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"❌ [{self.name}] งานของสาขา {branch_id} ล้มเหลว: {str(e)}")
+            finally:
+                with self._lock:
+                    self._in_flight[branch_id] = self._in_flight.get(branch_id, 1) - 1
+                    self._unfinished -= 1
+                in_flight.dec()
+                q.task_done()
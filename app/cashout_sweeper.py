@@ -0,0 +1,51 @@
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CashoutSweeper:
+    """
+    เรียก sweep() ทุก interval วินาทีใน background thread (หนึ่ง thread ต่อ process)
+
+    - ใช้เก็บกู้คำขอเบิกที่ค้าง awaiting_machine เพราะ worker ที่ถืองานไว้ตายไป
+      (gunicorn recycle worker, deploy, process crash)
+    - thread เริ่มเมื่อเรียก ensure_started() ครั้งแรกใน process นั้น และ sweep รอบแรกทันที
+    - ทุก worker รัน sweeper ของตัวเอง: sweep() ต้อง claim งานแบบ atomic ใน MongoDB
+    """
+
+    def __init__(self, sweep: Callable[[], int], *, interval: float = 60.0):
+        self.sweep = sweep
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._pid = os.getpid()
+
+    def ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # thread ไม่ตามมาหลัง fork
+                self._thread = None
+                self._stop = threading.Event()
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cashout-sweeper", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                recovered = self.sweep()
+                if recovered:
+                    logger.warning(f"⚠️ [CASHOUT-SWEEP] เก็บกู้งาน cashout ที่ค้าง {recovered} รายการ")
+            except Exception as e:
+                logger.error(f"❌ [CASHOUT-SWEEP] sweep ล้มเหลว: {str(e)}")
+            self._stop.wait(self.interval)
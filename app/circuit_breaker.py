@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    ถูก raise ทันทีเมื่อ breaker ของสาขาเปิดอยู่ (ไม่ยิงไปที่เครื่องจริง)
+
+    เป็น subclass ของ RequestException เพื่อให้ทุกจุดที่ catch
+    requests.exceptions.RequestException อยู่แล้วจัดการได้เหมือน connection error ปกติ
+    """
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(
+            f"REST_API_CI ({name}) circuit open: เครื่องไม่ตอบสนอง ข้ามการเรียกชั่วคราว "
+            f"(ลองใหม่ใน {retry_in:.0f} วินาที)"
+        )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker แบบง่ายสำหรับเครื่องหนึ่งเครื่อง
+
+    - closed: ยิงได้ตามปกติ นับ failure ติดกัน
+    - open: ครบ failure_threshold แล้ว -> ปฏิเสธทันทีจนครบ reset_timeout
+    - half_open: ครบเวลาแล้ว ปล่อย probe ได้ทีละหนึ่ง request
+      สำเร็จ -> closed, ล้มเหลว -> open ใหม่
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """เรียกก่อนยิง request; raise CircuitOpenError ถ้ายังไม่ควรยิง"""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return
+            now = self._clock()
+            if self._state == STATE_OPEN:
+                elapsed = now - (self._opened_at or now)
+                if elapsed < self.reset_timeout:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            # half_open: ปล่อยผ่านได้เพียง probe เดียว
+            if self._probe_in_flight:
+                self._rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._last_error = error
+            if self._state == STATE_HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._state = STATE_OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """request จบโดยไม่รู้ว่าเครื่องดีหรือล่ม (เช่น request ผิดรูป, ถูก interrupt): คืน probe ไม่นับผล"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """สถานะปัจจุบันสำหรับแสดงผลผ่าน endpoint"""
+        with self._lock:
+            retry_in = None
+            if self._state == STATE_OPEN and self._opened_at is not None:
+                retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "retry_in": retry_in,
+                "rejected_calls": self._rejected,
+                "last_error": self._last_error,
+            }
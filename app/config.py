@@ -6,10 +6,98 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
+    # log: ระดับ และรูปแบบ ("json" หนึ่งบรรทัดต่อ log หรือ "text")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+    # debug/reloader ของ Flask dev server (python app/main.py) เปิดเฉพาะเมื่อกำหนด FLASK_DEBUG=1
+    FLASK_DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
     LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
     LINE_CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
     WEBHOOK_URL = os.getenv("WEBHOOK_URL")
     REST_API_CI_BASE = os.getenv("REST_API_CI_BASE", "http://localhost:5000")
     # Optional per-branch overrides
     REST_API_CI_BASE_NONIKO = os.getenv("REST_API_CI_BASE_NONIKO")
-    REST_API_CI_BASE_KLANGFROZEN = os.getenv("REST_API_CI_BASE_KLANGFROZEN")
\ No newline at end of file
+    REST_API_CI_BASE_KLANGFROZEN = os.getenv("REST_API_CI_BASE_KLANGFROZEN")
+
+    # HTTP client สำหรับ REST_API_CI (Session แบบ keep-alive หนึ่งตัวต่อ base URL ของสาขา)
+    REST_API_CI_POOL_CONNECTIONS = int(os.getenv("REST_API_CI_POOL_CONNECTIONS", "4"))
+    REST_API_CI_POOL_MAXSIZE = int(os.getenv("REST_API_CI_POOL_MAXSIZE", "16"))
+    REST_API_CI_CONNECT_TIMEOUT = float(os.getenv("REST_API_CI_CONNECT_TIMEOUT", "3"))
+    REST_API_CI_READ_TIMEOUT = float(os.getenv("REST_API_CI_READ_TIMEOUT", "10"))
+
+    # Circuit breaker ต่อสาขา: เปิดหลัง failure ติดกัน N ครั้ง แล้ว fast-fail จนครบเวลา reset
+    REST_API_CI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("REST_API_CI_BREAKER_FAILURE_THRESHOLD", "5"))
+    REST_API_CI_BREAKER_RESET_SECONDS = float(os.getenv("REST_API_CI_BREAKER_RESET_SECONDS", "30"))
+
+    # Background cashout workers: หนึ่งคิวต่อสาขา (ต่อเครื่อง)
+    CASHOUT_WORKERS_PER_BRANCH = int(os.getenv("CASHOUT_WORKERS_PER_BRANCH", "1"))
+    CASHOUT_QUEUE_SIZE = int(os.getenv("CASHOUT_QUEUE_SIZE", "20"))
+    # งาน cashout ค้าง (สถานะใน withdraw_requests.cashout_job ไม่ขยับเกิน N วินาที) ถูกเก็บกู้โดย sweeper
+    CASHOUT_STALE_SECONDS = float(os.getenv("CASHOUT_STALE_SECONDS", "300"))
+    CASHOUT_SWEEP_INTERVAL = float(os.getenv("CASHOUT_SWEEP_INTERVAL", "60"))
+    CASHOUT_MAX_ATTEMPTS = int(os.getenv("CASHOUT_MAX_ATTEMPTS", "3"))
+    # endpoint ของเครื่องสำหรับถามผล cashout ตาม X-Sale-Id (ว่าง = ไม่ถาม: งานที่ค้างระหว่างจ่ายเงินตั้งเป็น error ให้ตรวจเอง)
+    # REST_API_CI ยังไม่มี endpoint นี้: ตั้งเมื่อเครื่องรองรับแล้วเท่านั้น (loadtest/machine_sim.py มี /cashout/status)
+    CASHOUT_STATUS_PATH = os.getenv("CASHOUT_STATUS_PATH", "")
+    # เวลารองานในคิวให้เสร็จก่อน gunicorn worker จบ (ต้องน้อยกว่า graceful_timeout)
+    CASHOUT_DRAIN_SECONDS = float(os.getenv("CASHOUT_DRAIN_SECONDS", "25"))
+
+    # MongoDB: client สร้างตอนใช้งานครั้งแรก หนึ่งตัวต่อ process (ดู db.Database)
+    MONGODB_URI = os.getenv("MONGODB_URI")
+    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "kf_hr")
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+    # log คำสั่ง MongoDB ที่ช้ากว่าค่านี้ (ms) พร้อมรูปร่างของ filter
+    MONGO_SLOW_COMMAND_MS = float(os.getenv("MONGO_SLOW_COMMAND_MS", "100"))
+
+    # data migration (python -m migrations): เอกสารต่อ bulk_write และการหน่วงระหว่าง batch
+    # duty cycle 0.5 = พักเท่ากับเวลาที่ใช้ต่อ batch; docs/s 0 = ไม่จำกัด
+    MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+    MIGRATION_DUTY_CYCLE = float(os.getenv("MIGRATION_DUTY_CYCLE", "0.5"))
+    MIGRATION_MAX_DOCS_PER_SECOND = float(os.getenv("MIGRATION_MAX_DOCS_PER_SECOND", "2000"))
+
+    # สร้าง index ของ collection เงินตอนแอปเริ่ม (idempotent)
+    MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
+
+    # SSE ยอดเงินฝาก: poll /socket/latest หนึ่งครั้งต่อรอบต่อ session แล้วกระจายให้ทุกหน้าจอ
+    SOCKET_STREAM_POLL_INTERVAL = float(os.getenv("SOCKET_STREAM_POLL_INTERVAL", "1"))
+    SOCKET_STREAM_IDLE_TIMEOUT = float(os.getenv("SOCKET_STREAM_IDLE_TIMEOUT", "30"))
+    # ตรวจ deposit_requests ว่า session จบแล้วหรือยัง (จบที่ worker อื่นก็หยุด poll ได้)
+    SOCKET_STREAM_END_CHECK_INTERVAL = float(os.getenv("SOCKET_STREAM_END_CHECK_INTERVAL", "2"))
+
+    # จำนวน SSE stream (socket-latest-stream + pending-stream) พร้อมกันต่อ worker เกินแล้วตอบ 503
+    # gthread: หนึ่ง stream ถือหนึ่ง thread ตลอดเวลาที่เปิด ต้องน้อยกว่า GUNICORN_THREADS; 0 = ไม่จำกัด (gevent)
+    SSE_MAX_STREAMS_PER_WORKER = int(os.getenv("SSE_MAX_STREAMS_PER_WORKER", "8"))
+
+    # cache /socket/latest ต่อ (base URL, session): request พร้อมกันรวมเป็น read เดียว
+    SOCKET_LATEST_CACHE_TTL = float(os.getenv("SOCKET_LATEST_CACHE_TTL", "0.8"))
+
+    # webhook LINE: ตอบ 200 ทันที แล้วประมวลผล event ใน worker (หนึ่ง worker ต่อ partition ของผู้ใช้)
+    WEBHOOK_PARTITIONS = int(os.getenv("WEBHOOK_PARTITIONS", "4"))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))
+    # จำ webhookEventId ไว้ทิ้ง event ที่ LINE ส่งซ้ำ: "memory" (ต่อ process) หรือ "mongo" (ใช้ร่วมทุก worker)
+    # ตรวจใน webhook worker ไม่ใช่ใน request: "mongo" เพิ่ม write หนึ่งครั้งต่อ event
+    WEBHOOK_DEDUPE_STORE = os.getenv("WEBHOOK_DEDUPE_STORE", "memory")
+    WEBHOOK_DEDUPE_TTL = float(os.getenv("WEBHOOK_DEDUPE_TTL", "600"))
+    WEBHOOK_DEDUPE_MAX_ENTRIES = int(os.getenv("WEBHOOK_DEDUPE_MAX_ENTRIES", "10000"))
+
+    # state การคุยกับ LINE bot ต่อผู้ใช้: "mongo" (ใช้ร่วมทุก worker) หรือ "memory" (ต่อ process)
+    SESSION_STORE = os.getenv("SESSION_STORE", "mongo")
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+
+    # SSE หน้าอนุมัติ: change stream ของ withdraw_requests (poll ทุก N วินาที ถ้าไม่ใช่ replica set)
+    PENDING_STREAM_POLL_INTERVAL = float(os.getenv("PENDING_STREAM_POLL_INTERVAL", "2"))
+    PENDING_STREAM_IDLE_TIMEOUT = float(os.getenv("PENDING_STREAM_IDLE_TIMEOUT", "60"))
+    # เวอร์ชันของแอปที่ deploy (เช่น git sha) ผสมใน ETag ของหน้า HTML: deploy ใหม่แล้ว browser ไม่ได้ 304 ของหน้าเก่า
+    APP_VERSION = os.getenv("APP_VERSION", "")
+
+    # หน้า /money/request-status: จำนวนแถวต่อหน้าต่อ section (โหลดเพิ่มด้วย cursor)
+    REQUEST_STATUS_PAGE_SIZE = int(os.getenv("REQUEST_STATUS_PAGE_SIZE", "50"))
+    REQUEST_STATUS_MAX_PAGE_SIZE = int(os.getenv("REQUEST_STATUS_MAX_PAGE_SIZE", "200"))
+
+    # ส่งออก CSV: จำนวนเอกสารต่อ batch ของ cursor / ต่อ chunk ที่ส่งให้ browser
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
@@ -0,0 +1,160 @@
+import argparse
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from time_utils import now_bangkok_and_utc
+
+logger = logging.getLogger(__name__)
+
+# ประเภทยอดรวมรายวัน
+ROLLUP_WITHDRAW_APPROVED = "withdraw_approved"
+ROLLUP_DEPOSIT_COMPLETED = "deposit_completed"
+ROLLUP_EXPENSE = "expense"
+ROLLUP_TYPES = (ROLLUP_WITHDRAW_APPROVED, ROLLUP_DEPOSIT_COMPLETED, ROLLUP_EXPENSE)
+
+
+def _to_amount(value: Any) -> float:
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def record_rollup(collection, *, date_bkk: str, location: Optional[str], rollup_type: str, amount: Any) -> None:
+    """
+    เพิ่มยอดของ (วันที่, สาขา, ประเภท) ด้วย $inc แบบ upsert (หนึ่งเอกสารเล็กต่อ key)
+    เรียกตรงจุดที่สถานะกลายเป็น approved / completed หรือบันทึก transaction แล้วเท่านั้น
+    ไม่ raise: ยอดรวมสร้างใหม่ได้ด้วย rebuild จึงไม่ควรทำให้ธุรกรรมหลักล้ม
+    """
+    try:
+        _, now_utc = now_bangkok_and_utc()
+        collection.update_one(
+            {"created_date_bkk": date_bkk, "location": location, "type": rollup_type},
+            {
+                "$inc": {"count": 1, "amount": _to_amount(amount)},
+                "$set": {"updated_at_utc": now_utc.isoformat()},
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        logger.error(f"❌ [ROLLUP] อัปเดตยอด {rollup_type} {date_bkk} {location} ไม่สำเร็จ: {str(e)}")
+
+
+def get_daily_totals(
+    collection,
+    *,
+    start_date: str,
+    end_date: str,
+    location: Optional[str] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    รวมยอดจาก daily_rollups ของช่วงวันที่ (และสาขา ถ้าระบุ)
+    คืนค่า {ประเภท: {"count": .., "amount": ..}} ครบทุกประเภท
+    """
+    query: Dict[str, Any] = {
+        "created_date_bkk": start_date if start_date == end_date else {"$gte": start_date, "$lte": end_date},
+    }
+    if location:
+        query["location"] = location
+
+    totals = {t: {"count": 0, "amount": 0.0} for t in ROLLUP_TYPES}
+    for doc in collection.find(query, {"_id": 0, "type": 1, "count": 1, "amount": 1}):
+        bucket = totals.setdefault(doc.get("type"), {"count": 0, "amount": 0.0})
+        bucket["count"] += doc.get("count", 0)
+        bucket["amount"] += doc.get("amount", 0.0)
+    return totals
+
+
+def _amount_expr(field: str) -> Dict[str, Any]:
+    return {"$convert": {"input": field, "to": "double", "onError": 0, "onNull": 0}}
+
+
+def _date_match(field: str, start_date: Optional[str], end_date: Optional[str]) -> Dict[str, Any]:
+    if not start_date and not end_date:
+        return {}
+    cond: Dict[str, Any] = {}
+    if start_date:
+        cond["$gte"] = start_date
+    if end_date:
+        cond["$lte"] = end_date
+    return {field: cond}
+
+
+def _rollup_sources(db) -> Dict[str, tuple]:
+    """แหล่งข้อมูลของแต่ละประเภท: (collection, match, field วันที่, field สาขา, field ยอดเงิน)"""
+    return {
+        ROLLUP_WITHDRAW_APPROVED: (db["withdraw_requests"], {"status": "approved"}, "$created_date_bkk", "$location", "$amount"),
+        ROLLUP_DEPOSIT_COMPLETED: (db["deposit_requests"], {"status": "completed"}, "$created_date_bkk", "$location", "$amount"),
+        # เฉพาะค่าใช้จ่ายที่มาจากคำขอเบิกเงินผ่านไลน์ (save_expense_to_transactions)
+        ROLLUP_EXPENSE: (
+            db["transactions"],
+            {"type": "expense", "request_id": {"$exists": True, "$ne": None}},
+            "$selectedDate",
+            "$selectedStorage",
+            "$amount",
+        ),
+    }
+
+
+def rebuild_rollups(db, *, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, int]:
+    """
+    สร้าง daily_rollups ใหม่จากข้อมูลดิบ (ใช้ backfill / แก้ยอดเพี้ยน)
+    ลบยอดของช่วงวันที่นั้นแล้วเขียนใหม่ทั้งหมด: ควรรันนอกเวลาทำการ เพราะ $inc ที่เกิดระหว่างรันอาจหาย
+    คืนค่า {ประเภท: จำนวนเอกสาร rollup ที่เขียน}
+    """
+    rollups = db["daily_rollups"]
+    _, now_utc = now_bangkok_and_utc()
+    result: Dict[str, int] = {}
+
+    for rollup_type, (source, match, date_field, location_field, amount_field) in _rollup_sources(db).items():
+        match = dict(match)
+        match.update(_date_match(date_field[1:], start_date, end_date))
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"date": date_field, "location": location_field},
+                    "count": {"$sum": 1},
+                    "amount": {"$sum": _amount_expr(amount_field)},
+                }
+            },
+        ]
+        groups = list(source.aggregate(pipeline))
+
+        delete_filter: Dict[str, Any] = {"type": rollup_type}
+        delete_filter.update(_date_match("created_date_bkk", start_date, end_date))
+        rollups.delete_many(delete_filter)
+
+        ops = [
+            UpdateOne(
+                {"created_date_bkk": g["_id"]["date"], "location": g["_id"].get("location"), "type": rollup_type},
+                {"$set": {"count": g["count"], "amount": g["amount"], "updated_at_utc": now_utc.isoformat()}},
+                upsert=True,
+            )
+            for g in groups
+            if g["_id"].get("date")
+        ]
+        if ops:
+            rollups.bulk_write(ops, ordered=False)
+        result[rollup_type] = len(ops)
+        logger.info(f"✅ [ROLLUP] rebuild {rollup_type}: {len(ops)} เอกสาร")
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="สร้างยอดรวมรายวัน (daily_rollups) ใหม่จากข้อมูลดิบ")
+    parser.add_argument("--start", help="วันที่เริ่ม YYYY-MM-DD (ไม่ระบุ = ทั้งหมด)")
+    parser.add_argument("--end", help="วันที่สิ้นสุด YYYY-MM-DD (ไม่ระบุ = ทั้งหมด)")
+    args = parser.parse_args()
+
+    from db import db
+
+    print(json.dumps(rebuild_rollups(db, start_date=args.start, end_date=args.end), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
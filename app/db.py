@@ -1,25 +1,86 @@
-from pymongo import MongoClient
 import os
-from dotenv import load_dotenv
+import threading
+
+from pymongo import MongoClient
+
+from config import Config
+from metrics import MongoPoolMetrics
+from mongo_monitoring import CommandMetrics
 
-# Load environment variables
-load_dotenv()
 
 class Database:
-    """ จัดการ Connection Pool ของ MongoDB """
+    """
+    จัดการ Connection Pool ของ MongoDB
+    สร้าง MongoClient ตอนใช้งานครั้งแรก (ไม่ใช่ตอน import) และหนึ่ง client ต่อ process:
+    ถ้า pid เปลี่ยน (fork ของ gunicorn) จะสร้าง client ใหม่ ไม่ใช้ connection ของ process แม่
+    """
     _client = None
+    _pid = None
+    _lock = threading.Lock()
 
     @classmethod
     def get_connection(cls):
-        """ คืนค่า MongoClient ที่เชื่อมต่ออยู่ """
-        if cls._client is None:
-            mongodb_uri = os.getenv("MONGODB_URI")
-            cls._client = MongoClient(mongodb_uri, maxPoolSize=50, minPoolSize=5)
+        """ คืนค่า MongoClient ของ process นี้ """
+        pid = os.getpid()
+        if cls._client is None or cls._pid != pid:
+            with cls._lock:
+                if cls._client is None or cls._pid != pid:
+                    cls._client = MongoClient(
+                        Config.MONGODB_URI,
+                        maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                        minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                        maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                        serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                        event_listeners=[MongoPoolMetrics(), CommandMetrics(Config.MONGO_SLOW_COMMAND_MS)],
+                    )
+                    cls._pid = pid
         return cls._client
 
-# สร้าง Database Instance
-db_client = Database.get_connection()
-db = db_client["kf_hr"]  # ใช้ database ตามที่กำหนดใน .env
+    @classmethod
+    def get_database(cls):
+        return cls.get_connection()[Config.MONGO_DB_NAME]
+
+    @classmethod
+    def reset(cls):
+        """ ทิ้ง client ที่สร้างไว้ (เช่น หลัง fork ของ gunicorn) ครั้งถัดไปจะสร้างใหม่ """
+        with cls._lock:
+            if cls._client is not None and cls._pid == os.getpid():
+                cls._client.close()
+            # client ที่ได้มาจาก process แม่: ไม่ close (socket ยังเป็นของ process แม่)
+            cls._client = None
+            cls._pid = None
+
+
+class CollectionProxy:
+    """ handle ของ collection ที่ไม่ต่อ MongoDB จนกว่าจะเรียกใช้จริง (import ได้ทันที) """
+    __slots__ = ("_name",)
+
+    def __init__(self, name):
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    def __getattr__(self, attr):
+        return getattr(Database.get_database()[self._name], attr)
+
+    def __repr__(self):
+        return f"CollectionProxy({self._name!r})"
+
+
+class DatabaseProxy:
+    """ db["ชื่อ collection"] คืน CollectionProxy; attribute อื่นส่งต่อให้ Database ของ process นี้ """
+
+    def __getitem__(self, name):
+        return CollectionProxy(name)
+
+    def __getattr__(self, attr):
+        return getattr(Database.get_database(), attr)
+
+
+# สร้าง Database Instance (ยังไม่เชื่อมต่อ)
+db = DatabaseProxy()
 
 # คำขอเบิกเงินสด
 requests_collection = db["withdraw_requests"]
@@ -28,4 +89,10 @@ requests_collection = db["withdraw_requests"]
 deposit_requests_collection = db["deposit_requests"]
 
 # ธุรกรรมการเงินที่สำเร็จแล้ว (ทั้งถอน/ฝาก)
-transactions_collection = db["transactions"]  # เพิ่ม collection สำหรับเก็บข้อมูลธุรกรรม
\ No newline at end of file
+transactions_collection = db["transactions"]  # เพิ่ม collection สำหรับเก็บข้อมูลธุรกรรม
+# ยอดรวมรายวันต่อ (วันที่, สาขา, ประเภท) อัปเดตด้วย $inc ตอนธุรกรรมสำเร็จ
+daily_rollups_collection = db["daily_rollups"]
+# state การคุยกับ LINE bot ต่อผู้ใช้ (ลบอัตโนมัติด้วย TTL index บน expires_at)
+line_sessions_collection = db["line_sessions"]
+# webhookEventId ที่รับแล้ว ใช้ทิ้ง event ที่ LINE ส่งซ้ำ (ลบอัตโนมัติด้วย TTL index บน expires_at)
+webhook_events_collection = db["webhook_events"]
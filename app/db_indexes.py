@@ -0,0 +1,143 @@
+import argparse
+import json
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# index ที่ route หลักต้องใช้ (ตั้งชื่อเองเพื่อให้ ensure ซ้ำได้แบบ idempotent)
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "withdraw_requests": [
+        # lookup ต่อคำขอ: approve / reject / withdraw-status
+        IndexModel([("request_id", ASCENDING)], name="uniq_request_id", unique=True),
+        # /money/approved-requests (status = pending) และ /money/request-status:
+        # equality status → sort (created_at_bkk, request_id) ตาม keyset → range ช่วงวันที่บน created_at_bkk
+        IndexModel(
+            [("status", ASCENDING), ("created_at_bkk", DESCENDING), ("request_id", DESCENDING)],
+            name="status_created_at_bkk_request_id",
+        ),
+        # export CSV: ช่วง created_date_bkk + สาขา
+        IndexModel(
+            [
+                ("created_date_bkk", ASCENDING),
+                ("status", ASCENDING),
+                ("location", ASCENDING),
+                ("created_at_bkk", DESCENDING),
+            ],
+            name="created_date_status_location",
+        ),
+        # หน้าปิดยอดรายวัน: ยอดเบิกที่ approved ตามวันที่อนุมัติ
+        IndexModel([("status", ASCENDING), ("approved_date_bkk", ASCENDING)], name="status_approved_date_bkk"),
+    ],
+    "deposit_requests": [
+        # deposit-status / deposit-info / socket-latest
+        IndexModel([("deposit_request_id", ASCENDING)], name="uniq_deposit_request_id", unique=True),
+        # /money/request-status (ฝั่งฝากเงิน): status → sort keyset → range created_at_bkk
+        IndexModel(
+            [("status", ASCENDING), ("created_at_bkk", DESCENDING), ("deposit_request_id", DESCENDING)],
+            name="status_created_at_bkk_deposit_request_id",
+        ),
+        # export CSV: ช่วง created_date_bkk + สาขา
+        IndexModel(
+            [
+                ("created_date_bkk", ASCENDING),
+                ("status", ASCENDING),
+                ("location", ASCENDING),
+                ("created_at_bkk", DESCENDING),
+            ],
+            name="created_date_status_location",
+        ),
+    ],
+    "transactions": [
+        # เชื่อมกลับไปที่ withdraw_requests.request_id
+        IndexModel([("request_id", ASCENDING)], name="request_id"),
+        # หน้าสรุปยอดเงินสิ้นวัน: วันที่ + สาขา + ประเภท
+        IndexModel(
+            [("selectedDate", ASCENDING), ("selectedStorage", ASCENDING), ("type", ASCENDING)],
+            name="selected_date_storage_type",
+        ),
+    ],
+    "daily_rollups": [
+        # หนึ่งเอกสารต่อ (วันที่, สาขา, ประเภท): upsert ด้วย $inc ต้องไม่สร้างซ้ำ
+        IndexModel(
+            [("created_date_bkk", ASCENDING), ("location", ASCENDING), ("type", ASCENDING)],
+            name="uniq_date_location_type",
+            unique=True,
+        ),
+    ],
+    "line_sessions": [
+        # ลบ session ของผู้ใช้ LINE เมื่อเลย expires_at
+        IndexModel([("expires_at", ASCENDING)], name="ttl_expires_at", expireAfterSeconds=0),
+    ],
+    "webhook_events": [
+        # webhookEventId ที่รับแล้ว (_id unique อยู่แล้ว): ลบเมื่อเลย expires_at
+        IndexModel([("expires_at", ASCENDING)], name="ttl_expires_at", expireAfterSeconds=0),
+    ],
+}
+
+
+def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    สร้าง index ตาม INDEX_SPECS (เรียกซ้ำได้: index ที่มีอยู่แล้วจะไม่ถูกสร้างใหม่)
+    คืนค่า {collection: [ชื่อ index ที่สร้าง/ยืนยันแล้ว]}
+    """
+    result: Dict[str, List[str]] = {}
+    for collection_name, models in INDEX_SPECS.items():
+        created: List[str] = []
+        for model in models:
+            try:
+                created.extend(db[collection_name].create_indexes([model]))
+            except OperationFailure as e:
+                # เช่น unique index สร้างไม่ได้เพราะมีข้อมูลซ้ำ: แจ้งไว้ แต่ไม่ทำให้แอปล้ม
+                logger.error(
+                    f"❌ [INDEX] สร้าง index {model.document['name']} ของ {collection_name} ไม่สำเร็จ: {str(e)}"
+                )
+        result[collection_name] = created
+    return result
+
+
+def report_indexes(db) -> Dict[str, Dict[str, Any]]:
+    """
+    รายงาน index ต่อ collection:
+    - missing: มีใน INDEX_SPECS แต่ยังไม่มีในฐานข้อมูล
+    - unused: มีในฐานข้อมูลแต่ไม่เคยถูกใช้ ($indexStats ตั้งแต่ mongod เริ่มทำงาน)
+    - unmanaged: มีในฐานข้อมูลแต่ไม่อยู่ใน INDEX_SPECS
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for collection_name, models in INDEX_SPECS.items():
+        col = db[collection_name]
+        expected = [m.document["name"] for m in models]
+        existing = set(col.index_information().keys())
+
+        try:
+            stats = list(col.aggregate([{"$indexStats": {}}]))
+            usage = {s["name"]: s.get("accesses", {}).get("ops", 0) for s in stats}
+        except OperationFailure:
+            usage = {}
+
+        report[collection_name] = {
+            "missing": [name for name in expected if name not in existing],
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_"),
+            "unmanaged": sorted(name for name in existing if name not in expected and name != "_id_"),
+            "usage": usage,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="จัดการ index ของ collection ระบบเงิน (kf_hr)")
+    parser.add_argument("command", choices=["ensure", "report"], nargs="?", default="ensure")
+    args = parser.parse_args()
+
+    from db import db
+
+    if args.command == "ensure":
+        print(json.dumps(ensure_indexes(db), ensure_ascii=False, indent=2))
+    print(json.dumps(report_indexes(db), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,20 +7,22 @@ from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage, ButtonsTemplate, TemplateSendMessage, PostbackAction, URITemplateAction
 )
 from config import Config
-from http_utils import build_correlation_headers, get_rest_api_ci_base_for_branch
+from http_utils import build_correlation_headers
+from branch_client import get_branch_client
 from db import requests_collection, deposit_requests_collection, transactions_collection  # ✅ ใช้ connection pool
 from time_utils import now_bangkok_and_utc
+from services.status_transition_service import transition_status
+from session_store import create_session_store
 
-# ✅ ตั้งค่า Logging ให้ใช้งานได้
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# ✅ ตั้งค่า Logging ที่ main.py (log_utils.setup_logging: เขียนผ่านคิว ไม่ block request)
 logger = logging.getLogger(__name__)  # ✅ แก้ไขให้ประกาศ logger ที่นี่
 
-# เก็บ state ของผู้ใช้
-user_session = {}
+# เก็บ state ของผู้ใช้ (มีวันหมดอายุ และใช้ร่วมกันทุก worker เมื่อใช้ backend mongo)
+session_store = create_session_store()
 
 def reset_state(user_id):
     """ รีเซ็ต state เมื่อเริ่มใหม่ """
-    user_session[user_id] = {
+    session = {
         "state": "choosing_action",
         "amount": None,
         "reason": None,
@@ -28,6 +30,16 @@ def reset_state(user_id):
         "location": None,
         "request_id": None
     }
+    session_store.set(user_id, session)
+    return session
+
+def get_state(user_id):
+    """ อ่าน state ของผู้ใช้ (เริ่มใหม่ถ้ายังไม่มีหรือหมดอายุแล้ว) """
+    return session_store.get(user_id) or reset_state(user_id)
+
+def update_state(user_id, **fields):
+    """ บันทึกเฉพาะ field ที่เปลี่ยน """
+    session_store.update(user_id, **fields)
 
 def generate_request_id():
     """ สร้างหมายเลขคำขอที่เป็น Unique """
@@ -37,8 +49,7 @@ def handle_user_request(event, line_bot_api):
     """ เริ่มต้นใหม่เมื่อพิมพ์ 'เมนู' """
     user_id = event.source.user_id
 
-    if user_id not in user_session:
-        reset_state(user_id)
+    get_state(user_id)
 
     reply_message = TemplateSendMessage(
         alt_text="กรุณาเลือกเมนู",
@@ -100,13 +111,12 @@ def handle_postback(event, line_bot_api):
     action = data[0]
     user_id = data[-1]
 
-    if user_id not in user_session:
-        reset_state(user_id)
+    session = get_state(user_id)
 
     reply_message = None
 
     if action == "menu_withdraw_cash":
-        user_session[user_id]["state"] = "choosing_amount"
+        update_state(user_id, state="choosing_amount")
         reply_message = TemplateSendMessage(
             alt_text="เลือกจำนวนเงินที่ต้องการเบิก",
             template=ButtonsTemplate(
@@ -121,53 +131,50 @@ def handle_postback(event, line_bot_api):
         )
 
     elif action == "deposit_cash":
-        user_session[user_id]["state"] = "waiting_for_deposit_amount"
+        update_state(user_id, state="waiting_for_deposit_amount")
         reply_message = TextSendMessage(text="📌 กรุณาพิมพ์จำนวนเงินที่ต้องการฝาก (ตัวเลขเท่านั้น)")
 
     elif action == "select_reason_deposit":
         reason = data[1]
-        user_session[user_id]["reason"] = reason
+        update_state(user_id, reason=reason, state="waiting_for_location_deposit")
         if reason == "other_deposit":
-            user_session[user_id]["state"] = "waiting_for_location_deposit"
             reply_message = TextSendMessage(text="📌 กรุณาระบุเหตุผลที่ฝากเงิน")
         else:
-            user_session[user_id]["state"] = "waiting_for_location_deposit"
             reply_message = send_location_menu(user_id)
 
 
     elif action == "select_amount":
         amount = data[1]
         if amount == "custom":
-            user_session[user_id]["state"] = "waiting_for_amount"
+            update_state(user_id, state="waiting_for_amount")
             reply_message = TextSendMessage(text="📌 กรุณาพิมพ์จำนวนเงินที่ต้องการเบิก (ตัวเลขเท่านั้น)")
         else:
             if not amount.isdigit():
                 reply_message = TextSendMessage(text="⚠️ กรุณาเลือกจำนวนเงินให้ถูกต้อง")
             else:
-                user_session[user_id]["amount"] = amount
-                user_session[user_id]["state"] = "choosing_reason"
+                update_state(user_id, amount=amount, state="choosing_reason")
                 reply_message = send_reason_menu(user_id)
 
     elif action == "select_reason":
         reason = data[1]
-        user_session[user_id]["reason"] = reason
 
         if reason == "fuel":
-            user_session[user_id]["state"] = "waiting_for_license_plate"
+            update_state(user_id, reason=reason, state="waiting_for_license_plate")
             reply_message = TextSendMessage(text="📌 กรุณากรอกหมายเลขทะเบียนรถ")
         elif reason == "other":
-            user_session[user_id]["state"] = "waiting_for_other_reason"
+            update_state(user_id, reason=reason, state="waiting_for_other_reason")
             reply_message = TextSendMessage(text="📌 กรุณาพิมพ์เหตุผลในการเบิกเงิน")
         else:
-            user_session[user_id]["state"] = "waiting_for_location"
+            update_state(user_id, reason=reason, state="waiting_for_location")
             reply_message = send_location_menu(user_id)
 
     elif action == "select_location":
-        location = user_session[user_id]["location"] = data[1]
-        amount = user_session[user_id]["amount"]
-        reson = user_session[user_id]["reason"]
-        state = user_session[user_id]["state"]
-        logger.info(f"❌ สถานะ {state} ตอนนี้")
+        location = data[1]
+        update_state(user_id, location=location)
+        amount = session["amount"]
+        reson = session["reason"]
+        state = session["state"]
+        logger.debug("สถานะ %s ตอนนี้", state)
         if  state == "waiting_for_location_deposit" and location == "noniko":
             # แม็ปเหตุผลให้เป็นข้อความอ่านง่าย
             if reson == "change":
@@ -179,7 +186,8 @@ def handle_postback(event, line_bot_api):
             
             location_text = "โนนิโกะ"
             branch_id = "NONIKO"
-            base_url = get_rest_api_ci_base_for_branch('NONIKO')
+            client = get_branch_client(branch_id)
+            base_url = client.base_url
             
             # สร้าง deposit_request_id และ correlation headers
             deposit_request_id = f"d-{uuid.uuid4().hex[:8]}"
@@ -231,40 +239,27 @@ def handle_postback(event, line_bot_api):
             
             # ยิง API /replenishment/start
             try:
-                replenishment_start_url = f"{base_url}/replenishment/start"
+                replenishment_start_url = client.url("/replenishment/start")
                 replenishment_payload = {
                     "seq_no": seq_no,
                     "session_id": session_id
                 }
                 
                 logger.info(f"📤 [DEPOSIT] กำลังยิง /replenishment/start: {replenishment_start_url}")
-                start_response = requests.post(replenishment_start_url, json=replenishment_payload, headers=headers, timeout=10)
+                start_response = client.post("/replenishment/start", json=replenishment_payload, headers=headers, timeout=10)
                 start_response.raise_for_status()
                 start_data = start_response.json()
                 
                 if not start_data.get("success"):
                     error_msg = start_data.get("error", "Unknown error from /replenishment/start")
                     logger.error(f"❌ [DEPOSIT] /replenishment/start failed: {error_msg}")
-                    now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                    deposit_requests_collection.update_one(
+                    transition_status(
+                        deposit_requests_collection,
                         {"deposit_request_id": deposit_request_id},
-                        {
-                            "$set": {
-                                "status": "error",
-                                "error_message": f"/replenishment/start failed: {error_msg}",
-                                "updated_at_bkk": now_bkk_err.isoformat(),
-                                "updated_at_utc": now_utc_err.isoformat(),
-                            },
-                            "$push": {
-                                "status_history": {
-                                    "status": "error",
-                                    "at_bkk": now_bkk_err.isoformat(),
-                                    "at_utc": now_utc_err.isoformat(),
-                                    "date_bkk": now_bkk_err.date().isoformat(),
-                                    "by": "line_bot_handler",
-                                }
-                            },
-                        },
+                        from_status="replenishment_started",
+                        to_status="error",
+                        by="line_bot_handler",
+                        set_fields={"error_message": f"/replenishment/start failed: {error_msg}"},
                     )
                     text = (
                         f"❌ คำขอฝากเงิน\n"
@@ -273,13 +268,17 @@ def handle_postback(event, line_bot_api):
                         f"⚠️ เกิดข้อผิดพลาดในการเริ่มต้นการฝากเงิน"
                     )
                 else:
-                    logger.info(f"✅ [DEPOSIT] /replenishment/start สำเร็จ: {start_data}")
-                    # เก็บ session_id และ seq_no ใน user_session เพื่อใช้ในหน้าถัดไป
-                    user_session[user_id]["deposit_request_id"] = deposit_request_id
-                    user_session[user_id]["session_id"] = session_id
-                    user_session[user_id]["seq_no"] = seq_no
-                    user_session[user_id]["branch_base_url"] = base_url
-                    user_session[user_id]["replenishment_status"] = "active"
+                    logger.info("✅ [DEPOSIT] /replenishment/start สำเร็จ")
+                    logger.debug("✅ [DEPOSIT] /replenishment/start response: %s", start_data)
+                    # เก็บ session_id และ seq_no ใน state ผู้ใช้ เพื่อใช้ในหน้าถัดไป
+                    update_state(
+                        user_id,
+                        deposit_request_id=deposit_request_id,
+                        session_id=session_id,
+                        seq_no=seq_no,
+                        branch_base_url=base_url,
+                        replenishment_status="active",
+                    )
                     
                     # ส่งข้อความพร้อมลิงก์ไปหน้า UI สำหรับแสดงยอดเงิน
                     text = (
@@ -307,26 +306,13 @@ def handle_postback(event, line_bot_api):
                     
             except requests.exceptions.RequestException as e:
                 logger.error(f"❌ [DEPOSIT] Request Exception: {str(e)}")
-                now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                deposit_requests_collection.update_one(
+                transition_status(
+                    deposit_requests_collection,
                     {"deposit_request_id": deposit_request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "error_message": f"Request exception: {str(e)}",
-                            "updated_at_bkk": now_bkk_err.isoformat(),
-                            "updated_at_utc": now_utc_err.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk_err.isoformat(),
-                                "at_utc": now_utc_err.isoformat(),
-                                "date_bkk": now_bkk_err.date().isoformat(),
-                                "by": "line_bot_handler",
-                            }
-                        },
-                    },
+                    from_status="replenishment_started",
+                    to_status="error",
+                    by="line_bot_handler",
+                    set_fields={"error_message": f"Request exception: {str(e)}"},
                 )
                 text = (
                     f"❌ คำขอฝากเงิน\n"
@@ -336,27 +322,13 @@ def handle_postback(event, line_bot_api):
                 )
             except Exception as e:
                 logger.error(f"❌ [DEPOSIT] Error (โนนิโกะ): {str(e)}")
-                now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                date_bkk_err = now_bkk_err.date().isoformat()
-                deposit_requests_collection.update_one(
+                transition_status(
+                    deposit_requests_collection,
                     {"deposit_request_id": deposit_request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "error_message": str(e),
-                            "updated_at_bkk": now_bkk_err.isoformat(),
-                            "updated_at_utc": now_utc_err.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk_err.isoformat(),
-                                "at_utc": now_utc_err.isoformat(),
-                                "date_bkk": date_bkk_err,
-                                "by": "line_bot_handler",
-                            }
-                        },
-                    },
+                    from_status="replenishment_started",
+                    to_status="error",
+                    by="line_bot_handler",
+                    set_fields={"error_message": str(e)},
                 )
                 text = (
                     f"⚠️ คำขอฝากเงิน\n"
@@ -378,7 +350,8 @@ def handle_postback(event, line_bot_api):
             
             location_text = "คลังห้องเย็น"
             branch_id = "Klangfrozen"
-            base_url = get_rest_api_ci_base_for_branch('Klangfrozen')
+            client = get_branch_client(branch_id)
+            base_url = client.base_url
             
             # สร้าง deposit_request_id และ correlation headers
             deposit_request_id = f"d-{uuid.uuid4().hex[:8]}"
@@ -430,40 +403,27 @@ def handle_postback(event, line_bot_api):
             
             # ยิง API /replenishment/start
             try:
-                replenishment_start_url = f"{base_url}/replenishment/start"
+                replenishment_start_url = client.url("/replenishment/start")
                 replenishment_payload = {
                     "seq_no": seq_no,
                     "session_id": session_id
                 }
                 
                 logger.info(f"📤 [DEPOSIT] กำลังยิง /replenishment/start: {replenishment_start_url}")
-                start_response = requests.post(replenishment_start_url, json=replenishment_payload, headers=headers, timeout=10)
+                start_response = client.post("/replenishment/start", json=replenishment_payload, headers=headers, timeout=10)
                 start_response.raise_for_status()
                 start_data = start_response.json()
                 
                 if not start_data.get("success"):
                     error_msg = start_data.get("error", "Unknown error from /replenishment/start")
                     logger.error(f"❌ [DEPOSIT] /replenishment/start failed: {error_msg}")
-                    now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                    deposit_requests_collection.update_one(
+                    transition_status(
+                        deposit_requests_collection,
                         {"deposit_request_id": deposit_request_id},
-                        {
-                            "$set": {
-                                "status": "error",
-                                "error_message": f"/replenishment/start failed: {error_msg}",
-                                "updated_at_bkk": now_bkk_err.isoformat(),
-                                "updated_at_utc": now_utc_err.isoformat(),
-                            },
-                            "$push": {
-                                "status_history": {
-                                    "status": "error",
-                                    "at_bkk": now_bkk_err.isoformat(),
-                                    "at_utc": now_utc_err.isoformat(),
-                                    "date_bkk": now_bkk_err.date().isoformat(),
-                                    "by": "line_bot_handler",
-                                }
-                            },
-                        },
+                        from_status="replenishment_started",
+                        to_status="error",
+                        by="line_bot_handler",
+                        set_fields={"error_message": f"/replenishment/start failed: {error_msg}"},
                     )
                     text = (
                         f"❌ คำขอฝากเงิน\n"
@@ -472,13 +432,17 @@ def handle_postback(event, line_bot_api):
                         f"⚠️ เกิดข้อผิดพลาดในการเริ่มต้นการฝากเงิน"
                     )
                 else:
-                    logger.info(f"✅ [DEPOSIT] /replenishment/start สำเร็จ: {start_data}")
-                    # เก็บ session_id และ seq_no ใน user_session เพื่อใช้ในหน้าถัดไป
-                    user_session[user_id]["deposit_request_id"] = deposit_request_id
-                    user_session[user_id]["session_id"] = session_id
-                    user_session[user_id]["seq_no"] = seq_no
-                    user_session[user_id]["branch_base_url"] = base_url
-                    user_session[user_id]["replenishment_status"] = "active"
+                    logger.info("✅ [DEPOSIT] /replenishment/start สำเร็จ")
+                    logger.debug("✅ [DEPOSIT] /replenishment/start response: %s", start_data)
+                    # เก็บ session_id และ seq_no ใน state ผู้ใช้ เพื่อใช้ในหน้าถัดไป
+                    update_state(
+                        user_id,
+                        deposit_request_id=deposit_request_id,
+                        session_id=session_id,
+                        seq_no=seq_no,
+                        branch_base_url=base_url,
+                        replenishment_status="active",
+                    )
                     
                     # ส่งข้อความพร้อมลิงก์ไปหน้า UI สำหรับแสดงยอดเงิน
                     text = (
@@ -506,26 +470,13 @@ def handle_postback(event, line_bot_api):
                     
             except requests.exceptions.RequestException as e:
                 logger.error(f"❌ [DEPOSIT] Request Exception: {str(e)}")
-                now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                deposit_requests_collection.update_one(
+                transition_status(
+                    deposit_requests_collection,
                     {"deposit_request_id": deposit_request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "error_message": f"Request exception: {str(e)}",
-                            "updated_at_bkk": now_bkk_err.isoformat(),
-                            "updated_at_utc": now_utc_err.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk_err.isoformat(),
-                                "at_utc": now_utc_err.isoformat(),
-                                "date_bkk": now_bkk_err.date().isoformat(),
-                                "by": "line_bot_handler",
-                            }
-                        },
-                    },
+                    from_status="replenishment_started",
+                    to_status="error",
+                    by="line_bot_handler",
+                    set_fields={"error_message": f"Request exception: {str(e)}"},
                 )
                 text = (
                     f"❌ คำขอฝากเงิน\n"
@@ -535,27 +486,13 @@ def handle_postback(event, line_bot_api):
                 )
             except Exception as e:
                 logger.error(f"❌ [DEPOSIT] Error (คลังห้องเย็น): {str(e)}")
-                now_bkk_err, now_utc_err = now_bangkok_and_utc()
-                date_bkk_err = now_bkk_err.date().isoformat()
-                deposit_requests_collection.update_one(
+                transition_status(
+                    deposit_requests_collection,
                     {"deposit_request_id": deposit_request_id},
-                    {
-                        "$set": {
-                            "status": "error",
-                            "error_message": str(e),
-                            "updated_at_bkk": now_bkk_err.isoformat(),
-                            "updated_at_utc": now_utc_err.isoformat(),
-                        },
-                        "$push": {
-                            "status_history": {
-                                "status": "error",
-                                "at_bkk": now_bkk_err.isoformat(),
-                                "at_utc": now_utc_err.isoformat(),
-                                "date_bkk": date_bkk_err,
-                                "by": "line_bot_handler",
-                            }
-                        },
-                    },
+                    from_status="replenishment_started",
+                    to_status="error",
+                    by="line_bot_handler",
+                    set_fields={"error_message": str(e)},
                 )
                 text = (
                     f"⚠️ คำขอฝากเงิน\n"
@@ -579,54 +516,48 @@ def handle_text_input(event, line_bot_api):
     text = event.message.text.strip()
     reply_message = None
 
-    if user_id not in user_session:
-        reset_state(user_id)
+    session = get_state(user_id)
 
     if text.lower() == "เมนู":
         reset_state(user_id)
         handle_user_request(event, line_bot_api)
         return
     elif text.lower() == "ขอไอดี":
-        reset_state(user_id)
+        session = reset_state(user_id)
         reply_message = TextSendMessage(text=f"⚠️ {user_id}")
 
-    current_state = user_session[user_id]["state"]
+    current_state = session["state"]
 
     if current_state == "waiting_for_amount":
         if text.isdigit():
-            user_session[user_id]["amount"] = text
-            user_session[user_id]["state"] = "choosing_reason"
+            update_state(user_id, amount=text, state="choosing_reason")
             reply_message = send_reason_menu(user_id)
         else:
             reply_message = TextSendMessage(text="⚠️ กรุณากรอกจำนวนเงินเป็นตัวเลขเท่านั้น")
 
     elif current_state == "waiting_for_deposit_amount":
         if text.isdigit():
-            user_session[user_id]["amount"] = text
-            user_session[user_id]["state"] = "choosing_reason_deposit"
+            update_state(user_id, amount=text, state="choosing_reason_deposit")
             reply_message = send_reason_deposit_menu(user_id)
         else:
             reply_message = TextSendMessage(text="⚠️ กรุณากรอกจำนวนเงินเป็นตัวเลขเท่านั้น")
 
     elif current_state == "waiting_for_license_plate":
         if len(text.strip()) > 0:
-            user_session[user_id]["license_plate"] = text
-            user_session[user_id]["state"] = "waiting_for_location"
+            update_state(user_id, license_plate=text, state="waiting_for_location")
             reply_message = send_location_menu(user_id)
         else:
             reply_message = TextSendMessage(text="⚠️ กรุณากรอกหมายเลขทะเบียนรถ")
 
     elif current_state == "waiting_for_other_reason":
         if len(text.strip()) > 0:
-            user_session[user_id]["reason"] = text
-            user_session[user_id]["state"] = "waiting_for_location"
+            update_state(user_id, reason=text, state="waiting_for_location")
             reply_message = send_location_menu(user_id)
         else:
             reply_message = TextSendMessage(text="⚠️ กรุณากรอกเหตุผลให้ครบถ้วน")
     elif current_state == "waiting_for_location_deposit":
         if len(text.strip()) > 0:
-            user_session[user_id]["reason"] = text
-            user_session[user_id]["state"] = "waiting_for_location_deposit"
+            update_state(user_id, reason=text, state="waiting_for_location_deposit")
             reply_message = send_location_menu(user_id)
         else:
             reply_message = TextSendMessage(text="⚠️ กรุณากรอกเหตุผลให้ครบถ้วน")
@@ -637,10 +568,11 @@ def send_summary(user_id, line_bot_api):
     """ ตรวจสอบข้อมูลก่อนบันทึกลง MongoDB และส่งสรุปคำขอ """
 
     # ตรวจสอบว่าข้อมูลครบถ้วนหรือไม่
-    amount = user_session[user_id].get("amount")
-    reason = user_session[user_id].get("reason")
-    location = user_session[user_id].get("location")
-    license_plate = user_session[user_id].get("license_plate") if reason == "fuel" else None
+    session = get_state(user_id)
+    amount = session.get("amount")
+    reason = session.get("reason")
+    location = session.get("location")
+    license_plate = session.get("license_plate") if reason == "fuel" else None
 
     if not amount or not reason or not location or (reason == "fuel" and not license_plate):
         reset_state(user_id)
@@ -652,7 +584,7 @@ def send_summary(user_id, line_bot_api):
     date_bkk = now_bkk.date().isoformat()
 
     request_id = generate_request_id()
-    user_session[user_id]["request_id"] = request_id
+    update_state(user_id, request_id=request_id)
 
     location_text = "คลังห้องเย็น" if location == "cold_storage" else "โนนิโกะ"
 
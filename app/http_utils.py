@@ -1,6 +1,7 @@
 import uuid
 from typing import Dict, Tuple, Optional
 from config import Config
+from log_utils import bind_correlation
 
 
 def build_correlation_headers(
@@ -15,6 +16,9 @@ def build_correlation_headers(
     Returns a tuple of:
       - headers: dict[str, str]
       - meta: dict[str, str] containing trace_id, request_id, sale_id for persistence
+
+    The ids are also bound to the current logging context, so later log lines
+    of the same request / background job carry them.
     """
     if trace_id is None:
         trace_id = f"t-{uuid.uuid4().hex[:8]}"
@@ -23,6 +27,8 @@ def build_correlation_headers(
     if sale_id is None:
         sale_id = f"s-{uuid.uuid4().hex[:8]}"
 
+    bind_correlation(trace_id=trace_id, request_id=request_id, sale_id=sale_id)
+
     headers = {
         "Content-Type": "application/json",
         "X-Trace-Id": trace_id,
@@ -37,19 +43,49 @@ def build_correlation_headers(
     }
 
 
+# branch_id ของเครื่อง REST_API_CI (ชื่อหลัก) และชื่อเรียกอื่นที่ยังใช้อยู่ในข้อมูลเก่า
+KNOWN_BRANCH_IDS = ("NONIKO", "Klangfrozen")
+BRANCH_ALIASES = {
+    "noniko": "NONIKO",
+    "branch_noniko": "NONIKO",
+    "klangfrozen": "Klangfrozen",
+    "klanfrozen": "Klangfrozen",
+    "cold_storage": "Klangfrozen",
+    "coldstorage": "Klangfrozen",
+}
+
+
+def canonical_branch_id(branch_id: Optional[str]) -> Optional[str]:
+    """ชื่อหลักของสาขา (NONIKO / Klangfrozen) หรือ None ถ้าไม่รู้จัก"""
+    return BRANCH_ALIASES.get((branch_id or "").strip().lower())
+
+
 def get_rest_api_ci_base_for_branch(branch_id: Optional[str]) -> str:
     """
     Resolve REST_API_CI base URL per branch when overrides are configured.
     Falls back to Config.REST_API_CI_BASE.
     """
-    b = (branch_id or "").strip().lower()
+    b = canonical_branch_id(branch_id)
     # Hard routing as requested:
     # - NONIKO -> 10.0.0.14:5000
     # - Klangfrozen/ColdStorage -> 10.0.0.15:5000
-    if b in ("noniko", "branch_noniko"):
-        return "http://10.0.0.14:5000"
-    if b in ("klangfrozen", "klanfrozen", "cold_storage", "coldstorage"):
-        return "http://10.0.0.15:5000"
+    # REST_API_CI_BASE_<BRANCH> ใช้แทนได้ (เช่น ชี้ไปที่ loadtest/machine_sim.py)
+    if b == "NONIKO":
+        return Config.REST_API_CI_BASE_NONIKO or "http://10.0.0.14:5000"
+    if b == "Klangfrozen":
+        return Config.REST_API_CI_BASE_KLANGFROZEN or "http://10.0.0.15:5000"
     return Config.REST_API_CI_BASE
 
 
+def branch_id_for_base(base_url: Optional[str]) -> Optional[str]:
+    """
+    สาขาที่ base URL นี้เป็นของ (เทียบกับ base URL ที่ตั้งค่าไว้เท่านั้น)
+    URL อื่นที่ client ส่งมาคืนค่า None: ห้ามใช้ยิง request ออกไป
+    """
+    key = (base_url or "").strip().rstrip("/")
+    if not key:
+        return None
+    for branch_id in KNOWN_BRANCH_IDS:
+        if get_rest_api_ci_base_for_branch(branch_id).rstrip("/") == key:
+            return branch_id
+    return None
@@ -0,0 +1,133 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# trace_id / request_id / sale_id ของงานที่กำลังทำ (ต่อ request / ต่องานใน worker pool)
+CORRELATION_FIELDS = ("trace_id", "request_id", "sale_id")
+_correlation: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("correlation", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+def bind_correlation(**fields: Optional[str]) -> None:
+    """ผูก correlation id กับ context ปัจจุบัน: log ต่อจากนี้ใน context เดียวกันจะมี field เหล่านี้"""
+    current = dict(_correlation.get())
+    current.update({k: str(v) for k, v in fields.items() if k in CORRELATION_FIELDS and v})
+    _correlation.set(current)
+
+
+def clear_correlation() -> None:
+    _correlation.set({})
+
+
+def get_correlation() -> Dict[str, str]:
+    return _correlation.get()
+
+
+class CorrelationFilter(logging.Filter):
+    """เติม correlation id ลงใน record (ทำใน thread ที่ log ก่อนเข้าคิว)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _correlation.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """หนึ่งบรรทัดต่อ log เป็น JSON (grep / jq ตาม trace_id ได้ทั้ง transaction)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key in CORRELATION_FIELDS:
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    """
+    เหมือน QueueHandler แต่ไม่ format ข้อความใน thread ของ request
+    (getMessage ทำตอน listener เขียนออก; args ต้องไม่ถูกแก้หลัง log ซึ่งเป็นแบบนั้นอยู่แล้ว)
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # traceback อ้าง frame ของ thread นี้: แปลงเป็นข้อความก่อนส่งข้าม thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json") -> None:
+    """
+    ตั้งค่า root logger: ทุก log เข้าคิว (ไม่ block request) แล้ว QueueListener thread เขียนลง stderr
+    เรียกซ้ำได้ (เช่น หลัง fork จะเริ่ม listener ใหม่ใน process ลูก)
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(
+            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s [trace_id=%(trace_id)s]", defaults={"trace_id": "-"})
+        )
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    queue_handler = _PreformattedQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """เขียน log ที่ค้างในคิวให้หมดแล้วหยุด listener"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+def init_app(app) -> None:
+    """เริ่ม correlation ใหม่ทุก request (thread ของ gunicorn ถูกใช้ซ้ำ) และรับ X-Trace-Id จากผู้เรียกถ้ามี"""
+    from flask import request
+
+    @app.before_request
+    def _bind_request_correlation():
+        clear_correlation()
+        bind_correlation(
+            trace_id=request.headers.get("X-Trace-Id") or request.args.get("trace_id"),
+            request_id=request.headers.get("X-Request-Id"),
+        )
@@ -1,12 +1,31 @@
+import logging
+import threading
+
 from flask import Flask, request
 from linebot import WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from config import Config
+import log_utils
+
+# ตั้งค่า log ก่อน import โมดูลอื่นของแอป
+log_utils.setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT)
+
+from webhook_queue import WebhookQueue, create_seen_set  # noqa: E402
 
 app = Flask(__name__)
 
 handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
 
+# ตรวจ signature แล้วตอบ LINE ทันที: event ไปประมวลผลใน worker pool
+# event ที่ประมวลผลแล้วจำไว้ตาม WEBHOOK_DEDUPE_STORE (ค่าเริ่มต้นต่อ process; "mongo" ใช้ร่วมทุก worker)
+webhook_queue = WebhookQueue(
+    handler,
+    channel_secret=Config.LINE_CHANNEL_SECRET,
+    partitions=Config.WEBHOOK_PARTITIONS,
+    queue_size=Config.WEBHOOK_QUEUE_SIZE,
+    seen=create_seen_set(),
+)
+
 @app.route("/money/webhook", methods=["POST"])
 def webhook():
     # Deprecated: chat-based withdraw/deposit flow removed (use LIFF UI instead)
@@ -14,15 +33,44 @@ def webhook():
     body = request.get_data(as_text=True)
 
     try:
-        handler.handle(body, signature)
+        accepted = webhook_queue.accept(body, signature)
     except InvalidSignatureError:
         return "Invalid Signature", 400
 
+    if not accepted:
+        # คิวเต็ม: ให้ LINE ส่งซ้ำ (event ที่รับไปแล้วจะถูกทิ้งเพราะ webhookEventId ซ้ำ)
+        return "Busy", 503
+
     return "OK", 200
 
 from approved_requests import approved_requests_bp  # noqa: E402
+import metrics  # noqa: E402
+from db_indexes import ensure_indexes  # noqa: E402
 
 app.register_blueprint(approved_requests_bp)
+metrics.init_app(app)
+log_utils.init_app(app)
+
+
+def _ensure_indexes_on_startup():
+    try:
+        from db import db
+
+        ensure_indexes(db)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"❌ [INDEX] ensure_indexes ตอนเริ่มแอปไม่สำเร็จ: {str(e)}")
+
+
+if Config.MONGO_ENSURE_INDEXES:
+    # ทำใน background เพื่อไม่ให้แอปเริ่มช้าเมื่อ MongoDB ยังไม่พร้อม
+    threading.Thread(target=_ensure_indexes_on_startup, name="ensure-indexes", daemon=True).start()
+
+if Config.CASHOUT_SWEEP_INTERVAL > 0:
+    # เก็บกู้คำขอเบิกที่ค้าง awaiting_machine (worker ก่อนหน้าตายระหว่างทำ cashout)
+    import approved_requests  # noqa: E402
+
+    approved_requests.cashout_sweeper.ensure_started()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5010, debug=True)
\ No newline at end of file
+    # สำหรับพัฒนาในเครื่องเท่านั้น: production ใช้ gunicorn -c gunicorn.conf.py
+    app.run(host="0.0.0.0", port=5010, debug=Config.FLASK_DEBUG)
\ No newline at end of file
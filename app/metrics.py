@@ -0,0 +1,190 @@
+"""
+Prometheus metrics ของแอปเงิน (/metrics)
+
+รองรับ gunicorn หลาย worker: เมื่อกำหนด PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py ตั้งให้)
+แต่ละ worker เขียนค่าลงไฟล์ใน directory นั้น และ /metrics รวมค่าจากทุก worker
+"""
+import logging
+import os
+import time
+from typing import Optional
+
+from flask import Response, before_render_template, g, request, template_rendered
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# route ส่วนใหญ่ตอบภายในไม่กี่ร้อย ms; route ที่รอเครื่องอาจถึงสิบวินาที
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "money_http_request_duration_seconds",
+    "เวลาตอบของ Flask route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+BRANCH_REQUEST_SECONDS = Histogram(
+    "money_branch_request_duration_seconds",
+    "เวลาเรียก REST_API_CI ต่อสาขาและ path",
+    ["branch", "method", "path", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+STATUS_TRANSITIONS = Counter(
+    "money_status_transitions_total",
+    "การเปลี่ยนสถานะคำขอเบิก/ฝาก (result=conflict เมื่อสถานะไม่ตรงที่คาดไว้)",
+    ["collection", "to_status", "result"],
+)
+WORKER_POOL_IN_FLIGHT = Gauge(
+    "money_worker_pool_in_flight",
+    "งานที่กำลังทำใน worker pool (เช่น cashout ที่รอเครื่อง)",
+    ["pool", "branch"],
+    multiprocess_mode="livesum",
+)
+REPLENISHMENT_SESSIONS_ACTIVE = Gauge(
+    "money_replenishment_sessions_active",
+    "session ฝากเงินที่มี poller /socket/latest ทำงานอยู่ (ต่อ worker: session ที่เปิดดูจากหลาย worker นับทุก worker)",
+    multiprocess_mode="livesum",
+)
+WORKER_POOL_QUEUED = Gauge(
+    "money_worker_pool_queued",
+    "งานที่รอในคิวของ worker pool",
+    ["pool", "branch"],
+    multiprocess_mode="livesum",
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "money_mongo_command_duration_seconds",
+    "เวลาของคำสั่ง MongoDB ต่อ collection และคำสั่ง",
+    ["collection", "command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_POOL_CHECKOUT_SECONDS = Histogram(
+    "money_mongo_pool_checkout_seconds",
+    "เวลารอ connection จาก pool ของ MongoClient (สูงขึ้นเมื่อ pool ไม่พอ)",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+TEMPLATE_RENDER_SECONDS = Histogram(
+    "money_template_render_seconds",
+    "เวลา render template ของ Flask",
+    ["template"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "money_mongo_pool_connections",
+    "connection ใน pool ของ MongoClient (state=open ทั้งหมด, checked_out กำลังใช้งาน)",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+
+def branch_outcome(status_code: Optional[int] = None, error: Optional[BaseException] = None) -> str:
+    """label outcome ของการเรียกเครื่อง: 2xx/4xx/5xx, circuit_open หรือชื่อ exception"""
+    if error is not None:
+        return "circuit_open" if type(error).__name__ == "CircuitOpenError" else type(error).__name__
+    return f"{status_code // 100}xx" if status_code else "unknown"
+
+
+def observe_status_transition(collection, to_status: str, ok: bool) -> None:
+    name = getattr(collection, "name", None)
+    STATUS_TRANSITIONS.labels(
+        collection=name if isinstance(name, str) else "unknown",
+        to_status=to_status,
+        result="ok" if ok else "conflict",
+    ).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """นับ connection ที่เปิดอยู่และที่ถูก check out ของ MongoClient ใน process นี้"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(state="open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(state="open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        # reason: timeout = รอจนหมดเวลา (pool เต็ม), connectionError, poolClosed
+        self._observe_checkout(event, str(event.reason))
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels(state="checked_out").inc()
+        self._observe_checkout(event, "ok")
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels(state="checked_out").dec()
+
+    @staticmethod
+    def _observe_checkout(event, outcome: str) -> None:
+        # duration มีใน pymongo 4.7 ขึ้นไป
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_SECONDS.labels(outcome=outcome).observe(duration)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """registry สำหรับ /metrics: รวมไฟล์ของทุก worker ถ้าอยู่ใน multiprocess mode"""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def init_app(app) -> None:
+    """วัดเวลาทุก request และเพิ่ม route /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(
+                method=request.method, route=rule, status=str(response.status_code)
+            ).observe(time.perf_counter() - start)
+        return response
+
+    @before_render_template.connect_via(app)
+    def _start_render(sender, template, context, **extra):
+        g._metrics_render_start = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def _observe_render(sender, template, context, **extra):
+        start = g.pop("_metrics_render_start", None)
+        if start is not None:
+            TEMPLATE_RENDER_SECONDS.labels(template=template.name or "-").observe(time.perf_counter() - start)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(generate_latest(metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
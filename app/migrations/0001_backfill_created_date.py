@@ -0,0 +1,16 @@
+"""
+เติม created_at_* / created_date_bkk และ status_history ให้ withdraw_requests เก่า
+(เดิมคือสคริปต์ backfill_created_date.py ซึ่งยังใช้ได้เมื่อต้องการแบ่ง shard ทำพร้อมกัน)
+"""
+from backfill_created_date import LEGACY_FILTER, build_update
+
+DESCRIPTION = "backfill created_date_bkk / status_history ของ withdraw_requests เก่า"
+
+
+def migrate(ctx):
+    ctx.bulk_update(
+        "withdraw_requests",
+        LEGACY_FILTER,
+        build_update,
+        projection={"status": 1, "status_history": 1},
+    )
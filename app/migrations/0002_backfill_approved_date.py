@@ -0,0 +1,33 @@
+"""
+เติม approved_date_bkk (วันที่อนุมัติตามเวลาไทย) ให้ withdraw_requests ที่ approved ก่อนมีฟิลด์นี้
+หน้าปิดยอดรายวันนับยอดเบิกตามวันที่อนุมัติ ให้ตรงกับ selectedDate ของค่าใช้จ่าย
+"""
+from typing import Any, Dict, Optional
+
+DESCRIPTION = "backfill approved_date_bkk ของ withdraw_requests ที่ approved แล้ว"
+
+LEGACY_FILTER = {"status": "approved", "approved_date_bkk": {"$exists": False}}
+
+
+def approved_date(doc: Dict[str, Any]) -> Optional[str]:
+    """วันที่ของรายการ approved ล่าสุดใน status_history (ถ้าไม่มี ใช้ updated_at_bkk / created_date_bkk)"""
+    for entry in reversed(doc.get("status_history") or []):
+        if entry.get("status") == "approved" and entry.get("date_bkk"):
+            return entry["date_bkk"]
+    if doc.get("updated_at_bkk"):
+        return doc["updated_at_bkk"][:10]
+    return doc.get("created_date_bkk")
+
+
+def build_update(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    date_bkk = approved_date(doc)
+    return {"$set": {"approved_date_bkk": date_bkk}} if date_bkk else None
+
+
+def migrate(ctx):
+    ctx.bulk_update(
+        "withdraw_requests",
+        LEGACY_FILTER,
+        build_update,
+        projection={"status_history": 1, "updated_at_bkk": 1, "created_date_bkk": 1},
+    )
@@ -0,0 +1,295 @@
+"""
+data migration แบบมีเวอร์ชันของ collection เงิน (kf_hr)
+
+แต่ละ migration เป็นโมดูลในแพ็กเกจนี้ ชื่อขึ้นต้นด้วยเลขเวอร์ชัน เช่น 0001_backfill_created_date.py
+มี DESCRIPTION และ migrate(ctx) โดยเขียนข้อมูลผ่าน ctx.bulk_update(...) ซึ่ง
+- อ่านตามลำดับ _id และเขียนเป็น bulk_write ครั้งละ batch_size รายการ
+- หน่วงระหว่าง batch (Throttle) เพื่อไม่แย่ง MongoDB กับ request อนุมัติ/ฝากเงิน
+- บันทึก _id สุดท้ายลงเอกสารของ migration ใน collection migrations: รันต่อได้ถ้าหยุดกลางทาง
+
+    python -m migrations status
+    python -m migrations up [--target 0001] [--dry-run]
+"""
+import importlib
+import logging
+import pkgutil
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import Config
+from time_utils import now_bangkok_and_utc
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "migrations"
+_MODULE_RE = re.compile(r"^(\d{4})_(\w+)$")
+
+
+class MigrationLockedError(RuntimeError):
+    """migration กำลังรันอยู่ที่อื่น (หรือรันค้างจาก process ที่ตายไป: ใช้ force)"""
+
+
+class Migration:
+    def __init__(self, version: str, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self) -> str:
+        return getattr(self.module, "DESCRIPTION", self.name)
+
+    def __repr__(self):
+        return f"Migration({self.version!r}, {self.name!r})"
+
+
+def discover() -> List[Migration]:
+    """โมดูล migration ทั้งหมดในแพ็กเกจนี้ เรียงตามเวอร์ชัน"""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append(Migration(match.group(1), match.group(2), module))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"เวอร์ชัน migration ซ้ำกัน: {versions}")
+    return migrations
+
+
+class Throttle:
+    """
+    หน่วงหลังแต่ละ batch
+    - duty_cycle: สัดส่วนเวลาที่ migration ทำงาน (0.5 = พักเท่ากับเวลาที่ใช้เขียน batch ก่อนหน้า)
+      batch ที่ช้าลงเพราะ MongoDB งานยุ่งจะพักนานขึ้นตามไปด้วย
+    - max_docs_per_second: เพดานจำนวนเอกสารต่อวินาที (0 = ไม่จำกัด)
+    """
+
+    def __init__(
+        self,
+        duty_cycle: float = 1.0,
+        max_docs_per_second: float = 0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError("duty_cycle ต้องอยู่ระหว่าง 0 (ไม่รวม) ถึง 1")
+        self.duty_cycle = duty_cycle
+        self.max_docs_per_second = max_docs_per_second
+        self._sleep = sleep
+
+    def pause_for(self, docs: int, busy_seconds: float) -> float:
+        pause = busy_seconds * (1 - self.duty_cycle) / self.duty_cycle
+        if self.max_docs_per_second:
+            pause = max(pause, docs / self.max_docs_per_second - busy_seconds)
+        return max(0.0, pause)
+
+    def after_batch(self, docs: int, busy_seconds: float) -> None:
+        pause = self.pause_for(docs, busy_seconds)
+        if pause:
+            self._sleep(pause)
+
+
+def throttle_from_config() -> Throttle:
+    return Throttle(duty_cycle=Config.MIGRATION_DUTY_CYCLE, max_docs_per_second=Config.MIGRATION_MAX_DOCS_PER_SECOND)
+
+
+class MigrationContext:
+    """สิ่งที่ migration หนึ่งตัวใช้ระหว่างรัน: db, การเขียนแบบ batch และ checkpoint"""
+
+    def __init__(
+        self,
+        db,
+        version: str,
+        *,
+        batch_size: int = Config.MIGRATION_BATCH_SIZE,
+        throttle: Optional[Throttle] = None,
+        dry_run: bool = False,
+        checkpoints: Optional[Dict[str, Any]] = None,
+    ):
+        self.db = db
+        self.version = version
+        self.batch_size = batch_size
+        self.throttle = throttle or throttle_from_config()
+        self.dry_run = dry_run
+        self.checkpoints = dict(checkpoints or {})
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _save_checkpoint(self, step: str, last_id, stats: Dict[str, int]) -> None:
+        self.checkpoints[step] = last_id
+        _, now_utc = now_bangkok_and_utc()
+        self.db[STATE_COLLECTION].update_one(
+            {"_id": self.version},
+            {"$set": {f"checkpoints.{step}": last_id, f"stats.{step}": stats, "updated_at_utc": now_utc.isoformat()}},
+        )
+
+    def bulk_update(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        build_update: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        *,
+        projection: Optional[Dict[str, Any]] = None,
+        step: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """
+        อัปเดตทุกเอกสารที่ตรง query: build_update(doc) คืน update document (หรือ None = ข้าม)
+        query ถูกใส่ซ้ำใน filter ของแต่ละ UpdateOne: เอกสารที่แอปแก้ไปแล้วระหว่างรันจะไม่ถูกทับ
+        step: ชื่อ checkpoint (ค่าเริ่มต้นคือชื่อ collection) ใช้เมื่อ migration เดียวเดินหลายรอบ
+        """
+        step = step or collection_name
+        col = self.db[collection_name]
+        stats = dict(self.stats.get(step) or {"scanned": 0, "changed": 0, "updated": 0, "batches": 0})
+        self.stats[step] = stats
+
+        find_query = dict(query)
+        last_id = self.checkpoints.get(step)
+        if last_id is not None:
+            find_query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+        cursor = col.find(find_query, projection).sort("_id", 1).batch_size(self.batch_size)
+
+        ops: List[UpdateOne] = []
+        in_batch = 0
+        batch_started = time.monotonic()
+        doc_id = None
+
+        def flush():
+            stats["changed"] += len(ops)
+            stats["batches"] += 1
+            if not self.dry_run:
+                if ops:
+                    result = col.bulk_write(ops, ordered=False)
+                    stats["updated"] += result.modified_count
+                self._save_checkpoint(step, doc_id, stats)
+            self.throttle.after_batch(in_batch, time.monotonic() - batch_started)
+
+        for doc in cursor:
+            stats["scanned"] += 1
+            in_batch += 1
+            doc_id = doc["_id"]
+            update = build_update(doc)
+            if update:
+                ops.append(UpdateOne({"_id": doc_id, **query}, update))
+            if in_batch >= self.batch_size:
+                flush()
+                ops, in_batch = [], 0
+                batch_started = time.monotonic()
+        if in_batch:
+            flush()
+
+        logger.info(f"✅ [MIGRATION] {self.version} {step}: {stats}")
+        return stats
+
+
+def get_state(db) -> Dict[str, Dict[str, Any]]:
+    """เอกสารสถานะของทุก migration ที่เคยรัน {version: doc}"""
+    return {doc["_id"]: doc for doc in db[STATE_COLLECTION].find({})}
+
+
+def _claim(db, migration: Migration, force: bool) -> Dict[str, Any]:
+    """
+    ตั้งสถานะ running แบบ atomic (กันรันซ้อนจากสองเครื่อง)
+    คืนเอกสารสถานะเดิม (มี checkpoints ถ้าเคยรันค้างไว้)
+    """
+    now_bkk, now_utc = now_bangkok_and_utc()
+    blocked = ["applied"] if force else ["applied", "running"]
+    try:
+        previous = db[STATE_COLLECTION].find_one_and_update(
+            {"_id": migration.version, "status": {"$nin": blocked}},
+            {
+                "$set": {
+                    "name": migration.name,
+                    "description": migration.description,
+                    "status": "running",
+                    "started_at_bkk": now_bkk.isoformat(),
+                    "started_at_utc": now_utc.isoformat(),
+                },
+                "$unset": {"error": ""},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise MigrationLockedError(f"migration {migration.version} กำลังรันอยู่หรือรันไปแล้ว")
+    return previous or {}
+
+
+def run_migration(
+    db,
+    migration: Migration,
+    *,
+    batch_size: int = Config.MIGRATION_BATCH_SIZE,
+    throttle: Optional[Throttle] = None,
+    dry_run: bool = False,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """รัน migration หนึ่งตัวแล้วบันทึกผล (dry_run: นับอย่างเดียว ไม่เขียนทั้งข้อมูลและสถานะ)"""
+    previous = {} if dry_run else _claim(db, migration, force)
+    ctx = MigrationContext(
+        db,
+        migration.version,
+        batch_size=batch_size,
+        throttle=throttle,
+        dry_run=dry_run,
+        checkpoints=previous.get("checkpoints"),
+    )
+    ctx.stats = {step: dict(s) for step, s in (previous.get("stats") or {}).items()}
+    started = time.monotonic()
+    try:
+        migration.module.migrate(ctx)
+    except Exception as e:
+        logger.error(f"❌ [MIGRATION] {migration.version} {migration.name} ล้มเหลว: {str(e)}")
+        if not dry_run:
+            db[STATE_COLLECTION].update_one({"_id": migration.version}, {"$set": {"status": "failed", "error": str(e)}})
+        raise
+
+    elapsed = time.monotonic() - started
+    scanned = sum(s["scanned"] for s in ctx.stats.values())
+    result = {
+        "version": migration.version,
+        "name": migration.name,
+        "dry_run": dry_run,
+        "stats": ctx.stats,
+        "seconds": round(elapsed, 2),
+        "docs_per_second": round(scanned / elapsed, 1) if elapsed else 0.0,
+    }
+    if not dry_run:
+        now_bkk, now_utc = now_bangkok_and_utc()
+        db[STATE_COLLECTION].update_one(
+            {"_id": migration.version},
+            {
+                "$set": {
+                    "status": "applied",
+                    "stats": ctx.stats,
+                    "applied_at_bkk": now_bkk.isoformat(),
+                    "applied_at_utc": now_utc.isoformat(),
+                },
+                "$unset": {"checkpoints": ""},
+            },
+        )
+    return result
+
+
+def run_pending(
+    db,
+    *,
+    target: Optional[str] = None,
+    migrations: Optional[List[Migration]] = None,
+    **options,
+) -> List[Dict[str, Any]]:
+    """รัน migration ที่ยังไม่ applied ตามลำดับเวอร์ชัน (จนถึง target ถ้ากำหนด) หยุดทันทีถ้าตัวใดล้มเหลว"""
+    migrations = migrations if migrations is not None else discover()
+    state = get_state(db)
+    results = []
+    for migration in migrations:
+        if target is not None and migration.version > target:
+            break
+        if state.get(migration.version, {}).get("status") == "applied":
+            continue
+        logger.info(f"📦 [MIGRATION] เริ่ม {migration.version} {migration.name}")
+        results.append(run_migration(db, migration, **options))
+    return results
+
@@ -0,0 +1,51 @@
+import argparse
+import json
+import logging
+
+from config import Config
+from migrations import Throttle, discover, get_state, run_pending
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="data migration ของ collection เงิน (kf_hr)")
+    parser.add_argument("command", choices=["status", "up"], nargs="?", default="status")
+    parser.add_argument("--target", help="รันถึงเวอร์ชันนี้ (เช่น 0001)")
+    parser.add_argument("--dry-run", action="store_true", help="นับเอกสารและวัดความเร็วโดยไม่เขียน")
+    parser.add_argument("--force", action="store_true", help="รันต่อ migration ที่ค้างสถานะ running (process เดิมตายไป)")
+    parser.add_argument("--batch-size", type=int, default=Config.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--duty-cycle", type=float, default=Config.MIGRATION_DUTY_CYCLE)
+    parser.add_argument("--max-docs-per-second", type=float, default=Config.MIGRATION_MAX_DOCS_PER_SECOND)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from db import db
+
+    if args.command == "up":
+        results = run_pending(
+            db,
+            target=args.target,
+            batch_size=args.batch_size,
+            throttle=Throttle(duty_cycle=args.duty_cycle, max_docs_per_second=args.max_docs_per_second),
+            dry_run=args.dry_run,
+            force=args.force,
+        )
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    state = get_state(db)
+    print(json.dumps(
+        [
+            {
+                "version": m.version,
+                "name": m.name,
+                "status": state.get(m.version, {}).get("status", "pending"),
+                "applied_at_bkk": state.get(m.version, {}).get("applied_at_bkk"),
+            }
+            for m in discover()
+        ],
+        ensure_ascii=False,
+        indent=2,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+from pymongo import monitoring
+
+from metrics import MONGO_COMMAND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# คำสั่งภายในของ driver (handshake / heartbeat / session) ไม่นับ
+IGNORED_COMMANDS = frozenset({"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"})
+
+# คำสั่งที่ไม่ log ว่าช้า: getMore ไม่มีเงื่อนไขค้นหาของตัวเอง (ความช้าเป็นของ find/aggregate ที่เปิด cursor)
+NOT_SLOW_LOGGED_COMMANDS = frozenset({"getMore"})
+
+# field ของแต่ละคำสั่งที่เก็บเงื่อนไขค้นหา
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+
+def filter_shape(value: Any) -> Any:
+    """
+    รูปร่างของ filter โดยไม่มีค่าจริง (ไม่ log ข้อมูลผู้ใช้/ยอดเงิน)
+    {"status": "pending", "amount": {"$gte": 100}} → {"status": "?", "amount": {"$gte": "?"}}
+    """
+    if isinstance(value, dict):
+        return {k: filter_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # list ของเงื่อนไข ($and/$or/pipeline) เก็บโครง; list ของค่า ($in) ย่อเหลือ "?"
+        if value and all(isinstance(v, dict) for v in value):
+            return [filter_shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+def is_await_get_more(command_name: str, command: Dict[str, Any]) -> bool:
+    """
+    getMore ของ cursor แบบ awaitData (change stream / tailable) ที่ส่ง maxTimeMS (max_await_time_ms)
+    server รอข้อมูลใหม่จนครบเวลานั้นเป็นปกติ: ไม่ใช่เวลาทำงานของคำสั่ง
+    """
+    return command_name == "getMore" and "maxTimeMS" in command
+
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    field = FILTER_FIELDS.get(command_name)
+    if field:
+        return command.get(field)
+    # update/delete: เงื่อนไขอยู่ใน statement แรก
+    for key in ("updates", "deletes"):
+        statements = command.get(key)
+        if statements:
+            return statements[0].get("q")
+    return None
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    วัดเวลาทุกคำสั่ง MongoDB ต่อ (collection, คำสั่ง) และ log คำสั่งที่ช้ากว่า slow_ms
+    พร้อมรูปร่างของ filter (ไม่รวมค่า)
+    """
+
+    def __init__(self, slow_ms: float = 100):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._started: Dict[Tuple[Any, int], Tuple[str, str, Any]] = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS or is_await_get_more(event.command_name, event.command):
+            return
+        # getMore: ค่าของคำสั่งคือ cursor id ชื่อ collection อยู่ใน field "collection"
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        # เก็บแค่ reference ของ filter: แปลงเป็นรูปร่างเฉพาะคำสั่งที่ช้า
+        raw_filter = command_filter(event.command_name, event.command)
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (collection, event.command_name, raw_filter)
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            info = self._started.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return
+        collection, command_name, raw_filter = info
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_SECONDS.labels(collection=collection, command=command_name, outcome=outcome).observe(seconds)
+        if seconds * 1000 >= self.slow_ms and command_name not in NOT_SLOW_LOGGED_COMMANDS:
+            logger.warning(
+                "🐢 [MONGO] %s.%s ใช้เวลา %.1f ms (%s) filter=%s",
+                collection,
+                command_name,
+                seconds * 1000,
+                outcome,
+                filter_shape(raw_filter),
+            )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
@@ -0,0 +1,169 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from sse import Broadcaster, sse_message
+
+logger = logging.getLogger(__name__)
+
+# error code เมื่อ MongoDB ไม่ได้เป็น replica set ($changeStream ใช้ไม่ได้)
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+# resume token เก่าเกิน oplog: ต่อจากจุดเดิมไม่ได้ ต้องเปิด stream ใหม่ (อาจพลาด event ระหว่างนั้น)
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# สนใจเฉพาะคำขอใหม่ และการเปลี่ยนสถานะ
+WATCH_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": "insert"},
+                {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+            ]
+        }
+    }
+]
+
+EVENT_FIELDS = ("request_id", "status", "location", "amount", "reason", "created_at_bkk")
+
+
+class PendingWatcher:
+    """
+    ส่งการเปลี่ยนแปลงของ withdraw_requests ไปยังหน้าอนุมัติทุกหน้าจอผ่าน SSE (ต่อ process)
+
+    - ใช้ change stream เมื่อ MongoDB เป็น replica set
+      error ชั่วคราว (failover, network): เปิดใหม่ต่อจาก resume token โดยรอ retry_backoff เท่าตัวขึ้นเรื่อย ๆ
+    - ถ้าไม่รองรับ (ไม่ใช่ replica set): poll fingerprint ของรายการ pending ทุก poll_interval แล้วแจ้งเมื่อเปลี่ยน
+    - thread เริ่มเมื่อมีผู้ subscribe คนแรก และหยุดเองเมื่อไม่มีผู้ดูนานเกิน idle_timeout
+    """
+
+    def __init__(
+        self,
+        collection,
+        *,
+        fingerprint: Callable[[], str],
+        poll_interval: float = 2.0,
+        idle_timeout: float = 60.0,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 30.0,
+    ):
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.broadcaster = Broadcaster()
+        self.mode: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._idle_since: Optional[float] = None
+
+    def subscribe(self) -> "queue.Queue":
+        q = self.broadcaster.subscribe()
+        with self._lock:
+            if self._pid != os.getpid():
+                # thread ไม่ตามมาหลัง fork
+                self._thread = None
+                self._pid = os.getpid()
+            # _run ล้าง _thread ภายใต้ lock ก่อนจบ: ถ้ายังไม่ None แปลว่า thread จะเห็นผู้ subscribe คนนี้
+            if self._thread is None or not self._thread.is_alive():
+                self._idle_since = None
+                self._thread = threading.Thread(target=self._run, name="pending-watcher", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: "queue.Queue") -> None:
+        self.broadcaster.unsubscribe(q)
+
+    def _should_stop(self) -> bool:
+        if self.broadcaster.subscriber_count:
+            self._idle_since = None
+            return False
+        self._idle_since = self._idle_since or time.monotonic()
+        return time.monotonic() - self._idle_since >= self.idle_timeout
+
+    def _run(self) -> None:
+        try:
+            while True:
+                self._watch()
+                # ตรวจซ้ำภายใต้ lock: subscribe() ที่เข้ามาหลัง _should_stop() จะไม่ค้างอยู่กับ thread ที่กำลังจบ
+                with self._lock:
+                    if self._should_stop():
+                        self._thread = None
+                        return
+        except Exception as e:
+            logger.error(f"❌ [PENDING-WATCH] หยุดทำงาน: {str(e)}")
+            with self._lock:
+                self._thread = None
+
+    def _watch(self) -> None:
+        if self.mode != "polling":
+            try:
+                self._watch_change_stream()
+                return
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAM_NOT_SUPPORTED:
+                    raise
+                logger.info("ℹ️ [PENDING-WATCH] MongoDB ไม่ใช่ replica set: ใช้ polling แทน change stream")
+        self._poll()
+
+    def _watch_change_stream(self) -> None:
+        resume_token = None
+        backoff = self.retry_backoff
+        self.mode = "change_stream"
+        while not self._should_stop():
+            try:
+                with self.collection.watch(
+                    WATCH_PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=1000,
+                ) as stream:
+                    while stream.alive and not self._should_stop():
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        backoff = self.retry_backoff
+                        if change is not None:
+                            self.broadcaster.publish(sse_message(self._event(change), event="pending"))
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                    raise
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # ต่อจาก token เดิมไม่ได้: เริ่มใหม่ และให้หน้าจอโหลดรายการใหม่ทั้งหมด
+                    resume_token = None
+                    self.broadcaster.publish(sse_message({"type": "changed"}, event="pending"))
+                backoff = self._retry_after(e, backoff)
+            except PyMongoError as e:
+                backoff = self._retry_after(e, backoff)
+
+    def _retry_after(self, error: PyMongoError, backoff: float) -> float:
+        """รอก่อนเปิด change stream ใหม่ แล้วคืนเวลารอของรอบถัดไป"""
+        logger.warning(f"⚠️ [PENDING-WATCH] change stream หลุด: {str(error)} (เปิดใหม่ใน {backoff:.1f} วินาที)")
+        time.sleep(backoff)
+        return min(backoff * 2, self.max_retry_backoff)
+
+    def _poll(self) -> None:
+        self.mode = "polling"
+        last = None
+        while not self._should_stop():
+            try:
+                current = self.fingerprint()
+                if last is not None and current != last:
+                    self.broadcaster.publish(sse_message({"type": "changed"}, event="pending"))
+                last = current
+            except Exception as e:
+                logger.error(f"❌ [PENDING-WATCH] poll ล้มเหลว: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _event(change: Dict[str, Any]) -> Dict[str, Any]:
+        doc = change.get("fullDocument") or {}
+        event = {"type": "insert" if change.get("operationType") == "insert" else "status"}
+        event.update({f: doc.get(f) for f in EVENT_FIELDS})
+        return event
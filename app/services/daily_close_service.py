@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+SOURCES = ("withdraw", "deposit", "expense")
+
+def dates_between(start_date: str, end_date: str) -> List[str]:
+    """วันที่ทุกวันตั้งแต่ start_date ถึง end_date (รวมทั้งสองวัน) แบบ YYYY-MM-DD"""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def _amount(field: str) -> Dict[str, Any]:
+    return {"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}
+
+
+def _source_projection(source: str, date_field: str, location_field: str) -> Dict[str, Any]:
+    return {
+        "$project": {
+            "_id": 0,
+            "source": {"$literal": source},
+            "date": f"${date_field}",
+            "location": f"${location_field}",
+            "amount": _amount("amount"),
+        }
+    }
+
+
+def _sum_if(source: str, value: Any) -> Dict[str, Any]:
+    return {"$sum": {"$cond": [{"$eq": ["$source", source]}, value, 0]}}
+
+
+def build_daily_close_pipeline(
+    dates: List[str],
+    *,
+    deposit_collection_name: str,
+    transactions_collection_name: str,
+) -> List[Dict[str, Any]]:
+    """
+    pipeline เดียว (รันบน withdraw_requests) ที่รวม 3 แหล่งด้วย $unionWith แล้ว group ต่อ (วันที่, สาขา)
+    - withdraw: คำขอเบิกที่ approved (ตาม approved_date_bkk: วันเดียวกับ selectedDate ของค่าใช้จ่าย)
+    - deposit: การฝากที่ completed (ตาม created_date_bkk)
+    - expense: ค่าใช้จ่ายที่ save_expense_to_transactions บันทึก (ตาม selectedDate)
+    """
+    group: Dict[str, Any] = {"_id": {"date": "$date", "location": "$location"}}
+    for source in SOURCES:
+        group[f"{source}_amount"] = _sum_if(source, "$amount")
+        group[f"{source}_count"] = _sum_if(source, 1)
+
+    return [
+        {"$match": {"status": "approved", "approved_date_bkk": {"$in": dates}}},
+        _source_projection("withdraw", "approved_date_bkk", "location"),
+        {
+            "$unionWith": {
+                "coll": deposit_collection_name,
+                "pipeline": [
+                    {"$match": {"status": "completed", "created_date_bkk": {"$in": dates}}},
+                    _source_projection("deposit", "created_date_bkk", "location"),
+                ],
+            }
+        },
+        {
+            "$unionWith": {
+                "coll": transactions_collection_name,
+                "pipeline": [
+                    {
+                        "$match": {
+                            "selectedDate": {"$in": dates},
+                            "type": "expense",
+                            "request_id": {"$exists": True, "$ne": None},
+                        }
+                    },
+                    _source_projection("expense", "selectedDate", "selectedStorage"),
+                ],
+            }
+        },
+        {"$group": group},
+        {
+            "$project": {
+                "_id": 0,
+                "date": "$_id.date",
+                "location": "$_id.location",
+                **{
+                    source: {"count": f"${source}_count", "amount": f"${source}_amount"}
+                    for source in SOURCES
+                },
+                # เงินสดสุทธิของวัน: ฝากเข้า - เบิกออก
+                "net_cash": {"$subtract": ["$deposit_amount", "$withdraw_amount"]},
+                # ยอดเบิกที่อนุมัติแล้วแต่ยังไม่มีค่าใช้จ่ายคู่กัน (ควรเป็น 0)
+                "withdraw_vs_expense_diff": {"$subtract": ["$withdraw_amount", "$expense_amount"]},
+            }
+        },
+        {"$sort": {"date": 1, "location": 1}},
+    ]
+
+
+def open_days(withdraw_collection, deposit_collection, dates: List[str]) -> Set[str]:
+    """
+    วันที่ที่ยอดยังเปลี่ยนได้: คำขอที่อนุมัติวันนั้นยังไม่ได้บันทึกค่าใช้จ่าย (cashout_job.stage = approved)
+    หรือรายการฝากของวันนั้นยัง replenishment_started (ยอดฝากนับตาม created_date_bkk)
+    คำขอเบิกที่ยัง pending / awaiting_machine ไม่ทำให้วันไหนเปิด: ยอดเบิกนับตาม approved_date_bkk
+    """
+    days = set(
+        withdraw_collection.distinct(
+            "approved_date_bkk",
+            {"status": "approved", "approved_date_bkk": {"$in": dates}, "cashout_job.stage": "approved"},
+        )
+    )
+    days.update(
+        deposit_collection.distinct(
+            "created_date_bkk", {"status": "replenishment_started", "created_date_bkk": {"$in": dates}}
+        )
+    )
+    return days
+
+
+class ClosedDayCache:
+    """
+    cache ผลปิดยอดของวันที่ผ่านไปแล้ว แบบ LRU ต่อ process
+    key = วันที่, value = แถวของทุกสาขาในวันนั้น
+    เก็บเฉพาะวันที่ไม่มีคำขอค้าง (ดู open_days): วันที่อยู่ใน cache แล้วจึงไม่เปลี่ยนอีก
+    ทุก worker ได้ผลเดียวกันโดยไม่ต้องล้าง cache ข้าม process
+    """
+
+    def __init__(self, max_days: int = 400):
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._days: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    def get_many(self, dates: Iterable[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for d in dates:
+                rows = self._days.get(d)
+                if rows is None:
+                    missing.append(d)
+                else:
+                    self._days.move_to_end(d)
+                    found[d] = rows
+        return found, missing
+
+    def put(self, date_bkk: str, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._days[date_bkk] = rows
+            self._days.move_to_end(date_bkk)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+
+
+def get_daily_close(
+    withdraw_collection,
+    *,
+    deposit_collection,
+    transactions_collection_name: str,
+    dates: List[str],
+    today: str,
+    cache: ClosedDayCache,
+    location: Optional[str] = None,
+    refresh: bool = False,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    ปิดยอดรายวันต่อสาขาของวันที่ที่ระบุ
+    วันที่ผ่านไปแล้วอ่านจาก cache; วันที่ขาด (และวันนี้) คำนวณด้วย aggregation เดียว
+    วันที่ผ่านไปแล้วที่ยังมีคำขอค้างไม่ถูก cache (คำนวณใหม่ทุกครั้งจนกว่าจะปิดจริง)
+    คืนค่า (แถวเรียงตามวันที่/สาขา, จำนวนวันที่ได้จาก cache)
+    """
+    closed = [d for d in dates if d < today]
+    found, missing = ({}, closed) if refresh else cache.get_many(closed)
+    to_compute = missing + [d for d in dates if d >= today]
+
+    if to_compute:
+        pipeline = build_daily_close_pipeline(
+            to_compute,
+            deposit_collection_name=deposit_collection.name,
+            transactions_collection_name=transactions_collection_name,
+        )
+        computed: Dict[str, List[Dict[str, Any]]] = {d: [] for d in to_compute}
+        for row in withdraw_collection.aggregate(pipeline):
+            computed.setdefault(row["date"], []).append(row)
+        still_open = open_days(withdraw_collection, deposit_collection, missing) if missing else set()
+        for d in missing:
+            if d not in still_open:
+                cache.put(d, computed[d])
+        found.update(computed)
+
+    rows = [row for d in sorted(found) for row in found[d]]
+    if location:
+        rows = [row for row in rows if row.get("location") == location]
+    return rows, len(closed) - len(missing)
+
+
+def sum_daily_close(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """รวมยอดของหลายแถว (หลายวัน/หลายสาขา) เป็นยอดเดียว"""
+    totals: Dict[str, Any] = {source: {"count": 0, "amount": 0.0} for source in SOURCES}
+    for row in rows:
+        for source in SOURCES:
+            totals[source]["count"] += row[source]["count"]
+            totals[source]["amount"] += row[source]["amount"]
+    totals["net_cash"] = totals["deposit"]["amount"] - totals["withdraw"]["amount"]
+    totals["withdraw_vs_expense_diff"] = totals["withdraw"]["amount"] - totals["expense"]["amount"]
+    return totals
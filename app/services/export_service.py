@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# BOM ให้ Excel เปิดไฟล์ UTF-8 (ภาษาไทย) ได้ถูกต้อง
+UTF8_BOM = "\ufeff"
+
+# ชุดข้อมูลที่ส่งออกได้: field วันที่, field สาขา, คอลัมน์ตามลำดับ
+EXPORTS: Dict[str, Dict[str, Any]] = {
+    "withdraw_requests": {
+        "date_field": "created_date_bkk",
+        "location_field": "location",
+        "columns": [
+            "request_id",
+            "created_date_bkk",
+            "created_at_bkk",
+            "location",
+            "amount",
+            "reason",
+            "status",
+            "user_id",
+            "updated_at_bkk",
+            "machine_error",
+        ],
+    },
+    "deposit_requests": {
+        "date_field": "created_date_bkk",
+        "location_field": "location",
+        "columns": [
+            "deposit_request_id",
+            "created_date_bkk",
+            "created_at_bkk",
+            "location",
+            "branch_id",
+            "amount",
+            "reason",
+            "status",
+            "user_id",
+            "session_id",
+        ],
+    },
+    "transactions": {
+        "date_field": "selectedDate",
+        "location_field": "selectedStorage",
+        "columns": [
+            "selectedDate",
+            "selectedStorage",
+            "type",
+            "name",
+            "amount",
+            "tags",
+            "request_id",
+            "user_id",
+            "created_at_bkk",
+        ],
+    },
+}
+
+
+def build_export_query(
+    dataset: str,
+    *,
+    start_date: str,
+    end_date: str,
+    branch: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, int], str]:
+    """คืนค่า (query, projection, field ที่ใช้เรียง) ของชุดข้อมูล"""
+    spec = EXPORTS[dataset]
+    query: Dict[str, Any] = {spec["date_field"]: {"$gte": start_date, "$lte": end_date}}
+    if branch:
+        query[spec["location_field"]] = branch
+    projection = {"_id": 0, **{c: 1 for c in spec["columns"]}}
+    return query, projection, spec["date_field"]
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        # เช่น tags: [{"label": "เบิกเงินผ่านไลน์", ...}]
+        if all(isinstance(v, dict) and "label" in v for v in value):
+            return "; ".join(str(v["label"]) for v in value)
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # กัน formula injection เมื่อเปิดใน Excel (ข้อความจากผู้ใช้ เช่น เหตุผล)
+        try:
+            float(value)
+        except ValueError:
+            return "'" + value
+    return value
+
+
+def iter_csv(docs: Iterable[Dict[str, Any]], columns: List[str], *, batch_rows: int = 500) -> Iterator[str]:
+    """
+    แปลงเอกสารจาก cursor เป็น CSV ทีละชุด (batch_rows แถวต่อ chunk)
+    ใช้ buffer เล็กตัวเดียวซ้ำ: หน่วยความจำคงที่ไม่ว่าข้อมูลจะมากแค่ไหน
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield UTF8_BOM + buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    for doc in docs:
+        writer.writerow([_cell(doc.get(c)) for c in columns])
+        rows += 1
+        if rows >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if rows:
+        yield buffer.getvalue()
@@ -1,23 +1,37 @@
 from __future__ import annotations
 
-from copy import deepcopy
-from typing import Any, Dict, List, Tuple
+import base64
+import calendar
+import json
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from time_utils import format_bkk_datetime_display
 
+BRANCHES = ("คลังห้องเย็น", "โนนิโกะ")
+DATE_RANGES = ("day", "week", "month")
+
+# section ของหน้า request-status: (ประเภทเอกสาร, สถานะที่แสดง, field id ที่ใช้ tie-break)
+SECTIONS: Dict[str, Tuple[str, Tuple[str, ...], str]] = {
+    "approved": ("withdraw", ("approved",), "request_id"),
+    "rejected": ("withdraw", ("rejected",), "request_id"),
+    "awaiting_machine": ("withdraw", ("awaiting_machine",), "request_id"),
+    "deposit": ("deposit", ("completed",), "deposit_request_id"),
+}
+
 
 def enrich_request_status_records(
     *,
-    approved_requests: List[Dict[str, Any]],
-    rejected_requests: List[Dict[str, Any]],
-    deposit_requests: List[Dict[str, Any]],
+    approved_requests: Iterable[Dict[str, Any]],
+    rejected_requests: Iterable[Dict[str, Any]],
+    deposit_requests: Iterable[Dict[str, Any]],
 ) -> Tuple[
     List[Dict[str, Any]],
     List[Dict[str, Any]],
     List[Dict[str, Any]],
 ]:
     """
-    Pure transformation: copy records and add display fields for Bangkok day+time.
+    Pure transformation: shallow-copy records and add display fields for Bangkok day+time.
 
     Adds:
     - withdraw items (approved/rejected): created_at_bkk_display
@@ -25,24 +39,140 @@ def enrich_request_status_records(
     (legacy deposit transactions removed)
     """
 
-    approved_out = deepcopy(approved_requests)
-    rejected_out = deepcopy(rejected_requests)
-    deposit_req_out = deepcopy(deposit_requests)
+    return (
+        add_display_fields(approved_requests),
+        add_display_fields(rejected_requests),
+        add_display_fields(deposit_requests),
+    )
 
-    for r in approved_out:
-        r["created_at_bkk_display"] = format_bkk_datetime_display(
-            r.get("created_at_bkk") or r.get("created_date_bkk")
-        )
 
-    for r in rejected_out:
-        r["created_at_bkk_display"] = format_bkk_datetime_display(
-            r.get("created_at_bkk") or r.get("created_date_bkk")
-        )
+def resolve_date_range(selected_date: str, range_name: str = "day") -> Tuple[str, str]:
+    """
+    คืนค่า (วันเริ่ม, วันสิ้นสุด) แบบ YYYY-MM-DD (รวมทั้งสองวัน) ของช่วงที่มี selected_date อยู่
+    - day: วันเดียว
+    - week: จันทร์ - อาทิตย์
+    - month: วันที่ 1 - วันสุดท้ายของเดือน
+    """
+    d = date.fromisoformat(selected_date)
+    if range_name == "week":
+        start = d - timedelta(days=d.weekday())
+        return start.isoformat(), (start + timedelta(days=6)).isoformat()
+    if range_name == "month":
+        last_day = calendar.monthrange(d.year, d.month)[1]
+        return d.replace(day=1).isoformat(), d.replace(day=last_day).isoformat()
+    return d.isoformat(), d.isoformat()
+
+
+def build_status_query(
+    *,
+    start_date: str,
+    end_date: str,
+    statuses: Iterable[str],
+    branch: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    สร้าง query ของ section (กรองสถานะ/วันที่/สาขาที่ MongoDB ไม่ใช่ใน Python)
+    ช่วงวันที่กรองบน created_at_bkk (ISO string เรียงตามเวลา) ซึ่งเป็น field เดียวกับที่ใช้เรียง:
+    index (status, created_at_bkk, id) ตอบได้ทั้ง equality, sort และ range โดยไม่ต้อง sort ใน memory
+    """
+    statuses = list(statuses)
+    next_day = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+    query: Dict[str, Any] = {
+        "status": statuses[0] if len(statuses) == 1 else {"$in": statuses},
+        "created_at_bkk": {"$gte": start_date, "$lt": next_day},
+    }
+    if branch in BRANCHES:
+        query["location"] = branch
+    return query
+
+
+def encode_cursor(created_at_bkk: Any, record_id: Any) -> str:
+    raw = json.dumps([created_at_bkk, record_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """คืนค่า (created_at_bkk, id) จาก cursor; ValueError ถ้า cursor ไม่ถูกต้อง"""
+    try:
+        created_at_bkk, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+    return created_at_bkk, record_id
 
-    for dr in deposit_req_out:
-        dr["created_at_bkk_display"] = format_bkk_datetime_display(
-            dr.get("created_at_bkk") or dr.get("created_date_bkk")
+
+def page_sort(id_field: str) -> List[Tuple[str, int]]:
+    """ลำดับของหน้า request-status: created_at_bkk ล่าสุดก่อน แล้ว id (ตรงกับ index status_created_at_bkk_*)"""
+    return [("created_at_bkk", -1), (id_field, -1)]
+
+
+def apply_keyset(query: Dict[str, Any], cursor: Optional[str], id_field: str) -> Dict[str, Any]:
+    """
+    keyset pagination เรียง created_at_bkk ล่าสุดก่อน (id เป็นตัวตัดสินเมื่อเวลาเท่ากัน)
+    ไม่ใช้ skip: หน้าถัดไปเริ่มต่อจากแถวสุดท้ายของหน้าก่อนผ่าน index
+    """
+    if not cursor:
+        return query
+    created_at_bkk, record_id = decode_cursor(cursor)
+    return {
+        "$and": [
+            query,
+            {
+                "$or": [
+                    {"created_at_bkk": {"$lt": created_at_bkk}},
+                    {"created_at_bkk": created_at_bkk, id_field: {"$lt": record_id}},
+                ]
+            },
+        ]
+    }
+
+
+# หน้ารายการไม่ใช้ field ขนาดใหญ่เหล่านี้: ไม่ต้องดึงมาจาก MongoDB
+LIST_PROJECTION: Dict[str, int] = {
+    "_id": 0,
+    "status_history": 0,
+    "cashout_plan_response": 0,
+    "cashout_request_response": 0,
+}
+
+
+def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    *,
+    id_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    อ่านหนึ่งหน้า (limit แถว) ของ query
+    คืนค่า (รายการ, cursor ของหน้าถัดไป หรือ None ถ้าหมดแล้ว)
+    """
+    docs = list(
+        collection.find(apply_keyset(query, cursor, id_field), LIST_PROJECTION)
+        .sort(page_sort(id_field))
+        .limit(limit + 1)
+    )
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last.get("created_at_bkk"), last.get(id_field))
+
+
+def iter_display_records(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    ห่อ cursor / list แล้ว yield ทีละแถวพร้อม created_at_bkk_display
+    ใช้สำเนาแบบตื้น (dict(r)) แทน deepcopy: ไม่แก้ไข input และไม่คัดลอก field ซ้อน
+    เช่น status_history / cashout_*_response
+    """
+    for r in records:
+        out = dict(r)
+        out["created_at_bkk_display"] = format_bkk_datetime_display(
+            r.get("created_at_bkk") or r.get("created_date_bkk")
         )
-    return approved_out, rejected_out, deposit_req_out
+        yield out
 
 
+def add_display_fields(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """เหมือน iter_display_records แต่คืนค่าเป็น list (สำหรับ template / jsonify)"""
+    return list(iter_display_records(records))
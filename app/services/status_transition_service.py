@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Union
+
+from pymongo import ReturnDocument
+
+from metrics import observe_status_transition
+from time_utils import now_bangkok_and_utc
+
+
+def transition_status(
+    collection,
+    key: Dict[str, Any],
+    *,
+    from_status: Union[str, Iterable[str]],
+    to_status: str,
+    by: str,
+    set_fields: Optional[Dict[str, Any]] = None,
+    extra_filter: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    เปลี่ยนสถานะเอกสารแบบ atomic ใน round trip เดียว (find_one_and_update)
+
+    - filter = key + สถานะที่คาดหวัง (from_status) → ถ้ามีผู้อื่นเปลี่ยนสถานะไปก่อน จะไม่ match
+    - $set สถานะใหม่ + updated_at_* (+ set_fields) และ $push status_history ในคำสั่งเดียว
+
+    Returns:
+        document หลังอัปเดต หรือ None ถ้าไม่มีเอกสารที่อยู่ในสถานะที่คาดหวัง
+    """
+    if isinstance(from_status, str):
+        status_filter: Any = from_status
+    else:
+        status_filter = {"$in": list(from_status)}
+
+    now_bkk, now_utc = now_bangkok_and_utc()
+    date_bkk = now_bkk.date().isoformat()
+
+    query = dict(key)
+    query["status"] = status_filter
+    if extra_filter:
+        query.update(extra_filter)
+
+    fields = {
+        "status": to_status,
+        "updated_at_bkk": now_bkk.isoformat(),
+        "updated_at_utc": now_utc.isoformat(),
+    }
+    if set_fields:
+        fields.update(set_fields)
+
+    doc = collection.find_one_and_update(
+        query,
+        {
+            "$set": fields,
+            "$push": {
+                "status_history": {
+                    "status": to_status,
+                    "at_bkk": now_bkk.isoformat(),
+                    "at_utc": now_utc.isoformat(),
+                    "date_bkk": date_bkk,
+                    "by": by,
+                }
+            },
+        },
+        projection=projection if projection is not None else {"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    observe_status_transition(collection, to_status, doc is not None)
+    return doc
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MemorySessionStore:
+    """
+    state ของผู้ใช้ LINE ในหน่วยความจำ (ต่อ process) แบบ LRU + TTL
+    จำนวน session สูงสุด max_entries: ผู้ใช้ที่ไม่ได้ใช้งานนานที่สุดถูกตัดออกก่อน
+    """
+
+    def __init__(self, *, ttl: float, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at <= self._clock():
+                del self._sessions[user_id]
+                return None
+            self._sessions.move_to_end(user_id)
+            return dict(session)
+
+    def set(self, user_id: str, session: Dict[str, Any]) -> None:
+        with self._lock:
+            self._put(user_id, dict(session))
+
+    def update(self, user_id: str, **fields: Any) -> None:
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            session = dict(entry[1]) if entry and entry[0] > self._clock() else {}
+            session.update(fields)
+            self._put(user_id, session)
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _put(self, user_id: str, session: Dict[str, Any]) -> None:
+        self._sessions[user_id] = (self._clock() + self.ttl, session)
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+
+class MongoSessionStore:
+    """
+    state ของผู้ใช้ LINE ใน MongoDB ใช้ร่วมกันได้ทุก worker / ทุกเครื่อง
+    เอกสาร: {_id: user_id, session: {...}, expires_at}; TTL index บน expires_at ลบ session ที่หมดอายุ
+    (TTL monitor ทำงานทุก ~60 วินาที จึงกรอง expires_at ตอนอ่านด้วย)
+    """
+
+    def __init__(self, collection, *, ttl: float):
+        self.collection = collection
+        self.ttl = ttl
+
+    def _expires_at(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.collection.find_one(
+            {"_id": user_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "session": 1},
+        )
+        return doc.get("session") if doc else None
+
+    def set(self, user_id: str, session: Dict[str, Any]) -> None:
+        self.collection.replace_one(
+            {"_id": user_id},
+            {"session": dict(session), "expires_at": self._expires_at()},
+            upsert=True,
+        )
+
+    def update(self, user_id: str, **fields: Any) -> None:
+        # $set เฉพาะ field ที่เปลี่ยน ถ้า session ยังไม่หมดอายุ: ไม่ต้องอ่านก่อนเขียน
+        update = {f"session.{k}": v for k, v in fields.items()}
+        update["expires_at"] = self._expires_at()
+        result = self.collection.update_one(
+            {"_id": user_id, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"$set": update}
+        )
+        if result.matched_count == 0:
+            # ไม่มี session หรือหมดอายุแล้ว (TTL monitor ยังไม่ลบ): เริ่ม state ใหม่เหมือน MemorySessionStore
+            self.set(user_id, fields)
+
+    def delete(self, user_id: str) -> None:
+        self.collection.delete_one({"_id": user_id})
+
+
+def create_session_store(backend: Optional[str] = None):
+    """สร้าง session store ตาม Config.SESSION_STORE ("mongo" หรือ "memory")"""
+    backend = (backend or Config.SESSION_STORE).lower()
+    if backend == "memory":
+        return MemorySessionStore(ttl=Config.SESSION_TTL_SECONDS, max_entries=Config.SESSION_MAX_ENTRIES)
+    if backend != "mongo":
+        logger.error(f"❌ [SESSION] ไม่รู้จัก SESSION_STORE={backend}: ใช้ mongo แทน")
+
+    from db import line_sessions_collection
+
+    return MongoSessionStore(line_sessions_collection, ttl=Config.SESSION_TTL_SECONDS)
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import Config
+
+
+class _Flight:
+    """การอ่านจาก upstream ที่กำลังทำอยู่ของ key หนึ่ง (ผู้มาทีหลังรอผลเดียวกัน)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightCache:
+    """
+    cache อายุสั้นในหน่วยความจำ + single-flight
+
+    - hit: คืนค่าที่ยังไม่หมดอายุ (ttl วินาที)
+    - miss: request แรกเป็นผู้อ่าน upstream; request อื่นของ key เดียวกันที่เข้ามาระหว่างนั้น
+      รอผลเดียวกัน (collapsed) แทนการยิงซ้ำ
+    - error ไม่ถูก cache แต่ส่งต่อให้ทุกคนที่รอ flight เดียวกัน
+    """
+
+    def __init__(self, ttl: float, *, max_entries: int = 256, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.errors = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            flight.value = value
+            with self._lock:
+                self._entries[key] = (self._clock() + self.ttl, value)
+                self._prune()
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "in_flight": len(self._flights),
+                "hits": self.hits,
+                "misses": self.misses,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+            }
+
+    def _prune(self) -> None:
+        if len(self._entries) <= self.max_entries:
+            return
+        now = self._clock()
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+
+
+# เครื่องสาขาอ่านยอดผ่าน serial port: ให้เห็นไม่เกินหนึ่ง read ต่อ TTL ต่อ session
+socket_latest_cache = SingleFlightCache(Config.SOCKET_LATEST_CACHE_TTL)
+
+
+def read_socket_latest(client, session_id: Optional[str], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    อ่าน /socket/latest ของเครื่องสาขาผ่าน cache (key = base URL + session)
+    คืนค่า JSON จากเครื่อง (ห้ามแก้ไข dict ที่ได้ เพราะใช้ร่วมกันหลาย request)
+    """
+
+    def load():
+        response = client.get("/socket/latest", headers=headers, timeout=5)
+        response.raise_for_status()
+        return response.json()
+
+    return socket_latest_cache.get((client.base_url, session_id), load)
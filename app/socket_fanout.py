@@ -0,0 +1,205 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from metrics import REPLENISHMENT_SESSIONS_ACTIVE
+from socket_cache import read_socket_latest
+from sse import Broadcaster, sse_message
+
+logger = logging.getLogger(__name__)
+
+
+class SocketLatestPoller:
+    """
+    อ่าน /socket/latest ของ session ฝากเงินหนึ่ง session เป็นระยะ (หนึ่ง thread ต่อ session)
+    แล้วส่งต่อให้ทุกหน้าจอที่ subscribe อยู่ผ่าน SSE เฉพาะเมื่อค่ามีการเปลี่ยนแปลง
+
+    session_ended(key): อ่านสถานะที่ใช้ร่วมกันทุก worker (เช่น MongoDB) ทุก end_check_interval
+    คืนเหตุผล (completed/cancelled/...) เมื่อ session จบไปแล้ว: poller ของทุก process หยุดเอง
+    แม้ replenishment-end จะถูกเรียกที่ worker อื่น
+    """
+
+    def __init__(
+        self,
+        key: str,
+        client,
+        headers: Dict[str, str],
+        *,
+        interval: float,
+        idle_timeout: float,
+        on_exit,
+        session_ended: Optional[Callable[[str], Optional[str]]] = None,
+        end_check_interval: float = 2.0,
+    ):
+        self.key = key
+        self.client = client
+        self.headers = headers
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.session_ended = session_ended
+        self.end_check_interval = end_check_interval
+        self.broadcaster = Broadcaster()
+        self.closed = False
+        self._on_exit = on_exit
+        self._stop = threading.Event()
+        self._last_payload: Optional[Dict[str, Any]] = None
+        self._last_message: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name=f"socket-fanout-{key}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def subscribe(self) -> "queue.Queue":
+        q = self.broadcaster.subscribe()
+        if self._last_message:
+            # หน้าจอที่เพิ่งเปิดได้ค่าล่าสุดทันที ไม่ต้องรอรอบถัดไป
+            q.put_nowait(self._last_message)
+        return q
+
+    def stop(self, reason: str) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self.broadcaster.publish(sse_message({"reason": reason}, event="end"))
+        self.broadcaster.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.key,
+            "base_url": self.client.base_url,
+            "subscribers": self.broadcaster.subscriber_count,
+            "last": self._last_payload,
+        }
+
+    def _run(self) -> None:
+        idle_since: Optional[float] = None
+        checked_at: Optional[float] = None
+        while not self._stop.is_set():
+            if self.broadcaster.subscriber_count == 0:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= self.idle_timeout:
+                    break
+            else:
+                idle_since = None
+                self.poll_once()
+                if checked_at is None or time.monotonic() - checked_at >= self.end_check_interval:
+                    checked_at = time.monotonic()
+                    reason = self._ended_reason()
+                    if reason:
+                        logger.info(f"🛑 [SOCKET-STREAM] session {self.key} จบแล้ว ({reason}): หยุด poll")
+                        self.stop(reason)
+                        break
+            self._stop.wait(self.interval)
+        self._on_exit(self)
+        # subscriber ที่เข้ามาระหว่างปิดจะได้ CLOSE แล้ว EventSource ต่อใหม่เอง
+        self.broadcaster.close()
+
+    def _ended_reason(self) -> Optional[str]:
+        if self.session_ended is None:
+            return None
+        try:
+            return self.session_ended(self.key)
+        except Exception as e:
+            logger.warning(f"⚠️ [SOCKET-STREAM] ตรวจสถานะ session {self.key} ไม่สำเร็จ: {str(e)}")
+            return None
+
+    def poll_once(self) -> None:
+        try:
+            data = read_socket_latest(self.client, self.key, self.headers)
+            payload = {
+                "status": "ok",
+                "amount_baht": data.get("amount_baht", 0),
+                "success": data.get("success", True),
+                "ts": data.get("ts", 0),
+            }
+            event = "amount"
+        except requests.exceptions.RequestException as e:
+            payload = {"status": "error", "message": f"Request exception: {str(e)}", "amount_baht": 0, "success": False, "ts": 0}
+            event = "machine_error"
+        except Exception as e:
+            payload = {"status": "error", "message": str(e), "amount_baht": 0, "success": False, "ts": 0}
+            event = "machine_error"
+
+        if payload != self._last_payload:
+            self._last_payload = payload
+            self._last_message = sse_message(payload, event=event)
+            self.broadcaster.publish(self._last_message)
+
+
+class SocketFanout:
+    """ทะเบียน poller ต่อ session ฝากเงิน (ต่อ process)"""
+
+    def __init__(
+        self,
+        *,
+        interval: float,
+        idle_timeout: float,
+        session_ended: Optional[Callable[[str], Optional[str]]] = None,
+        end_check_interval: float = 2.0,
+    ):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.session_ended = session_ended
+        self.end_check_interval = end_check_interval
+        self._lock = threading.Lock()
+        self._pollers: Dict[str, SocketLatestPoller] = {}
+
+    def subscribe(self, session_id: str, client, headers: Dict[str, str]) -> "queue.Queue":
+        with self._lock:
+            poller = self._pollers.get(session_id)
+            if poller is None or poller.closed:
+                poller = SocketLatestPoller(
+                    session_id,
+                    client,
+                    headers,
+                    interval=self.interval,
+                    idle_timeout=self.idle_timeout,
+                    on_exit=self._remove,
+                    session_ended=self.session_ended,
+                    end_check_interval=self.end_check_interval,
+                )
+                self._pollers[session_id] = poller
+                REPLENISHMENT_SESSIONS_ACTIVE.inc()
+                # subscribe ก่อน start เพื่อให้รอบแรก poll ทันที (ไม่ถูกนับว่า idle)
+                q = poller.subscribe()
+                poller.start()
+                logger.info(f"📡 [SOCKET-STREAM] เริ่ม poll /socket/latest ของ session {session_id}")
+                return q
+            return poller.subscribe()
+
+    def unsubscribe(self, session_id: str, q: "queue.Queue") -> None:
+        with self._lock:
+            poller = self._pollers.get(session_id)
+        if poller is not None:
+            poller.broadcaster.unsubscribe(q)
+
+    def stop(self, session_id: Optional[str], reason: str) -> bool:
+        """
+        หยุด poll ของ session ใน process นี้ทันที (เรียกเมื่อ replenishment end / cancel สำเร็จ)
+        process อื่นหยุดเองเมื่อ session_ended เห็นสถานะใหม่
+        """
+        if not session_id:
+            return False
+        with self._lock:
+            poller = self._pollers.get(session_id)
+        if poller is None:
+            return False
+        poller.stop(reason)
+        logger.info(f"🛑 [SOCKET-STREAM] หยุด poll session {session_id} ({reason})")
+        return True
+
+    def active_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            pollers = list(self._pollers.values())
+        return [p.snapshot() for p in pollers]
+
+    def _remove(self, poller: SocketLatestPoller) -> None:
+        with self._lock:
+            poller.closed = True
+            if self._pollers.get(poller.key) is poller:
+                del self._pollers[poller.key]
+            REPLENISHMENT_SESSIONS_ACTIVE.dec()
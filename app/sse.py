@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+from typing import Any, Iterator, List, Optional
+
+# ส่ง comment ทุกช่วงเวลานี้เพื่อไม่ให้ proxy / browser ตัด connection ที่เงียบ
+HEARTBEAT_SECONDS = 15.0
+
+# ข้อความปิด stream ที่ส่งให้ subscriber ทุกตัว
+CLOSE = object()
+
+
+def sse_message(data: Any, event: Optional[str] = None) -> str:
+    """จัดรูปแบบข้อความ Server-Sent Events หนึ่งข้อความ"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    for line in payload.splitlines() or [""]:
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Broadcaster:
+    """
+    กระจายข้อความไปยัง subscriber หลายตัวใน process เดียว
+    แต่ละ subscriber มีคิวของตัวเอง (ขนาดจำกัด: ตัวที่อ่านช้าจะถูกทิ้งข้อความเก่า)
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers: List["queue.Queue"] = []
+
+    def subscribe(self) -> "queue.Queue":
+        q: "queue.Queue" = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: "queue.Queue") -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, message: Any) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # subscriber ช้า: ทิ้งข้อความเก่าที่สุดแล้วใส่ข้อความใหม่
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def close(self) -> None:
+        self.publish(CLOSE)
+
+
+class StreamSlots:
+    """
+    จำกัดจำนวน SSE stream ที่เปิดพร้อมกันใน process เดียว
+    worker แบบ gthread ใช้ thread หนึ่งตัวต่อ stream ตลอดอายุ connection:
+    ไม่จำกัดไว้ stream จะกิน thread จน request ปกติไม่มี thread รับ
+    limit <= 0 คือไม่จำกัด (เช่น worker แบบ gevent)
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def try_acquire(self) -> bool:
+        """จองที่หนึ่งที่แบบไม่รอ: False ถ้าเต็ม (ผู้เรียกควรตอบ 503)"""
+        if self._semaphore is not None and not self._semaphore.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._active += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return self._active
+
+
+def iter_sse(q: "queue.Queue", *, heartbeat: float = HEARTBEAT_SECONDS) -> Iterator[str]:
+    """
+    แปลงคิวของ subscriber เป็น stream ของข้อความ SSE
+    ข้อความในคิวต้องเป็น str ที่จัดรูปแบบด้วย sse_message แล้ว หรือ CLOSE
+    """
+    while True:
+        try:
+            message = q.get(timeout=heartbeat)
+        except queue.Empty:
+            yield ": keepalive\n\n"
+            continue
+        if message is CLOSE:
+            return
+        yield message
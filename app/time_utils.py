@@ -1,4 +1,6 @@
+import re
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Any, Optional
 
 # Timezone สำหรับกรุงเทพ (+7) ตาม requirement
@@ -58,11 +60,11 @@ def _parse_datetime(value: Any, *, assume_tz: timezone) -> Optional[datetime]:
     return None
 
 
-def format_bkk_datetime_display(value: Any) -> str:
-    """
-    Format given datetime-ish value into Bangkok time as 'YYYY-MM-DD HH:MM'.
-    Returns empty string if value is missing/unparseable.
-    """
+# ISO datetime: จับส่วน "YYYY-MM-DDTHH:MM" และ timezone (ถ้ามี) แยกจากวินาที
+_ISO_MINUTE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2})(?::\d{2}(?:\.\d+)?)?(Z|[+-]\d{2}:\d{2})?$")
+
+
+def _format_bkk_display(value: Any) -> str:
     dt = _parse_datetime(value, assume_tz=BANGKOK_TZ)
     if not dt:
         return ""
@@ -70,3 +72,25 @@ def format_bkk_datetime_display(value: Any) -> str:
     return bkk.strftime("%Y-%m-%d %H:%M")
 
 
+@lru_cache(maxsize=4096)
+def _format_bkk_display_cached(value: str) -> str:
+    return _format_bkk_display(value)
+
+
+def format_bkk_datetime_display(value: Any) -> str:
+    """
+    Format given datetime-ish value into Bangkok time as 'YYYY-MM-DD HH:MM'.
+    Returns empty string if value is missing/unparseable.
+
+    String inputs are memoized per minute: seconds are dropped before the cache
+    lookup, so rows created within the same minute share one parse/format.
+    """
+    if isinstance(value, str):
+        s = value.strip()
+        m = _ISO_MINUTE_RE.match(s)
+        if m:
+            return _format_bkk_display_cached(m.group(1) + (m.group(2) or ""))
+        return _format_bkk_display_cached(s)
+    return _format_bkk_display(value)
+
+
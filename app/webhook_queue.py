@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from branch_workers import BranchWorkerPool
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SeenSet:
+    """
+    ชุด webhookEventId ที่เคยรับแล้ว (ต่อ process) มีอายุ ttl วินาที และจำกัดจำนวนไม่เกิน max_entries
+    ใช้ทิ้ง event ที่ LINE ส่งซ้ำ (redelivery) ค่าเริ่มต้น: ส่งซ้ำไปคนละ gunicorn worker ไม่ถูกทิ้ง
+    """
+
+    def __init__(self, *, ttl: float, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, key: str) -> bool:
+        """คืนค่า True ถ้าเป็น key ใหม่ (หรือหมดอายุไปแล้ว), False ถ้าเคยเห็นแล้ว"""
+        now = self._clock()
+        with self._lock:
+            # key เรียงตามเวลาที่เพิ่ม: ตัดตัวที่หมดอายุจากหัวคิว
+            while self._seen and next(iter(self._seen.values())) <= now:
+                self._seen.popitem(last=False)
+            if key in self._seen:
+                return False
+            self._seen[key] = now + self.ttl
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return True
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class MongoSeenSet:
+    """
+    ชุด webhookEventId ที่เคยรับแล้วใน MongoDB ใช้ร่วมกันทุก worker / ทุกเครื่อง
+    เอกสาร: {_id: webhookEventId, expires_at}; TTL index บน expires_at ลบตัวที่หมดอายุ
+    (TTL monitor ทำงานทุก ~60 วินาที: เอกสารที่หมดอายุแต่ยังไม่ถูกลบนับเป็น key ใหม่)
+    """
+
+    def __init__(self, collection, *, ttl: float):
+        self.collection = collection
+        self.ttl = ttl
+
+    def add(self, key: str) -> bool:
+        """คืนค่า True ถ้าเป็น key ใหม่ (หรือหมดอายุไปแล้ว), False ถ้า worker ใดเคยรับไปแล้ว"""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        try:
+            self.collection.insert_one({"_id": key, "expires_at": expires_at})
+            return True
+        except DuplicateKeyError:
+            # ต่ออายุเฉพาะเมื่อหมดอายุแล้ว: worker ที่ match ได้เป็นผู้รับ event นี้
+            result = self.collection.update_one(
+                {"_id": key, "expires_at": {"$lte": now}}, {"$set": {"expires_at": expires_at}}
+            )
+            return bool(result.modified_count)
+
+    def discard(self, key: str) -> None:
+        self.collection.delete_one({"_id": key})
+
+    def __len__(self) -> int:
+        return self.collection.estimated_document_count()
+
+
+def create_seen_set(backend: Optional[str] = None):
+    """สร้างชุด event ที่เคยรับตาม Config.WEBHOOK_DEDUPE_STORE ("memory" หรือ "mongo")"""
+    backend = (backend or Config.WEBHOOK_DEDUPE_STORE).lower()
+    if backend == "mongo":
+        from db import webhook_events_collection
+
+        return MongoSeenSet(webhook_events_collection, ttl=Config.WEBHOOK_DEDUPE_TTL)
+    if backend != "memory":
+        logger.error(f"❌ [WEBHOOK] ไม่รู้จัก WEBHOOK_DEDUPE_STORE={backend}: ใช้ memory แทน")
+    return SeenSet(ttl=Config.WEBHOOK_DEDUPE_TTL, max_entries=Config.WEBHOOK_DEDUPE_MAX_ENTRIES)
+
+
+def sign_body(channel_secret: str, body: str) -> str:
+    """X-Line-Signature ของ body (HMAC-SHA256 ด้วย channel secret แบบเดียวกับ LINE)"""
+    digest = hmac.new(channel_secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+class WebhookQueue:
+    """
+    รับ webhook จาก LINE แบบตอบกลับทันที
+    - ตรวจ signature และ parse ใน request (InvalidSignatureError ส่งต่อให้ผู้เรียก)
+    - ส่ง event เข้า worker pool แบบมีขอบเขต แบ่ง partition ตามผู้ใช้
+      (event ของผู้ใช้คนเดียวกันทำตามลำดับเสมอ เพราะหนึ่ง partition มี worker เดียว)
+    - worker เรียก handler.handle() (API สาธารณะของ WebhookHandler) ด้วย body ที่มี event เดียว
+      ลงลายเซ็นใหม่ด้วย channel secret เดียวกัน
+    - worker ทิ้ง event ที่ webhookEventId ซ้ำก่อนเรียก handler
+    """
+
+    def __init__(self, handler, *, channel_secret: str, partitions: int = 4, queue_size: int = 100,
+                 seen=None, dedupe_ttl: float = 600, dedupe_max_entries: int = 10000):
+        self.handler = handler
+        self.channel_secret = channel_secret
+        self.partitions = max(1, partitions)
+        self.seen = seen if seen is not None else SeenSet(ttl=dedupe_ttl, max_entries=dedupe_max_entries)
+        self.pool = BranchWorkerPool("webhook", workers_per_branch=1, queue_size=queue_size)
+
+    def _partition(self, event) -> str:
+        source = getattr(event, "source", None)
+        key = getattr(source, "user_id", None) or getattr(source, "group_id", None) or ""
+        return str(zlib.crc32(key.encode("utf-8")) % self.partitions)
+
+    def accept(self, body: str, signature: str) -> bool:
+        """
+        คืนค่า True เมื่อรับทุก event แล้ว, False ถ้าคิวเต็ม (ผู้เรียกตอบ 503 ให้ LINE ส่งซ้ำ;
+        event ที่เข้าคิวไปแล้วจะถูกทิ้งใน worker ตอนส่งซ้ำเพราะ webhookEventId ซ้ำ)
+        """
+        payload = self.handler.parser.parse(body, signature, as_payload=True)
+        # event ดิบ (ลำดับเดียวกับ payload.events) สำหรับส่งต่อให้ handler.handle ทีละ event
+        raw_events = json.loads(body).get("events") or []
+        accepted = True
+        for event, raw_event in zip(payload.events, raw_events):
+            event_id = getattr(event, "webhook_event_id", None)
+            if not self.pool.submit(self._partition(event), self._dispatch, event_id, raw_event, payload.destination):
+                accepted = False
+        return accepted
+
+    def _dispatch(self, event_id: Optional[str], raw_event: Dict[str, Any], destination: Optional[str]) -> None:
+        # ตรวจ event ซ้ำใน worker: request ของ LINE ไม่ต้องรอ store (เช่น insert ลง MongoDB) ก่อนตอบ
+        if event_id and not self.seen.add(event_id):
+            logger.info(f"ℹ️ [WEBHOOK] ทิ้ง event ซ้ำ {event_id}")
+            return
+        body = json.dumps({"destination": destination, "events": [raw_event]}, ensure_ascii=False)
+        self.handler.handle(body, sign_body(self.channel_secret, body))
+
+    def stats(self):
+        return {"seen": len(self.seen), "queues": self.pool.stats()}
@@ -0,0 +1,14 @@
+from approved_requests import _is_withdraw_success
+from http_utils import build_correlation_headers
+
+
+def bench_is_withdraw_success(benchmark, cashout_responses):
+    def run():
+        return sum(_is_withdraw_success(response) for response in cashout_responses)
+
+    # 70% SOAP สำเร็จ + 10% แบบเก่า
+    assert benchmark(run) == 800
+
+
+def bench_build_correlation_headers(benchmark):
+    benchmark(build_correlation_headers, sale_id="REQ-20260918-00042")
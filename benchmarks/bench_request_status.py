@@ -0,0 +1,17 @@
+from services.request_status_service import enrich_request_status_records
+from time_utils import _format_bkk_display_cached
+
+
+def bench_enrich_request_status_records(benchmark, withdraw_docs, deposit_docs):
+    approved = [doc for doc in withdraw_docs if doc["status"] == "approved"]
+    rejected = [doc for doc in withdraw_docs if doc["status"] == "rejected"]
+
+    def run():
+        return enrich_request_status_records(
+            approved_requests=approved,
+            rejected_requests=rejected,
+            deposit_requests=deposit_docs,
+        )
+
+    result = benchmark.pedantic(run, setup=_format_bkk_display_cached.cache_clear, rounds=20)
+    assert len(result[0]) + len(result[1]) == len(withdraw_docs)
@@ -0,0 +1,31 @@
+from time_utils import BANGKOK_TZ, _format_bkk_display_cached, _parse_datetime, format_bkk_datetime_display
+
+
+def bench_parse_datetime(benchmark, datetime_values):
+    def run():
+        for value in datetime_values:
+            _parse_datetime(value, assume_tz=BANGKOK_TZ)
+
+    benchmark(run)
+
+
+def bench_format_bkk_datetime_display_cold(benchmark, withdraw_docs):
+    # cache ว่าง: ทุกนาทีที่ไม่ซ้ำต้อง parse ใหม่ (หน้าแรกหลัง worker เริ่ม)
+    values = [doc["created_at_bkk"] for doc in withdraw_docs]
+
+    def run():
+        for value in values:
+            format_bkk_datetime_display(value)
+
+    benchmark.pedantic(run, setup=_format_bkk_display_cached.cache_clear, rounds=20)
+
+
+def bench_format_bkk_datetime_display_warm(benchmark, withdraw_docs):
+    values = [doc["created_at_bkk"] for doc in withdraw_docs[:2000]]
+
+    def run():
+        for value in values:
+            format_bkk_datetime_display(value)
+
+    run()
+    benchmark(run)
@@ -0,0 +1,155 @@
+"""
+fixture ข้อมูลจริงจัง: คำขอเบิกหลายพันรายการพร้อม status_history และ response ของ /cashout/request แบบ SOAP
+สร้างจาก seed คงที่ เพื่อให้ทุกรอบวัดกับข้อมูลชุดเดียวกัน
+"""
+import glob
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+BANGKOK_TZ = timezone(timedelta(hours=7))
+WITHDRAW_DOCS = 5000
+DEPOSIT_DOCS = 1000
+LOCATIONS = ("คลังห้องเย็น", "โนนิโกะ")
+
+
+def pytest_configure(config):
+    """ยังไม่มี baseline (รันครั้งแรก / storage ใหม่): วัดอย่างเดียว ไม่เทียบ ไม่ fail"""
+    storage = config.getoption("benchmark_storage", None)
+    if not storage or "://" in storage and not storage.startswith("file://"):
+        return
+    path = storage[len("file://"):] if storage.startswith("file://") else storage
+    if not glob.glob(os.path.join(path, "*", "*.json")):
+        config.option.benchmark_compare = False
+        config.option.benchmark_compare_fail = None
+
+
+def _soap_cashout_response(rng, ok=True):
+    return {
+        "success": True,
+        "response": {
+            "Body": [
+                {
+                    "CashoutResponse": [
+                        {
+                            "result": "0" if ok else str(rng.choice((1, 3, 99))),
+                            "id": f"{rng.randrange(10**9):09d}",
+                            "seqNo": str(rng.randrange(1, 9999)),
+                            "user": "kf-bot",
+                            "Cash": [{"type": "4", "Denomination": [{"cc": "THB", "fv": "10000", "Piece": "1"}]}],
+                        }
+                    ]
+                }
+            ]
+        },
+    }
+
+
+def _status_history(rng, created, final_status):
+    steps = ["pending", "awaiting_machine", final_status] if final_status == "approved" else ["pending", final_status]
+    history, at = [], created
+    for status in steps:
+        history.append({
+            "status": status,
+            "at_bkk": at.isoformat(),
+            "at_utc": at.astimezone(timezone.utc).isoformat(),
+            "date_bkk": at.date().isoformat(),
+            "by": "approver_ui" if status != "pending" else f"U{rng.randrange(16**8):08x}",
+        })
+        at += timedelta(seconds=rng.randrange(5, 900))
+    return history
+
+
+def make_withdraw_docs(count, seed=23):
+    rng = random.Random(seed)
+    start = datetime(2026, 9, 1, 8, 0, tzinfo=BANGKOK_TZ)
+    docs = []
+    for i in range(count):
+        created = start + timedelta(seconds=i * rng.randrange(20, 400), microseconds=rng.randrange(10**6))
+        status = "approved" if rng.random() < 0.85 else "rejected"
+        doc = {
+            "request_id": f"REQ-{created:%Y%m%d}-{i:05d}",
+            "user_id": f"U{rng.randrange(16**8):08x}",
+            "amount": str(rng.choice((100, 200, 300, 500, 1000, 1500))),
+            "reason": rng.choice(("ซื้อน้ำแข็ง", "เติมน้ำมัน", "ค่าขนส่ง")),
+            "license_plate": None,
+            "location": rng.choice(LOCATIONS),
+            "status": status,
+            "created_at_bkk": created.isoformat(),
+            "created_at_utc": created.astimezone(timezone.utc).isoformat(),
+            "created_date_bkk": created.date().isoformat(),
+            "status_history": _status_history(rng, created, status),
+            "channel": "liff",
+        }
+        if status == "approved":
+            doc["cashout_request_response"] = _soap_cashout_response(rng)
+        docs.append(doc)
+    return docs
+
+
+def make_deposit_docs(count, seed=29):
+    rng = random.Random(seed)
+    start = datetime(2026, 9, 1, 9, 0, tzinfo=BANGKOK_TZ)
+    docs = []
+    for i in range(count):
+        created = start + timedelta(seconds=i * rng.randrange(60, 1800))
+        docs.append({
+            "deposit_request_id": f"d-{rng.randrange(16**8):08x}",
+            "amount": float(rng.randrange(1, 200) * 100),
+            "location": rng.choice(LOCATIONS),
+            "status": "completed",
+            "created_at_bkk": created.isoformat(),
+            "created_date_bkk": created.date().isoformat(),
+        })
+    return docs
+
+
+@pytest.fixture(scope="session")
+def withdraw_docs():
+    return make_withdraw_docs(WITHDRAW_DOCS)
+
+
+@pytest.fixture(scope="session")
+def deposit_docs():
+    return make_deposit_docs(DEPOSIT_DOCS)
+
+
+@pytest.fixture(scope="session")
+def datetime_values(withdraw_docs):
+    """รูปแบบเวลาที่พบจริงใน collection: ISO เวลาไทย, UTC แบบ Z, วันที่อย่างเดียว, datetime object"""
+    values = []
+    for i, doc in enumerate(withdraw_docs[:2000]):
+        kind = i % 4
+        if kind == 0:
+            values.append(doc["created_at_bkk"])
+        elif kind == 1:
+            values.append(doc["created_at_utc"].replace("+00:00", "Z"))
+        elif kind == 2:
+            values.append(doc["created_date_bkk"])
+        else:
+            values.append(datetime.fromisoformat(doc["created_at_bkk"]))
+    return values
+
+
+@pytest.fixture(scope="session")
+def cashout_responses():
+    """response ของ /cashout/request: ส่วนใหญ่เป็น SOAP สำเร็จ ปนแบบเก่า ล้มเหลว และรูปแบบเสีย"""
+    rng = random.Random(31)
+    responses = []
+    for i in range(1000):
+        kind = i % 10
+        if kind < 7:
+            responses.append(_soap_cashout_response(rng))
+        elif kind == 7:
+            responses.append({"transaction_status": "success", "denominations": {"10000": 1}})
+        elif kind == 8:
+            responses.append(_soap_cashout_response(rng, ok=False))
+        else:
+            responses.append({"success": True, "response": {"Body": []}})
+    return responses
@@ -0,0 +1,103 @@
+"""
+ค่า gunicorn สำหรับ production (ปรับได้ด้วย environment variables)
+
+    gunicorn -c gunicorn.conf.py
+
+- worker_class: gthread (ค่าเริ่มต้น) หรือ gevent (ถ้าติดตั้งไว้) สำหรับ route proxy/SSE ที่รอเครื่องเป็นหลัก
+- state ต่อ process (คิว cashout, SSE fan-out, cache) ทำงานได้ดีกับ worker น้อยตัว + thread มาก
+- gthread: SSE แต่ละ stream ถือ thread ไว้ตลอด จึงจำกัดด้วย SSE_MAX_STREAMS_PER_WORKER (เกินแล้วตอบ 503)
+- timeout อิงจาก timeout ของ REST_API_CI: route ที่ช้าที่สุดเรียกเครื่องต่อกันสองครั้ง
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+sys.path.insert(0, APP_DIR)
+
+# /metrics รวมค่าจากทุก worker: ต้องกำหนดก่อน worker import prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.getenv("GUNICORN_METRICS_DIR", "/tmp/money_metrics"))
+
+from config import Config  # noqa: E402
+
+chdir = APP_DIR
+wsgi_app = "main:app"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5010")
+
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(4, multiprocessing.cpu_count() + 1))))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+
+if worker_class == "gevent":
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        logging.getLogger(__name__).warning("⚠️ [GUNICORN] ไม่พบ gevent: ใช้ gthread แทน")
+        worker_class = "gthread"
+
+# gthread: SSE หนึ่ง stream ถือหนึ่ง thread ตลอดอายุ connection ต้องเหลือ thread ให้ request ปกติ
+if worker_class == "gthread" and not 0 < Config.SSE_MAX_STREAMS_PER_WORKER < threads:
+    logging.getLogger(__name__).warning(
+        f"⚠️ [GUNICORN] SSE_MAX_STREAMS_PER_WORKER={Config.SSE_MAX_STREAMS_PER_WORKER} "
+        f"ไม่น้อยกว่า threads={threads}: SSE อาจกิน thread จนไม่เหลือรับ request อื่น"
+    )
+
+# เรียกเครื่อง 2 ครั้งต่อ request (เช่น /replenishment/end แล้ว /socket/latest) + เผื่อเวลา MongoDB
+_upstream_seconds = Config.REST_API_CI_CONNECT_TIMEOUT + Config.REST_API_CI_READ_TIMEOUT
+timeout = int(os.getenv("GUNICORN_TIMEOUT", str(int(_upstream_seconds * 2 + 10))))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", str(timeout)))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# recycle worker เป็นระยะ กันหน่วยความจำโตสะสม
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# ไม่ preload: แต่ละ worker import แอป (และสร้าง MongoClient) หลัง fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """ล้างไฟล์ metrics ของรอบก่อน (ค่า counter เริ่มใหม่เมื่อ restart)"""
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """ตัดค่า gauge (livesum) ของ worker ที่ตายแล้วออกจาก /metrics"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    """
+    connection ที่ได้มาจาก process แม่ใช้ร่วมกันไม่ได้: ทิ้งแล้วให้สร้างใหม่ใน worker
+    (มีผลเมื่อ preload_app เปิดอยู่ ถ้าไม่ preload โมดูลยังไม่ถูก import)
+    """
+    if "db" in sys.modules:
+        sys.modules["db"].Database.reset()
+    if "branch_client" in sys.modules:
+        sys.modules["branch_client"].close_branch_clients()
+    if "approved_requests" in sys.modules and Config.CASHOUT_SWEEP_INTERVAL > 0:
+        sys.modules["approved_requests"].cashout_sweeper.ensure_started()
+    server.log.info(f"✅ [GUNICORN] worker {worker.pid} พร้อม ({worker_class}, threads={threads})")
+
+
+def worker_exit(server, worker):
+    """
+    worker จบ (max_requests, HUP, deploy): รองาน cashout ที่รับไว้แล้วให้เสร็จก่อน
+    งานที่ไม่ทันยังมีสถานะใน withdraw_requests.cashout_job ให้ sweeper ของ worker อื่นเก็บกู้
+    """
+    if "approved_requests" in sys.modules:
+        pool = sys.modules["approved_requests"].cashout_workers
+        # ต้องเสร็จก่อน master kill worker เมื่อครบ graceful_timeout
+        if not pool.drain(min(Config.CASHOUT_DRAIN_SECONDS, max(0, graceful_timeout - 5))):
+            server.log.warning(f"⚠️ [GUNICORN] worker {worker.pid} จบขณะยังมีงาน cashout ค้าง {pool.pending()} งาน")
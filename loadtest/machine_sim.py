@@ -0,0 +1,237 @@
+"""
+เครื่อง REST_API_CI จำลอง สำหรับ load test (ไม่ต้องแตะตู้เงินจริง)
+
+    python loadtest/machine_sim.py --port 5900 --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+
+แล้วชี้แอปมาที่เครื่องจำลอง:
+
+    REST_API_CI_BASE_NONIKO=http://127.0.0.1:5900 \\
+    REST_API_CI_BASE_KLANGFROZEN=http://127.0.0.1:5900 gunicorn -c gunicorn.conf.py
+
+endpoint: /cashout/plan, /cashout/request, /cashout/status, /replenishment/start|end|cancel, /socket/latest
+- latency: หน่วงทุก request (latency_ms ± jitter_ms)
+- error rate: สัดส่วน request ที่ตอบ 500 {"success": false}
+- inventory: จำนวนธนบัตร/เหรียญต่อชนิด (หน่วยสตางค์ เหมือนเครื่องจริง) จ่ายออกตอน cashout รับเข้าตอนฝาก
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Flask, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# ชนิดธนบัตร/เหรียญ (สตางค์) และจำนวนเริ่มต้นในตลับ
+DEFAULT_INVENTORY = {
+    "100": 500,
+    "200": 500,
+    "500": 300,
+    "1000": 300,
+    "2000": 200,
+    "5000": 200,
+    "10000": 200,
+    "50000": 100,
+    "100000": 100,
+}
+
+# ยอดที่เพิ่มขึ้นต่อการอ่าน /socket/latest ระหว่างฝาก (จำลองการใส่ธนบัตรทีละใบ)
+DEPOSIT_NOTES_BAHT = (20, 50, 100, 500, 1000)
+
+
+def parse_inventory(text: str) -> Dict[str, int]:
+    """ "10000=200,50000=100" → {"10000": 200, "50000": 100} """
+    inventory = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        unit, count = item.split("=")
+        inventory[str(int(unit))] = int(count)
+    return inventory
+
+
+class MachineSimulator:
+    """state ของเครื่องจำลอง (ตลับเงินและ session ฝาก) ใช้ร่วมกันทุก thread ของ server"""
+
+    def __init__(
+        self,
+        latency_ms: float = 100,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        inventory: Optional[Dict[str, int]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.inventory = dict(inventory if inventory is not None else DEFAULT_INVENTORY)
+        self.sessions: Dict[str, Dict[str, float]] = {}
+        # ผล cashout ต่อ X-Sale-Id (แอปใช้ request_id) สำหรับ /cashout/status
+        self.cashouts: Dict[str, Dict[str, int]] = {}
+        self.last_session: Optional[str] = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> None:
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def plan(self, amount_baht: float) -> Optional[Dict[str, int]]:
+        """แตกยอดเป็นธนบัตร/เหรียญจากชนิดใหญ่ไปเล็กตามของที่มีในตลับ (None = จ่ายไม่ได้)"""
+        remaining = int(round(amount_baht * 100))
+        denominations = {}
+        with self._lock:
+            for unit in sorted(self.inventory, key=int, reverse=True):
+                count = min(remaining // int(unit), self.inventory[unit])
+                denominations[unit] = count
+                remaining -= count * int(unit)
+        return denominations if remaining == 0 and amount_baht > 0 else None
+
+    def dispense(self, denominations: Dict[str, int], sale_id: Optional[str] = None) -> bool:
+        with self._lock:
+            if any(self.inventory.get(unit, 0) < int(count) for unit, count in denominations.items()):
+                return False
+            for unit, count in denominations.items():
+                self.inventory[unit] -= int(count)
+            if sale_id:
+                self.cashouts[sale_id] = dict(denominations)
+            return True
+
+    def cashout_status(self, sale_id: Optional[str]) -> Optional[Dict[str, int]]:
+        with self._lock:
+            return self.cashouts.get(sale_id)
+
+    def start_session(self, session_id: str) -> None:
+        with self._lock:
+            self.sessions[session_id] = {"amount_baht": 0, "started_at": time.time()}
+            self.last_session = session_id
+
+    def read_session(self, session_id: Optional[str]) -> Optional[Dict[str, float]]:
+        """ยอดของ session ที่กำลังฝาก: ทุกการอ่านมีธนบัตรเข้าเพิ่มหนึ่งใบ"""
+        with self._lock:
+            session = self.sessions.get(session_id or self.last_session)
+            if session is None:
+                return None
+            session["amount_baht"] += self._rng.choice(DEPOSIT_NOTES_BAHT)
+            return dict(session)
+
+    def end_session(self, session_id: str, cancel: bool = False) -> Optional[Dict[str, float]]:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None or cancel:
+                return session
+            # เก็บธนบัตรที่ฝากเข้าตลับ 100 บาท
+            self.inventory["10000"] = self.inventory.get("10000", 0) + int(session["amount_baht"] // 100)
+            return session
+
+
+def create_app(sim: MachineSimulator) -> Flask:
+    app = Flask(__name__)
+
+    @app.before_request
+    def _simulate_machine():
+        sim.delay()
+        if sim.should_fail():
+            return jsonify({"success": False, "error": "simulated machine error"}), 500
+        return None
+
+    @app.route("/cashout/plan", methods=["POST"])
+    def cashout_plan():
+        amount = float((request.get_json(silent=True) or {}).get("amount") or 0)
+        denominations = sim.plan(amount)
+        if denominations is None:
+            return jsonify({"success": False, "error": f"cannot dispense {amount}"})
+        return jsonify({"success": True, "amount": amount, "denominations": denominations})
+
+    @app.route("/cashout/request", methods=["POST"])
+    def cashout_request():
+        denominations = (request.get_json(silent=True) or {}).get("denominations") or {}
+        if not sim.dispense(denominations, request.headers.get("X-Sale-Id")):
+            return jsonify({"success": False, "error": "insufficient cassette inventory"})
+        return jsonify({
+            "success": True,
+            "transaction_status": "success",
+            "denominations": denominations,
+            "result": {"status": "sent"},
+        })
+
+    @app.route("/cashout/status", methods=["GET"])
+    def cashout_status():
+        denominations = sim.cashout_status(request.args.get("sale_id") or request.headers.get("X-Sale-Id"))
+        if denominations is None:
+            return jsonify({"success": True, "found": False})
+        return jsonify({
+            "success": True,
+            "found": True,
+            "transaction_status": "success",
+            "denominations": denominations,
+        })
+
+    @app.route("/replenishment/start", methods=["POST"])
+    def replenishment_start():
+        data = request.get_json(silent=True) or {}
+        if not data.get("session_id"):
+            return jsonify({"success": False, "error": "missing session_id"})
+        sim.start_session(data["session_id"])
+        return jsonify({"success": True, "session_id": data["session_id"], "seq_no": data.get("seq_no")})
+
+    @app.route("/replenishment/end", methods=["POST"])
+    def replenishment_end():
+        data = request.get_json(silent=True) or {}
+        session = sim.end_session(data.get("session_id"))
+        if session is None:
+            return jsonify({"success": False, "error": "no active session"})
+        return jsonify({"success": True, "amount_baht": session["amount_baht"]})
+
+    @app.route("/replenishment/cancel", methods=["POST"])
+    def replenishment_cancel():
+        data = request.get_json(silent=True) or {}
+        sim.end_session(data.get("session_id"), cancel=True)
+        return jsonify({"success": True})
+
+    @app.route("/socket/latest", methods=["GET"])
+    def socket_latest():
+        session = sim.read_session(request.headers.get("X-Session-Id") or request.headers.get("X-Sale-Id"))
+        if session is None:
+            return jsonify({"success": True, "amount_baht": 0, "ts": int(time.time() * 1000)})
+        return jsonify({"success": True, "amount_baht": session["amount_baht"], "ts": int(time.time() * 1000)})
+
+    @app.route("/sim/inventory", methods=["GET"])
+    def sim_inventory():
+        return jsonify({"inventory": sim.inventory, "active_sessions": len(sim.sessions)})
+
+    return app
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="REST_API_CI machine simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--inventory", type=parse_inventory, default=None, help='เช่น "10000=200,50000=100"')
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    sim = MachineSimulator(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        inventory=args.inventory,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.WARNING)
+    logger.warning(f"🏧 [SIM] เครื่องจำลองที่ http://{args.host}:{args.port} (latency {args.latency_ms}±{args.jitter_ms} ms, error {args.error_rate:.0%})")
+    create_app(sim).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
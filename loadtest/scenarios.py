@@ -0,0 +1,223 @@
+"""
+ยิง flow จริงของแอปพร้อมกันหลาย user แล้วสรุป latency (p50/p95/p99) และ throughput ต่อขั้นตอน
+
+    python loadtest/scenarios.py --app-url http://127.0.0.1:5010 --users 20 --duration 60 --scenario mixed
+
+- withdraw: /money/api/withdraw-request → /money/approve/<id> → poll /money/api/withdraw-status จนได้ผลจากเครื่อง
+- deposit: /money/api/deposit-request → /money/api/socket-latest-proxy (ระหว่างฝาก) → /money/api/replenishment-end
+
+แอปต้องชี้ REST_API_CI ไปที่ loadtest/machine_sim.py (ดู docstring ของไฟล์นั้น)
+และใช้ MongoDB สำหรับทดสอบเท่านั้น: scenario สร้างคำขอ/รายการฝากจริง
+"""
+import argparse
+import json
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+LOCATIONS = ("โนนิโกะ", "คลังห้องเย็น")
+# สถานะสุดท้ายของคำขอเบิกหลังเครื่องตอบ
+WITHDRAW_FINAL_STATUSES = ("approved", "error")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """nearest-rank percentile ของ list ที่เรียงแล้ว"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """เก็บเวลาของทุกขั้นตอน (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, step: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self.samples[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+
+    def timed(self, step: str, func: Callable[[], requests.Response], ok: Callable[[requests.Response], bool]):
+        start = time.perf_counter()
+        try:
+            response = func()
+        except requests.RequestException:
+            self.record(step, time.perf_counter() - start, ok=False)
+            return None
+        self.record(step, time.perf_counter() - start, ok=ok(response))
+        return response
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        with self._lock:
+            for step, values in sorted(self.samples.items()):
+                ordered = sorted(values)
+                report[step] = {
+                    "count": len(ordered),
+                    "errors": self.errors.get(step, 0),
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+                    "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+                    "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                    "per_second": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+                }
+        return report
+
+
+def _json_ok(response: requests.Response) -> bool:
+    try:
+        return response.ok and response.json().get("status") == "ok"
+    except ValueError:
+        return False
+
+
+def withdraw_flow(session: requests.Session, base: str, recorder: Recorder, user_id: str, poll_timeout: float = 30) -> bool:
+    """สร้างคำขอเบิก → อนุมัติ → รอผลจากเครื่อง (end-to-end ต่อคำขอบันทึกเป็น withdraw_flow)"""
+    flow_start = time.perf_counter()
+    payload = {"userId": user_id, "amount": "100", "reason": "ice", "location": LOCATIONS[hash(user_id) % 2]}
+    created = recorder.timed(
+        "withdraw_request", lambda: session.post(f"{base}/money/api/withdraw-request", json=payload), _json_ok
+    )
+    if created is None or not _json_ok(created):
+        return False
+    request_id = created.json()["request_id"]
+
+    approved = recorder.timed(
+        "approve_request", lambda: session.post(f"{base}/money/approve/{request_id}"), lambda r: r.status_code == 202
+    )
+    if approved is None or approved.status_code != 202:
+        return False
+
+    deadline = time.monotonic() + poll_timeout
+    status = None
+    while time.monotonic() < deadline:
+        polled = recorder.timed(
+            "withdraw_status",
+            lambda: session.get(f"{base}/money/api/withdraw-status", params={"id": request_id}),
+            _json_ok,
+        )
+        status = polled.json()["data"]["status"] if polled is not None and _json_ok(polled) else None
+        if status in WITHDRAW_FINAL_STATUSES:
+            break
+        time.sleep(0.2)
+    ok = status == "approved"
+    recorder.record("withdraw_flow", time.perf_counter() - flow_start, ok=ok)
+    return ok
+
+
+def deposit_flow(session: requests.Session, base: str, recorder: Recorder, user_id: str, socket_reads: int = 5) -> bool:
+    """เริ่มฝาก → อ่านยอดจากเครื่องระหว่างฝาก → จบฝาก (บันทึก end-to-end เป็น deposit_flow)"""
+    flow_start = time.perf_counter()
+    location = LOCATIONS[hash(user_id) % 2]
+    started = recorder.timed(
+        "deposit_request",
+        lambda: session.post(
+            f"{base}/money/api/deposit-request", json={"userId": user_id, "reason": "daily_sales", "location": location}
+        ),
+        _json_ok,
+    )
+    if started is None or not _json_ok(started):
+        return False
+    info = started.json()
+
+    params = {k: info.get(k) for k in ("branch_id", "branch_base_url", "trace_id", "request_id", "sale_id", "seq_no", "session_id")}
+    amount = 0
+    for _ in range(socket_reads):
+        latest = recorder.timed(
+            "socket_latest", lambda: session.get(f"{base}/money/api/socket-latest-proxy", params=params), _json_ok
+        )
+        if latest is not None and _json_ok(latest):
+            amount = latest.json().get("amount_baht", amount)
+        time.sleep(0.2)
+
+    end_payload = {
+        "deposit_id": info["deposit_request_id"],
+        "session_id": info["session_id"],
+        "seq_no": info["seq_no"],
+        "user_id": user_id,
+        "reason_code": "daily_sales",
+        "location": location,
+        "amount": amount,
+    }
+    ended = recorder.timed(
+        "replenishment_end", lambda: session.post(f"{base}/money/api/replenishment-end", json=end_payload), _json_ok
+    )
+    ok = ended is not None and _json_ok(ended)
+    recorder.record("deposit_flow", time.perf_counter() - flow_start, ok=ok)
+    return ok
+
+
+SCENARIOS = {
+    "withdraw": (withdraw_flow,),
+    "deposit": (deposit_flow,),
+    "mixed": (withdraw_flow, deposit_flow),
+}
+
+
+def run(base: str, scenario: str, users: int, duration: float, iterations: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """
+    รัน virtual user พร้อมกัน users ตัว แต่ละตัววนทำ flow ของ scenario จนครบ duration วินาที
+    (หรือครบ iterations รอบต่อ user ถ้ากำหนด)
+    """
+    flows = SCENARIOS[scenario]
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+    base = base.rstrip("/")
+
+    def virtual_user(index: int) -> None:
+        session = requests.Session()
+        user_id = f"U-loadtest-{index}-{uuid.uuid4().hex[:6]}"
+        done = 0
+        while time.monotonic() < stop_at and (iterations is None or done < iterations):
+            flows[done % len(flows)](session, base, recorder, user_id)
+            done += 1
+        session.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(virtual_user, range(users)))
+    return recorder.summary(time.perf_counter() - start)
+
+
+def format_report(report: Dict[str, Dict[str, float]]) -> str:
+    header = f"{'step':<20}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}"
+    lines = [header, "-" * len(header)]
+    for step, row in report.items():
+        lines.append(
+            f"{step:<20}{row['count']:>8}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+            f"{row['p99_ms']:>10}{row['max_ms']:>10}{row['per_second']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test scenarios against the money app")
+    parser.add_argument("--app-url", default="http://127.0.0.1:5010")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--iterations", type=int, default=None, help="จำนวน flow ต่อ user (แทน duration)")
+    parser.add_argument("--json", dest="json_path", default=None, help="บันทึกผลเป็น JSON (เทียบก่อน/หลังแก้)")
+    args = parser.parse_args(argv)
+
+    duration = args.duration if args.iterations is None else float("inf")
+    report = run(args.app_url, args.scenario, args.users, duration, args.iterations)
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"scenario": args.scenario, "users": args.users, "steps": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,12 @@ Test cases:
 5. Approve request - missing denominations in plan response
 6. Approve request - request already approved (duplicate approval)
 7. Approve request - request not found
+8. Approve request - returns 202 and queues the cashout on the branch worker
+9. Approve request - branch queue full reverts status to pending
+10. Reject request - guarded pending -> rejected transition
+11. Cashout job state - worker claims the queued attempt and skips a job the sweeper re-queued
+12. Cashout sweeper - re-queues, finishes or reconciles stale awaiting_machine requests
+13. LIFF deposit end - completed doc and rollup on the same created_date_bkk, counted as a transition
 """
 
 import unittest
@@ -22,7 +28,8 @@ import requests
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
 # Import after path setup
-from approved_requests import approve_request, reject_request
+import approved_requests
+from approved_requests import approve_request, reject_request, sweep_stale_cashouts
 from flask import Flask
 from flask.testing import FlaskClient
 
@@ -50,24 +57,39 @@ class TestApprovedRequests(unittest.TestCase):
             "created_at_utc": "2024-01-15T03:30:00",
             "created_date_bkk": "2024-01-15",
         }
+
+        # Run queued cashout jobs inline so the machine calls can be asserted
+        submit_patcher = patch('approved_requests.cashout_workers.submit', side_effect=self._run_inline)
+        self.mock_submit = submit_patcher.start()
+        self.addCleanup(submit_patcher.stop)
+
+        rollups_patcher = patch('approved_requests.daily_rollups_collection')
+        self.mock_rollups = rollups_patcher.start()
+        self.addCleanup(rollups_patcher.stop)
+
+        transactions_patcher = patch('approved_requests.transactions_collection')
+        self.mock_transactions = transactions_patcher.start()
+        self.addCleanup(transactions_patcher.stop)
+
+    @staticmethod
+    def _run_inline(branch_id, func, *args, **kwargs):
+        func(*args, **kwargs)
+        return True
     
     @patch('approved_requests.requests_collection')
-    @patch('approved_requests.requests.post')
+    @patch('approved_requests.get_branch_client')
     @patch('approved_requests.now_bangkok_and_utc')
     @patch('approved_requests.build_correlation_headers')
-    @patch('approved_requests.get_rest_api_ci_base_for_branch')
     def test_approve_request_noniko_success(
         self,
-        mock_get_base,
         mock_build_headers,
         mock_now_bkk,
-        mock_requests_post,
+        mock_get_client,
         mock_requests_collection
     ):
         """Test successful approval for NONIKO branch"""
         # Setup mocks
-        mock_requests_collection.find_one.return_value = self.test_request_data.copy()
-        mock_requests_collection.update_one = Mock()
+        mock_requests_collection.find_one_and_update.return_value = self.test_request_data.copy()
         
         # Mock time
         mock_now_bkk.return_value = (
@@ -75,8 +97,9 @@ class TestApprovedRequests(unittest.TestCase):
             datetime(2024, 1, 15, 3, 35, 0)
         )
         
-        # Mock API base URL
-        mock_get_base.return_value = "http://10.0.0.14:5000"
+        # Mock pooled branch client
+        mock_get_client.return_value.base_url = "http://10.0.0.14:5000"
+        mock_requests_post = mock_get_client.return_value.post
         
         # Mock correlation headers
         mock_build_headers.return_value = (
@@ -136,6 +159,8 @@ class TestApprovedRequests(unittest.TestCase):
                 # Execute
                 result = approve_request(self.test_request_id)
         
+        mock_get_client.assert_called_once_with("NONIKO")
+
         # Verify /cashout/plan was called
         plan_calls = [call for call in mock_requests_post.call_args_list if '/cashout/plan' in call[0][0]]
         self.assertEqual(len(plan_calls), 1)
@@ -150,8 +175,8 @@ class TestApprovedRequests(unittest.TestCase):
         self.assertEqual(request_call[1]['json']['denominations']['10000'], 1)
         
         # Verify status was updated to awaiting_machine first
-        self.assertGreaterEqual(mock_requests_collection.update_one.call_count, 1)
-        update_calls = mock_requests_collection.update_one.call_args_list
+        self.assertGreaterEqual(mock_requests_collection.find_one_and_update.call_count, 1)
+        update_calls = mock_requests_collection.find_one_and_update.call_args_list
         
         # Check that status was updated to awaiting_machine
         awaiting_machine_call = next(
@@ -159,6 +184,12 @@ class TestApprovedRequests(unittest.TestCase):
             None
         )
         self.assertIsNotNone(awaiting_machine_call, "Should update status to awaiting_machine")
+        # Guarded by the expected status in the same round trip
+        self.assertEqual(awaiting_machine_call[0][0]["status"], "pending")
+        self.assertEqual(
+            awaiting_machine_call[0][1]['$push']['status_history']['status'], 'awaiting_machine'
+        )
+        mock_requests_collection.find_one.assert_not_called()
         
         # Check that status was updated to approved
         approved_call = next(
@@ -172,18 +203,40 @@ class TestApprovedRequests(unittest.TestCase):
         self.assertIn('denominations', approved_update)
         self.assertIn('cashout_plan_response', approved_update)
         self.assertIn('cashout_request_response', approved_update)
+
+        # Every stage of the cashout job is guarded by the attempt that owns it
+        stages = [
+            (call[0][0]["cashout_job.stage"], call[0][1]["$set"]["cashout_job.stage"])
+            for call in mock_requests_collection.update_one.call_args_list
+            if "cashout_job.attempt" in call[0][0]
+        ]
+        self.assertEqual(stages, [("queued", "planning"), ("planning", "dispensing"), ("dispensing", "dispensed")])
+        self.assertEqual(awaiting_machine_call[0][1]['$set']['cashout_job']['stage'], 'queued')
+        self.assertEqual(approved_update['cashout_job.stage'], 'approved')
+        self.assertEqual(approved_update['approved_date_bkk'], '2024-01-15')
+
+        # The expense is keyed by request_id so a recovered job cannot write it twice
+        expense_filter, expense_update = self.mock_transactions.update_one.call_args[0]
+        self.assertEqual(expense_filter, {"type": "expense", "request_id": self.test_request_id})
+        self.assertEqual(expense_update["$setOnInsert"]["selectedDate"], "2024-01-15")
+
+        # Verify the daily rollup for the request's day was incremented
+        rollup_filter, rollup_update = self.mock_rollups.update_one.call_args_list[0][0]
+        self.assertEqual(
+            rollup_filter,
+            {"created_date_bkk": "2024-01-15", "location": "โนนิโกะ", "type": "withdraw_approved"},
+        )
+        self.assertEqual(rollup_update["$inc"], {"count": 1, "amount": 100.0})
     
     @patch('approved_requests.requests_collection')
-    @patch('approved_requests.requests.post')
+    @patch('approved_requests.get_branch_client')
     @patch('approved_requests.now_bangkok_and_utc')
     @patch('approved_requests.build_correlation_headers')
-    @patch('approved_requests.get_rest_api_ci_base_for_branch')
     def test_approve_request_klangfrozen_success(
         self,
-        mock_get_base,
         mock_build_headers,
         mock_now_bkk,
-        mock_requests_post,
+        mock_get_client,
         mock_requests_collection
     ):
         """Test successful approval for Klangfrozen branch"""
@@ -191,8 +244,7 @@ class TestApprovedRequests(unittest.TestCase):
         test_data = self.test_request_data.copy()
         test_data["location"] = "คลังห้องเย็น"
         
-        mock_requests_collection.find_one.return_value = test_data
-        mock_requests_collection.update_one = Mock()
+        mock_requests_collection.find_one_and_update.return_value = test_data
         
         # Mock time
         mock_now_bkk.return_value = (
@@ -200,8 +252,9 @@ class TestApprovedRequests(unittest.TestCase):
             datetime(2024, 1, 15, 3, 35, 0)
         )
         
-        # Mock API base URL for Klangfrozen
-        mock_get_base.return_value = "http://10.0.0.15:5000"
+        # Mock pooled branch client for Klangfrozen
+        mock_get_client.return_value.base_url = "http://10.0.0.15:5000"
+        mock_requests_post = mock_get_client.return_value.post
         
         # Mock correlation headers
         mock_build_headers.return_value = (
@@ -258,6 +311,8 @@ class TestApprovedRequests(unittest.TestCase):
             with patch('approved_requests.redirect', return_value=redirect('/money/approved-requests')):
                 result = approve_request(self.test_request_id)
         
+        mock_get_client.assert_called_once_with("Klangfrozen")
+
         # Verify API calls
         plan_calls = [call for call in mock_requests_post.call_args_list if '/cashout/plan' in call[0][0]]
         self.assertEqual(len(plan_calls), 1)
@@ -266,7 +321,7 @@ class TestApprovedRequests(unittest.TestCase):
         self.assertEqual(len(request_calls), 1)
         
         # Verify status was updated to approved
-        update_calls = mock_requests_collection.update_one.call_args_list
+        update_calls = mock_requests_collection.find_one_and_update.call_args_list
         approved_call = next(
             (call for call in update_calls if call[0][1]['$set'].get('status') == 'approved'),
             None
@@ -274,28 +329,26 @@ class TestApprovedRequests(unittest.TestCase):
         self.assertIsNotNone(approved_call, "Should update status to approved")
     
     @patch('approved_requests.requests_collection')
-    @patch('approved_requests.requests.post')
+    @patch('approved_requests.get_branch_client')
     @patch('approved_requests.now_bangkok_and_utc')
     @patch('approved_requests.build_correlation_headers')
-    @patch('approved_requests.get_rest_api_ci_base_for_branch')
     def test_approve_request_plan_fails(
         self,
-        mock_get_base,
         mock_build_headers,
         mock_now_bkk,
-        mock_requests_post,
+        mock_get_client,
         mock_requests_collection
     ):
         """Test approval when /cashout/plan fails"""
-        mock_requests_collection.find_one.return_value = self.test_request_data.copy()
-        mock_requests_collection.update_one = Mock()
+        mock_requests_collection.find_one_and_update.return_value = self.test_request_data.copy()
         
         mock_now_bkk.return_value = (
             datetime(2024, 1, 15, 10, 35, 0),
             datetime(2024, 1, 15, 3, 35, 0)
         )
         
-        mock_get_base.return_value = "http://10.0.0.14:5000"
+        mock_get_client.return_value.base_url = "http://10.0.0.14:5000"
+        mock_requests_post = mock_get_client.return_value.post
         mock_build_headers.return_value = (
             {"X-Trace-Id": "t-12345678"},
             {"trace_id": "t-12345678", "request_id": "r-87654321", "sale_id": self.test_request_id}
@@ -322,7 +375,7 @@ class TestApprovedRequests(unittest.TestCase):
                     pass  # Expected to fail
         
         # Verify status was updated to error
-        update_calls = mock_requests_collection.update_one.call_args_list
+        update_calls = mock_requests_collection.find_one_and_update.call_args_list
         error_call = next(
             (call for call in update_calls if call[0][1]['$set'].get('status') == 'error'),
             None
@@ -330,28 +383,26 @@ class TestApprovedRequests(unittest.TestCase):
         self.assertIsNotNone(error_call, "Should update status to error when plan fails")
     
     @patch('approved_requests.requests_collection')
-    @patch('approved_requests.requests.post')
+    @patch('approved_requests.get_branch_client')
     @patch('approved_requests.now_bangkok_and_utc')
     @patch('approved_requests.build_correlation_headers')
-    @patch('approved_requests.get_rest_api_ci_base_for_branch')
     def test_approve_request_missing_denominations(
         self,
-        mock_get_base,
         mock_build_headers,
         mock_now_bkk,
-        mock_requests_post,
+        mock_get_client,
         mock_requests_collection
     ):
         """Test approval when plan response is missing denominations"""
-        mock_requests_collection.find_one.return_value = self.test_request_data.copy()
-        mock_requests_collection.update_one = Mock()
+        mock_requests_collection.find_one_and_update.return_value = self.test_request_data.copy()
         
         mock_now_bkk.return_value = (
             datetime(2024, 1, 15, 10, 35, 0),
             datetime(2024, 1, 15, 3, 35, 0)
         )
         
-        mock_get_base.return_value = "http://10.0.0.14:5000"
+        mock_get_client.return_value.base_url = "http://10.0.0.14:5000"
+        mock_requests_post = mock_get_client.return_value.post
         mock_build_headers.return_value = (
             {"X-Trace-Id": "t-12345678"},
             {"trace_id": "t-12345678", "request_id": "r-87654321", "sale_id": self.test_request_id}
@@ -379,7 +430,7 @@ class TestApprovedRequests(unittest.TestCase):
                     pass  # Expected to fail
         
         # Verify status was updated to error
-        update_calls = mock_requests_collection.update_one.call_args_list
+        update_calls = mock_requests_collection.find_one_and_update.call_args_list
         error_call = next(
             (call for call in update_calls if call[0][1]['$set'].get('status') == 'error'),
             None
@@ -389,6 +440,7 @@ class TestApprovedRequests(unittest.TestCase):
     @patch('approved_requests.requests_collection')
     def test_approve_request_not_found(self, mock_requests_collection):
         """Test approval when request is not found"""
+        mock_requests_collection.find_one_and_update.return_value = None
         mock_requests_collection.find_one.return_value = None
         
         # Create Flask app context
@@ -409,18 +461,262 @@ class TestApprovedRequests(unittest.TestCase):
         test_data = self.test_request_data.copy()
         test_data["status"] = "approved"
         
+        # Guarded update does not match because the status is no longer pending
+        mock_requests_collection.find_one_and_update.return_value = None
         mock_requests_collection.find_one.return_value = test_data
         
         # Create Flask app context
         with self.app.app_context():
-            from flask import redirect
-            with patch('approved_requests.redirect', return_value=redirect('/money/approved-requests')):
-                result = approve_request(self.test_request_id)
+            response, status_code = approve_request(self.test_request_id)
         
-        # Verify update_one was not called (should redirect early)
-        # The function should redirect without calling update_one for status changes
-        # We check that find_one was called
+        # No machine call is queued for a request that is not pending
+        self.assertEqual(status_code, 409)
+        self.assertEqual(response.get_json()["request_status"], "approved")
         mock_requests_collection.find_one.assert_called_once()
+        mock_requests_collection.update_one.assert_not_called()
+        self.mock_submit.assert_not_called()
+
+    @patch('approved_requests.requests_collection')
+    @patch('approved_requests.now_bangkok_and_utc')
+    def test_approve_request_returns_immediately_and_queues_cashout(self, mock_now_bkk, mock_requests_collection):
+        """Approval answers 202 right away; the machine calls happen on the branch worker"""
+        test_data = self.test_request_data.copy()
+        test_data["location"] = "คลังห้องเย็น"
+        mock_requests_collection.find_one_and_update.return_value = test_data
+        mock_now_bkk.return_value = (
+            datetime(2024, 1, 15, 10, 35, 0),
+            datetime(2024, 1, 15, 3, 35, 0)
+        )
+        self.mock_submit.side_effect = None
+        self.mock_submit.return_value = True
+
+        with self.app.app_context():
+            response, status_code = approve_request(self.test_request_id)
+
+        self.assertEqual(status_code, 202)
+        self.assertEqual(response.get_json()["request_status"], "awaiting_machine")
+        self.assertIn(self.test_request_id, response.get_json()["status_url"])
+
+        branch_id, func, *args = self.mock_submit.call_args[0]
+        self.assertEqual(branch_id, "Klangfrozen")
+        self.assertEqual(args[0], self.test_request_id)
+
+    @patch('approved_requests.requests_collection')
+    @patch('approved_requests.now_bangkok_and_utc')
+    def test_approve_request_queue_full_reverts_to_pending(self, mock_now_bkk, mock_requests_collection):
+        """When the branch queue is full the request goes back to pending"""
+        mock_requests_collection.find_one_and_update.return_value = self.test_request_data.copy()
+        mock_now_bkk.return_value = (
+            datetime(2024, 1, 15, 10, 35, 0),
+            datetime(2024, 1, 15, 3, 35, 0)
+        )
+        self.mock_submit.side_effect = None
+        self.mock_submit.return_value = False
+
+        with self.app.app_context():
+            response, status_code = approve_request(self.test_request_id)
+
+        self.assertEqual(status_code, 503)
+        statuses = [
+            call[0][1]['$set']['status'] for call in mock_requests_collection.find_one_and_update.call_args_list
+        ]
+        self.assertEqual(statuses, ["awaiting_machine", "pending"])
+
+
+    @patch('approved_requests.requests_collection')
+    def test_reject_request_only_rejects_pending(self, mock_requests_collection):
+        """Reject is a single guarded pending -> rejected update"""
+        with self.app.app_context():
+            from flask import redirect
+            with patch('approved_requests.redirect', return_value=redirect('/money/approved-requests')):
+                reject_request(self.test_request_id)
+
+        query, update = mock_requests_collection.find_one_and_update.call_args[0]
+        self.assertEqual(query, {"request_id": self.test_request_id, "status": "pending"})
+        self.assertEqual(update['$set']['status'], 'rejected')
+        self.assertEqual(update['$push']['status_history']['status'], 'rejected')
+        mock_requests_collection.update_one.assert_not_called()
+
+    @patch('approved_requests.requests_collection')
+    @patch('approved_requests.get_branch_client')
+    def test_cashout_skips_job_taken_over_by_sweeper(self, mock_get_client, mock_requests_collection):
+        """A worker whose attempt was re-queued by the sweeper never calls the machine"""
+        mock_requests_collection.update_one.return_value.matched_count = 0
+
+        approved_requests._process_cashout(self.test_request_id, "NONIKO", self.test_request_data, attempt=1)
+
+        mock_get_client.return_value.post.assert_not_called()
+        mock_requests_collection.find_one_and_update.assert_not_called()
+
+    @patch('approved_requests.requests_collection')
+    @patch('approved_requests.get_branch_client')
+    def test_cashout_timeout_after_dispatch_is_left_for_reconciliation(self, mock_get_client, mock_requests_collection):
+        """A timeout on /cashout/request may still have dispensed: do not mark it as error"""
+        plan_response = Mock()
+        plan_response.json.return_value = {"success": True, "denominations": {"10000": 1}}
+
+        def post(path, **kwargs):
+            if path == "/cashout/plan":
+                return plan_response
+            raise requests.exceptions.ReadTimeout("read timed out")
+
+        mock_get_client.return_value.post.side_effect = post
+
+        approved_requests._process_cashout(self.test_request_id, "NONIKO", self.test_request_data, attempt=1)
+
+        mock_requests_collection.find_one_and_update.assert_not_called()
+        last_stage = mock_requests_collection.update_one.call_args[0][1]["$set"]["cashout_job.stage"]
+        self.assertEqual(last_stage, "dispensing")
+
+    @patch('approved_requests.requests_collection')
+    @patch('approved_requests.get_branch_client')
+    def test_cashout_unexpected_error_after_dispatch_is_left_for_reconciliation(
+        self, mock_get_client, mock_requests_collection
+    ):
+        """An unreadable /cashout/request response does not mean the machine did not pay: never mark it as error"""
+        plan_response = Mock()
+        plan_response.json.return_value = {"success": True, "denominations": {"10000": 1}}
+        cashout_response = Mock()
+        cashout_response.json.side_effect = ValueError("Expecting value")
+        mock_get_client.return_value.post.side_effect = (
+            lambda path, **kwargs: plan_response if path == "/cashout/plan" else cashout_response
+        )
+
+        approved_requests._process_cashout(self.test_request_id, "NONIKO", self.test_request_data, attempt=1)
+
+        mock_requests_collection.find_one_and_update.assert_not_called()
+        last_stage = mock_requests_collection.update_one.call_args[0][1]["$set"]["cashout_job.stage"]
+        self.assertEqual(last_stage, "dispensing")
+
+
+class TestCashoutSweeper(unittest.TestCase):
+    """Recovery of requests whose cashout job was lost with its worker process"""
+
+    def setUp(self):
+        patchers = {
+            "requests": patch('approved_requests.requests_collection'),
+            "transactions": patch('approved_requests.transactions_collection'),
+            "rollups": patch('approved_requests.daily_rollups_collection'),
+            "submit": patch('approved_requests.cashout_workers.submit', return_value=True),
+            "machine": patch('approved_requests._query_machine_cashout'),
+        }
+        self.mocks = {}
+        for name, patcher in patchers.items():
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.collection = self.mocks["requests"]
+        self.collection.update_one.return_value.matched_count = 1
+        self.collection.find_one_and_update.return_value = {"request_id": "req-1"}
+
+    def _stale(self, status="awaiting_machine", **job):
+        doc = {
+            "request_id": "req-1",
+            "status": status,
+            "amount": "100",
+            "reason": "ice",
+            "location": "โนนิโกะ",
+            "created_date_bkk": "2024-01-15",
+            "approved_date_bkk": "2024-01-15",
+        }
+        if job:
+            doc["cashout_job"] = dict({"attempt": 1, "updated_at_utc": "2024-01-15T00:00:00+00:00"}, **job)
+        self.collection.find.return_value.limit.return_value = [doc]
+        return doc
+
+    def _statuses(self):
+        return [call[0][1]["$set"]["status"] for call in self.collection.find_one_and_update.call_args_list]
+
+    def test_queued_job_is_requeued_with_next_attempt(self):
+        doc = self._stale(stage="planning")
+
+        self.assertEqual(sweep_stale_cashouts(), 1)
+
+        branch_id, func, request_id, _, request_data, attempt = self.mocks["submit"].call_args[0]
+        self.assertEqual((branch_id, request_id, attempt), ("NONIKO", "req-1", 2))
+        requeued = self.collection.update_one.call_args_list[-1][0][1]["$set"]["cashout_job"]
+        self.assertEqual((requeued["attempt"], requeued["stage"]), (2, "queued"))
+        self.mocks["machine"].assert_not_called()
+
+    def test_gives_up_after_max_attempts(self):
+        self._stale(stage="queued", attempt=approved_requests.Config.CASHOUT_MAX_ATTEMPTS)
+
+        sweep_stale_cashouts()
+
+        self.mocks["submit"].assert_not_called()
+        self.assertEqual(self._statuses(), ["error"])
+
+    def test_dispensing_job_confirmed_by_machine_is_approved_once(self):
+        self._stale(stage="dispensing", denominations={"10000": 1})
+        self.mocks["machine"].return_value = (
+            approved_requests.MACHINE_DISPENSED,
+            {"success": True, "found": True, "transaction_status": "success"},
+        )
+
+        sweep_stale_cashouts()
+
+        self.assertEqual(self._statuses(), ["approved"])
+        self.mocks["submit"].assert_not_called()
+        expense_filter, _ = self.mocks["transactions"].update_one.call_args[0]
+        self.assertEqual(expense_filter, {"type": "expense", "request_id": "req-1"})
+
+    def test_unknown_machine_result_needs_manual_check(self):
+        self._stale(stage="dispensing")
+        self.mocks["machine"].return_value = (approved_requests.MACHINE_UNKNOWN, None)
+
+        sweep_stale_cashouts()
+
+        self.assertEqual(self._statuses(), ["error"])
+        self.assertIn("ตรวจสอบกับเครื่อง", self.collection.find_one_and_update.call_args[0][1]["$set"]["machine_error"])
+        self.mocks["submit"].assert_not_called()
+
+    def test_approved_without_expense_writes_it_on_approval_date(self):
+        self._stale(status="approved", stage="approved")
+        self.mocks["transactions"].update_one.return_value.upserted_id = "new"
+
+        sweep_stale_cashouts()
+
+        _, expense_update = self.mocks["transactions"].update_one.call_args[0]
+        self.assertEqual(expense_update["$setOnInsert"]["selectedDate"], "2024-01-15")
+        done = self.collection.update_one.call_args_list[-1][0][1]["$set"]
+        self.assertEqual(done["cashout_job.stage"], "done")
+
+    def test_job_claimed_by_another_worker_is_skipped(self):
+        self._stale(stage="dispensed")
+        self.collection.update_one.return_value.matched_count = 0
+
+        self.assertEqual(sweep_stale_cashouts(), 0)
+        self.collection.find_one_and_update.assert_not_called()
+
+
+class TestReplenishmentEnd(unittest.TestCase):
+    """LIFF deposit is recorded once, at replenishment-end"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.register_blueprint(approved_requests.approved_requests_bp)
+        self.client = self.app.test_client()
+        self.mocks = {}
+        for name in ("deposit_requests_collection", "daily_rollups_collection", "get_branch_client",
+                     "_stop_socket_stream", "observe_status_transition"):
+            patcher = patch(f"approved_requests.{name}")
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mocks["get_branch_client"].return_value.post.return_value.json.return_value = {"success": True}
+
+    def test_completed_doc_and_rollup_share_created_date(self):
+        payload = {"deposit_id": "d-1", "session_id": "d-1", "user_id": "U1", "reason_code": "change",
+                   "location": "โนนิโกะ", "amount": 500}
+
+        response = self.client.post("/money/api/replenishment-end", json=payload)
+
+        self.assertEqual(response.status_code, 200)
+        doc = self.mocks["deposit_requests_collection"].insert_one.call_args[0][0]
+        self.assertEqual(doc["status"], "completed")
+        rollup_query = self.mocks["daily_rollups_collection"].update_one.call_args[0][0]
+        self.assertEqual(rollup_query["created_date_bkk"], doc["created_date_bkk"])
+        self.mocks["observe_status_transition"].assert_called_once_with(
+            self.mocks["deposit_requests_collection"], "completed", True
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from bson.objectid import ObjectId
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from backfill_created_date import LEGACY_FILTER, backfill_created_dates, backfill_shard, build_update, split_id_range
+
+
+def _oid(day, hour=0):
+    return ObjectId.from_datetime(datetime(2025, 1, day, hour, tzinfo=timezone.utc))
+
+
+def _collection(docs):
+    col = MagicMock()
+    col.find.return_value.sort.return_value.batch_size.return_value = docs
+    col.bulk_write.side_effect = lambda ops, ordered: MagicMock(modified_count=len(ops))
+    return col
+
+
+class TestBackfillCreatedDate(unittest.TestCase):
+    def test_build_update_uses_objectid_time_in_bangkok(self):
+        update = build_update({"_id": _oid(1, 20), "status": "approved"})["$set"]
+        self.assertEqual(update["created_date_bkk"], "2025-01-02")
+        self.assertEqual(update["created_at_bkk"], "2025-01-02T03:00:00+07:00")
+        self.assertEqual(update["status_history"][0]["status"], "approved")
+
+        kept = build_update({"_id": _oid(1), "status_history": [{"status": "pending"}]})["$set"]
+        self.assertNotIn("status_history", kept)
+
+    def test_bulk_writes_in_batches_with_checkpoint(self):
+        docs = [{"_id": _oid(day), "status": "pending"} for day in range(1, 6)]
+        col, checkpoints = _collection(docs), MagicMock()
+
+        stats = backfill_shard(col, checkpoints, checkpoint_id="created_date_bkk/1/0", batch_size=2)
+
+        self.assertEqual(stats, {"scanned": 5, "updated": 5, "batches": 3})
+        self.assertEqual([len(c[0][0]) for c in col.bulk_write.call_args_list], [2, 2, 1])
+        saved_ids = [c[0][1]["$set"]["last_id"] for c in checkpoints.update_one.call_args_list if "last_id" in c[0][1]["$set"]]
+        self.assertEqual(saved_ids, [_oid(2), _oid(4), _oid(5)])
+        self.assertEqual(checkpoints.update_one.call_args_list[-1][0][1], {"$set": {"done": True}})
+
+    def test_resume_starts_after_last_id(self):
+        col = _collection([])
+        backfill_shard(col, MagicMock(), checkpoint_id="x", lower=_oid(1), upper=_oid(9), last_id=_oid(4))
+        query = col.find.call_args[0][0]
+        self.assertEqual(query["_id"], {"$gt": _oid(4), "$lt": _oid(9)})
+        self.assertEqual(query["created_date_bkk"], LEGACY_FILTER["created_date_bkk"])
+
+    def test_dry_run_writes_nothing(self):
+        col, checkpoints = _collection([{"_id": _oid(1)}, {"_id": _oid(2)}]), MagicMock()
+        stats = backfill_shard(col, checkpoints, checkpoint_id="x", batch_size=10, dry_run=True)
+        self.assertEqual(stats["scanned"], 2)
+        col.bulk_write.assert_not_called()
+        checkpoints.update_one.assert_not_called()
+
+    def test_split_id_range_into_time_slices(self):
+        col = MagicMock()
+        col.find_one.side_effect = [{"_id": _oid(1)}, {"_id": _oid(5)}]
+        ranges = split_id_range(col, 4)
+        self.assertEqual(ranges, [(None, _oid(2)), (_oid(2), _oid(3)), (_oid(3), _oid(4)), (_oid(4), None)])
+
+    def test_resume_skips_finished_shards(self):
+        db = {"withdraw_requests": _collection([{"_id": _oid(3)}]), "backfill_checkpoints": MagicMock()}
+        db["withdraw_requests"].count_documents.return_value = 1
+        db["backfill_checkpoints"].find.return_value = [
+            {"_id": "created_date_bkk/2/0", "shard": 0, "lower": None, "upper": _oid(2), "last_id": _oid(1), "done": True},
+            {"_id": "created_date_bkk/2/1", "shard": 1, "lower": _oid(2), "upper": None, "last_id": None, "done": False},
+        ]
+
+        report = backfill_created_dates(db, shards=2, batch_size=10)
+
+        self.assertEqual((report["shards_skipped"], report["scanned"], report["updated"]), (1, 1, 1))
+        self.assertEqual(db["withdraw_requests"].find.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
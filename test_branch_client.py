@@ -0,0 +1,96 @@
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from flask import Flask
+
+import branch_client
+from approved_requests import approved_requests_bp
+from branch_client import BranchClient, close_branch_clients, get_branch_client
+from http_utils import branch_id_for_base
+
+
+class TestBranchClient(unittest.TestCase):
+    def tearDown(self):
+        close_branch_clients()
+
+    def test_branch_aliases_share_client(self):
+        self.assertIs(get_branch_client("NONIKO"), get_branch_client("branch_noniko"))
+        self.assertEqual(get_branch_client("Klangfrozen").base_url, "http://10.0.0.15:5000")
+        self.assertEqual(get_branch_client("cold_storage").breaker.name, "Klangfrozen")
+
+    def test_unknown_branches_share_default_client(self):
+        self.assertIs(get_branch_client(None), get_branch_client("somewhere-else"))
+        self.assertEqual(set(branch_client._clients), {"default"})
+
+    def test_only_configured_base_urls_map_to_a_branch(self):
+        self.assertEqual(branch_id_for_base("http://10.0.0.14:5000/"), "NONIKO")
+        self.assertEqual(branch_id_for_base("http://10.0.0.15:5000"), "Klangfrozen")
+        self.assertIsNone(branch_id_for_base("http://169.254.169.254"))
+        self.assertIsNone(branch_id_for_base(None))
+
+    def test_branch_base_override_from_config(self):
+        with patch.object(branch_client.Config, "REST_API_CI_BASE_NONIKO", "http://127.0.0.1:5900"):
+            self.assertEqual(get_branch_client("NONIKO").base_url, "http://127.0.0.1:5900")
+
+    def test_request_adds_correlation_headers_and_timeouts(self):
+        client = BranchClient("http://10.0.0.14:5000", connect_timeout=2, read_timeout=7)
+        with patch.object(client.session, "request", return_value=Mock(status_code=200)) as mock_request:
+            client.post("/cashout/plan", json={"amount": 100.0}, sale_id="req-1")
+            client.get("socket/latest", timeout=5)
+
+        method, url = mock_request.call_args_list[0][0]
+        kwargs = mock_request.call_args_list[0][1]
+        self.assertEqual((method, url), ("POST", "http://10.0.0.14:5000/cashout/plan"))
+        self.assertEqual(kwargs["headers"]["X-Sale-Id"], "req-1")
+        self.assertEqual(kwargs["timeout"], (2, 7))
+
+        method, url = mock_request.call_args_list[1][0]
+        self.assertEqual((method, url), ("GET", "http://10.0.0.14:5000/socket/latest"))
+        self.assertEqual(mock_request.call_args_list[1][1]["timeout"], (2, 5))
+
+    def test_close_branch_clients_resets_registry(self):
+        get_branch_client("NONIKO")
+        close_branch_clients()
+        self.assertEqual(branch_client._clients, {})
+
+
+class TestSocketProxyBranch(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(approved_requests_bp)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        close_branch_clients()
+
+    def test_proxy_rejects_unknown_base_url(self):
+        with patch("approved_requests.read_socket_latest") as mock_read:
+            response = self.client.get("/money/api/socket-latest-proxy", query_string={"branch_base_url": "http://evil.example"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["message"], "unknown branch_base_url")
+        mock_read.assert_not_called()
+        self.assertEqual(branch_client._clients, {})
+
+    def test_proxy_uses_branch_client_for_configured_base(self):
+        with patch("approved_requests.read_socket_latest", return_value={"amount_baht": 120, "ts": 1}) as mock_read:
+            response = self.client.get(
+                "/money/api/socket-latest-proxy",
+                query_string={"branch_base_url": "http://10.0.0.14:5000", "session_id": "S-1"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(mock_read.call_args[0][0], get_branch_client("NONIKO"))
+
+    def test_stream_rejects_unknown_branch(self):
+        response = self.client.get("/money/api/socket-latest-stream", query_string={"branch_id": "X", "session_id": "S-1"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import unittest
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from branch_workers import BranchWorkerPool
+
+
+class TestBranchWorkerPool(unittest.TestCase):
+    def test_runs_jobs_per_branch(self):
+        pool = BranchWorkerPool("test", workers_per_branch=1, queue_size=5)
+        done = []
+        finished = threading.Event()
+
+        def job(name):
+            done.append((threading.current_thread().name, name))
+            if len(done) == 2:
+                finished.set()
+
+        self.assertTrue(pool.submit("NONIKO", job, "a"))
+        self.assertTrue(pool.submit("Klangfrozen", job, "b"))
+        self.assertTrue(finished.wait(2))
+
+        threads = {name: thread for thread, name in done}
+        self.assertIn("NONIKO", threads["a"])
+        self.assertIn("Klangfrozen", threads["b"])
+
+    def test_full_queue_rejects_without_blocking(self):
+        pool = BranchWorkerPool("test", workers_per_branch=1, queue_size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(2)
+
+        self.assertTrue(pool.submit("NONIKO", blocker))
+        self.assertTrue(started.wait(2))
+        self.assertTrue(pool.submit("NONIKO", lambda: None))  # fills the queue
+        self.assertFalse(pool.submit("NONIKO", lambda: None))
+        # other branch is unaffected
+        self.assertTrue(pool.submit("Klangfrozen", lambda: None))
+        release.set()
+
+    def test_drain_waits_for_accepted_jobs_and_rejects_new_ones(self):
+        pool = BranchWorkerPool("test", workers_per_branch=1, queue_size=5)
+        done = []
+
+        def job(name):
+            threading.Event().wait(0.05)
+            done.append(name)
+
+        for name in ("a", "b", "c"):
+            self.assertTrue(pool.submit("NONIKO", job, name))
+        self.assertTrue(pool.drain(2))
+        self.assertEqual(done, ["a", "b", "c"])
+        self.assertEqual(pool.pending(), 0)
+        self.assertFalse(pool.submit("NONIKO", job, "d"))
+
+    def test_drain_times_out_with_job_still_running(self):
+        pool = BranchWorkerPool("test", workers_per_branch=1, queue_size=5)
+        release = threading.Event()
+        self.assertTrue(pool.submit("NONIKO", release.wait, 2))
+        self.assertFalse(pool.drain(0.2))
+        self.assertEqual(pool.pending(), 1)
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from branch_client import BranchClient
+from circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("NONIKO", failure_threshold=3, reset_timeout=30, clock=self.clock)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure("timeout")
+
+    def test_trips_after_consecutive_failures(self):
+        self._fail(2)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self._fail(1)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.snapshot()["rejected_calls"], 1)
+
+    def test_success_resets_failure_count(self):
+        self._fail(2)
+        self.breaker.record_success()
+        self._fail(2)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_allows_single_probe(self):
+        self._fail(3)
+        self.clock.now += 30
+        self.breaker.before_call()  # probe
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self._fail(3)
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure("still down")
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertEqual(self.breaker.snapshot()["retry_in"], 30)
+
+    def test_open_error_is_request_exception(self):
+        self.assertTrue(issubclass(CircuitOpenError, requests.exceptions.RequestException))
+
+
+class TestBranchClientBreaker(unittest.TestCase):
+    def test_timeouts_trip_breaker_and_fast_fail(self):
+        client = BranchClient("http://10.0.0.14:5000", name="NONIKO")
+        client.breaker.failure_threshold = 2
+        with patch.object(client.session, "request", side_effect=requests.exceptions.ConnectTimeout("down")) as mock_request:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectTimeout):
+                    client.get("/socket/latest")
+            with self.assertRaises(CircuitOpenError):
+                client.get("/socket/latest")
+        self.assertEqual(mock_request.call_count, 2)
+
+    def test_server_error_counts_as_failure(self):
+        client = BranchClient("http://10.0.0.15:5000", name="Klangfrozen")
+        with patch.object(client.session, "request", return_value=Mock(status_code=503)):
+            client.post("/cashout/plan", json={"amount": 1.0})
+        self.assertEqual(client.breaker.snapshot()["consecutive_failures"], 1)
+
+    def test_non_machine_errors_do_not_count_as_failure(self):
+        client = BranchClient("http://10.0.0.15:5000", name="Klangfrozen")
+        client.breaker.failure_threshold = 1
+        for error in (requests.exceptions.InvalidURL("bad url"), KeyboardInterrupt()):
+            with self.subTest(error=type(error).__name__):
+                with patch.object(client.session, "request", side_effect=error):
+                    with self.assertRaises(type(error)):
+                        client.get("/socket/latest")
+                self.assertEqual(client.breaker.snapshot()["consecutive_failures"], 0)
+                self.assertEqual(client.breaker.state, STATE_CLOSED)
+
+    def test_half_open_probe_is_released_when_not_counted(self):
+        clock = FakeClock()
+        client = BranchClient("http://10.0.0.15:5000", name="Klangfrozen")
+        client.breaker = CircuitBreaker("Klangfrozen", failure_threshold=1, reset_timeout=10, clock=clock)
+        client.breaker.record_failure("down")
+        clock.now += 10
+
+        with patch.object(client.session, "request", side_effect=requests.exceptions.InvalidURL("bad url")):
+            with self.assertRaises(requests.exceptions.InvalidURL):
+                client.get("/socket/latest")
+        # probe ถูกคืน: request ถัดไปยังเป็น probe ได้ ไม่ติด CircuitOpenError
+        with patch.object(client.session, "request", return_value=Mock(status_code=200)):
+            client.get("/socket/latest")
+        self.assertEqual(client.breaker.state, STATE_CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from services.daily_close_service import (
+    ClosedDayCache,
+    build_daily_close_pipeline,
+    dates_between,
+    get_daily_close,
+    sum_daily_close,
+)
+
+
+def _row(date_bkk, location, withdraw=0.0, deposit=0.0, expense=0.0):
+    return {
+        "date": date_bkk,
+        "location": location,
+        "withdraw": {"count": 1 if withdraw else 0, "amount": withdraw},
+        "deposit": {"count": 1 if deposit else 0, "amount": deposit},
+        "expense": {"count": 1 if expense else 0, "amount": expense},
+        "net_cash": deposit - withdraw,
+        "withdraw_vs_expense_diff": withdraw - expense,
+    }
+
+
+class TestDailyClose(unittest.TestCase):
+    def test_dates_between(self):
+        self.assertEqual(dates_between("2025-12-30", "2026-01-02"), ["2025-12-30", "2025-12-31", "2026-01-01", "2026-01-02"])
+
+    def test_pipeline_unions_three_sources(self):
+        pipeline = build_daily_close_pipeline(
+            ["2025-12-24"], deposit_collection_name="deposit_requests", transactions_collection_name="transactions"
+        )
+        self.assertEqual(pipeline[0]["$match"], {"status": "approved", "approved_date_bkk": {"$in": ["2025-12-24"]}})
+        unions = [stage["$unionWith"]["coll"] for stage in pipeline if "$unionWith" in stage]
+        self.assertEqual(unions, ["deposit_requests", "transactions"])
+        self.assertIn("withdraw_amount", pipeline[4]["$group"])
+
+    def test_closed_days_are_cached_and_today_is_recomputed(self):
+        collection = MagicMock()
+        collection.distinct.return_value = []
+        collection.aggregate.return_value = [
+            _row("2025-12-23", "โนนิโกะ", withdraw=100.0, expense=100.0),
+            _row("2025-12-24", "โนนิโกะ", deposit=500.0),
+        ]
+        deposits = MagicMock()
+        deposits.name = "deposit_requests"
+        deposits.distinct.return_value = []
+        cache = ClosedDayCache()
+        kwargs = dict(
+            deposit_collection=deposits,
+            transactions_collection_name="transactions",
+            dates=["2025-12-23", "2025-12-24"],
+            today="2025-12-24",
+            cache=cache,
+        )
+
+        rows, cached_days = get_daily_close(collection, **kwargs)
+        self.assertEqual([r["date"] for r in rows], ["2025-12-23", "2025-12-24"])
+        self.assertEqual(cached_days, 0)
+
+        collection.aggregate.return_value = [_row("2025-12-24", "โนนิโกะ", deposit=700.0)]
+        rows, cached_days = get_daily_close(collection, **kwargs)
+        self.assertEqual(cached_days, 1)
+        self.assertEqual(rows[1]["deposit"]["amount"], 700.0)
+        # รอบที่สองคำนวณเฉพาะวันนี้
+        matched_dates = collection.aggregate.call_args[0][0][0]["$match"]["approved_date_bkk"]["$in"]
+        self.assertEqual(matched_dates, ["2025-12-24"])
+
+    def test_days_with_open_requests_are_not_cached(self):
+        collection = MagicMock()
+        collection.aggregate.return_value = [
+            _row("2025-12-21", "โนนิโกะ", withdraw=100.0, expense=100.0),
+            _row("2025-12-22", "โนนิโกะ", withdraw=100.0),
+            _row("2025-12-23", "โนนิโกะ", deposit=300.0),
+        ]
+        # 2025-12-22 มีคำขอที่อนุมัติแล้วแต่ยังไม่บันทึกค่าใช้จ่าย
+        collection.distinct.return_value = ["2025-12-22"]
+        # 2025-12-23 ยังมีรายการฝาก replenishment_started
+        deposits = MagicMock()
+        deposits.name = "deposit_requests"
+        deposits.distinct.return_value = ["2025-12-23"]
+        cache = ClosedDayCache()
+
+        get_daily_close(
+            collection,
+            deposit_collection=deposits,
+            transactions_collection_name="transactions",
+            dates=["2025-12-21", "2025-12-22", "2025-12-23"],
+            today="2025-12-24",
+            cache=cache,
+        )
+
+        found, missing = cache.get_many(["2025-12-21", "2025-12-22", "2025-12-23"])
+        self.assertEqual(list(found), ["2025-12-21"])
+        self.assertEqual(missing, ["2025-12-22", "2025-12-23"])
+        field, withdraw_query = collection.distinct.call_args[0]
+        self.assertEqual(field, "approved_date_bkk")
+        self.assertEqual(withdraw_query["cashout_job.stage"], "approved")
+        field, deposit_query = deposits.distinct.call_args[0]
+        self.assertEqual(field, "created_date_bkk")
+        self.assertEqual(deposit_query["status"], "replenishment_started")
+        # คำขอเบิกที่ยัง pending ไม่ถูกตรวจ: ยอดเบิกนับตาม approved_date_bkk
+        self.assertEqual(collection.distinct.call_count, 1)
+
+    def test_sum_daily_close(self):
+        totals = sum_daily_close([
+            _row("2025-12-23", "โนนิโกะ", withdraw=100.0, expense=60.0),
+            _row("2025-12-23", "คลังห้องเย็น", deposit=1000.0),
+        ])
+        self.assertEqual(totals["withdraw"], {"count": 1, "amount": 100.0})
+        self.assertEqual(totals["net_cash"], 900.0)
+        self.assertEqual(totals["withdraw_vs_expense_diff"], 40.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from daily_rollups import get_daily_totals, rebuild_rollups, record_rollup
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        col = MagicMock(name=name)
+        col.aggregate.return_value = []
+        self[name] = col
+        return col
+
+
+class TestDailyRollups(unittest.TestCase):
+    def test_record_rollup_upserts_with_inc(self):
+        collection = MagicMock()
+        record_rollup(collection, date_bkk="2025-12-24", location="โนนิโกะ", rollup_type="expense", amount="250")
+
+        query, update = collection.update_one.call_args[0]
+        self.assertEqual(query, {"created_date_bkk": "2025-12-24", "location": "โนนิโกะ", "type": "expense"})
+        self.assertEqual(update["$inc"], {"count": 1, "amount": 250.0})
+        self.assertTrue(collection.update_one.call_args[1]["upsert"])
+
+    def test_record_rollup_never_raises(self):
+        collection = MagicMock()
+        collection.update_one.side_effect = RuntimeError("mongo down")
+        record_rollup(collection, date_bkk="2025-12-24", location="โนนิโกะ", rollup_type="expense", amount=1)
+
+    def test_get_daily_totals_sums_range(self):
+        collection = MagicMock()
+        collection.find.return_value = [
+            {"type": "withdraw_approved", "count": 2, "amount": 300.0},
+            {"type": "withdraw_approved", "count": 1, "amount": 100.0},
+            {"type": "deposit_completed", "count": 1, "amount": 1000.0},
+        ]
+
+        totals = get_daily_totals(collection, start_date="2025-12-22", end_date="2025-12-28")
+
+        self.assertEqual(totals["withdraw_approved"], {"count": 3, "amount": 400.0})
+        self.assertEqual(totals["deposit_completed"], {"count": 1, "amount": 1000.0})
+        self.assertEqual(totals["expense"], {"count": 0, "amount": 0.0})
+        self.assertEqual(
+            collection.find.call_args[0][0],
+            {"created_date_bkk": {"$gte": "2025-12-22", "$lte": "2025-12-28"}},
+        )
+
+    def test_rebuild_replaces_rollups_for_range(self):
+        db = FakeDb()
+        db["withdraw_requests"].aggregate.return_value = [
+            {"_id": {"date": "2025-12-24", "location": "โนนิโกะ"}, "count": 2, "amount": 300.0}
+        ]
+
+        result = rebuild_rollups(db, start_date="2025-12-24", end_date="2025-12-24")
+
+        self.assertEqual(result, {"withdraw_approved": 1, "deposit_completed": 0, "expense": 0})
+        match = db["withdraw_requests"].aggregate.call_args[0][0][0]["$match"]
+        self.assertEqual(match["created_date_bkk"], {"$gte": "2025-12-24", "$lte": "2025-12-24"})
+        self.assertEqual(db["daily_rollups"].delete_many.call_count, 3)
+        op = db["daily_rollups"].bulk_write.call_args[0][0][0]
+        self.assertEqual(op._doc["$set"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import db
+from db import CollectionProxy, Database
+
+
+class TestLazyDatabase(unittest.TestCase):
+    def setUp(self):
+        Database._client, Database._pid = None, None
+        self.addCleanup(setattr, Database, "_client", None)
+        self.addCleanup(setattr, Database, "_pid", None)
+
+    def test_import_does_not_connect(self):
+        with patch("db.MongoClient") as mongo_client:
+            proxy = db.db["withdraw_requests"]
+            self.assertIsInstance(proxy, CollectionProxy)
+            self.assertEqual(proxy.name, "withdraw_requests")
+            mongo_client.assert_not_called()
+
+    def test_first_use_creates_one_client_per_process(self):
+        with patch("db.MongoClient", return_value=MagicMock()) as mongo_client:
+            db.requests_collection.find_one({"request_id": "R1"})
+            db.transactions_collection.insert_one({"amount": 1})
+            self.assertEqual(mongo_client.call_count, 1)
+            self.assertEqual(mongo_client.call_args.kwargs["maxPoolSize"], db.Config.MONGO_MAX_POOL_SIZE)
+
+            # pid เปลี่ยน (หลัง fork): สร้าง client ใหม่
+            with patch("db.os.getpid", return_value=-1):
+                db.requests_collection.find_one({"request_id": "R1"})
+            self.assertEqual(mongo_client.call_count, 2)
+
+    def test_reset_closes_own_client_only(self):
+        client = MagicMock()
+        with patch("db.MongoClient", return_value=client):
+            Database.get_connection()
+            Database.reset()
+            client.close.assert_called_once()
+
+            Database.get_connection()
+            client.close.reset_mock()
+            with patch("db.os.getpid", return_value=-1):
+                Database.reset()
+            client.close.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
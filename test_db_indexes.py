@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+from pymongo.errors import OperationFailure
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from db_indexes import INDEX_SPECS, ensure_indexes, report_indexes
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        col = MagicMock(name=name)
+        self[name] = col
+        return col
+
+
+class TestDbIndexes(unittest.TestCase):
+    def test_ensure_creates_every_spec_and_survives_failures(self):
+        db = FakeDb()
+        db["transactions"].create_indexes.side_effect = OperationFailure("duplicate key")
+        db["withdraw_requests"].create_indexes.side_effect = lambda models: [models[0].document["name"]]
+        db["deposit_requests"].create_indexes.side_effect = lambda models: [models[0].document["name"]]
+
+        result = ensure_indexes(db)
+
+        self.assertIn("uniq_request_id", result["withdraw_requests"])
+        self.assertIn("created_date_status_location", result["deposit_requests"])
+        self.assertEqual(result["transactions"], [])
+        self.assertEqual(db["transactions"].create_indexes.call_count, len(INDEX_SPECS["transactions"]))
+
+    def test_report_lists_missing_unused_and_unmanaged(self):
+        db = FakeDb()
+        for name in INDEX_SPECS:
+            db[name].index_information.return_value = {"_id_": {}}
+            db[name].aggregate.return_value = []
+        db["withdraw_requests"].index_information.return_value = {
+            "_id_": {},
+            "uniq_request_id": {},
+            "status_created_at_bkk_request_id": {},
+            "status_approved_date_bkk": {},
+            "old_index": {},
+        }
+        db["withdraw_requests"].aggregate.return_value = [
+            {"name": "_id_", "accesses": {"ops": 0}},
+            {"name": "uniq_request_id", "accesses": {"ops": 12}},
+            {"name": "status_created_at_bkk_request_id", "accesses": {"ops": 0}},
+            {"name": "status_approved_date_bkk", "accesses": {"ops": 3}},
+            {"name": "old_index", "accesses": {"ops": 0}},
+        ]
+
+        report = report_indexes(db)["withdraw_requests"]
+
+        self.assertEqual(report["missing"], ["created_date_status_location"])
+        self.assertEqual(report["unused"], ["old_index", "status_created_at_bkk_request_id"])
+        self.assertEqual(report["unmanaged"], ["old_index"])
+
+
+if __name__ == "__main__":
+    unittest.main()
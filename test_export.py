@@ -0,0 +1,70 @@
+import csv
+import io
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from flask import Flask
+
+from approved_requests import approved_requests_bp
+from services.export_service import UTF8_BOM, build_export_query, iter_csv
+
+
+class TestExportService(unittest.TestCase):
+    def test_build_export_query(self):
+        query, projection, sort_field = build_export_query(
+            "transactions", start_date="2025-01-01", end_date="2025-12-31", branch="โนนิโกะ"
+        )
+        self.assertEqual(query, {"selectedDate": {"$gte": "2025-01-01", "$lte": "2025-12-31"}, "selectedStorage": "โนนิโกะ"})
+        self.assertEqual(projection["_id"], 0)
+        self.assertEqual(sort_field, "selectedDate")
+
+    def test_iter_csv_streams_in_batches(self):
+        docs = ({"request_id": f"R-{i}", "amount": i} for i in range(5))
+
+        chunks = list(iter_csv(docs, ["request_id", "amount", "reason"], batch_rows=2))
+
+        # header + 2 + 2 + 1
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(chunks[0].startswith(UTF8_BOM))
+        rows = list(csv.reader(io.StringIO("".join(chunks)[1:])))
+        self.assertEqual(rows[0], ["request_id", "amount", "reason"])
+        self.assertEqual(rows[5], ["R-4", "4", ""])
+
+    def test_iter_csv_formats_cells(self):
+        docs = [{"name": "=HYPERLINK(1)", "amount": "-50", "tags": [{"label": "เบิกเงินผ่านไลน์"}]}]
+        rows = list(csv.reader(io.StringIO("".join(iter_csv(docs, ["name", "amount", "tags"]))[1:])))
+        self.assertEqual(rows[1], ["'=HYPERLINK(1)", "-50", "เบิกเงินผ่านไลน์"])
+
+
+class TestExportRoute(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.register_blueprint(approved_requests_bp)
+        self.client = self.app.test_client()
+
+    @patch("approved_requests.requests_collection")
+    def test_export_streams_csv_attachment(self, mock_requests):
+        mock_requests.find.return_value.sort.return_value.batch_size.return_value = iter(
+            [{"request_id": "R-1", "amount": "100", "location": "โนนิโกะ"}]
+        )
+
+        response = self.client.get("/money/export/withdraw_requests.csv?start=2025-01-01&end=2025-12-31")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertIn("withdraw_requests_2025-01-01_2025-12-31.csv", response.headers["Content-Disposition"])
+        body = response.get_data(as_text=True)
+        self.assertIn("R-1", body)
+
+    def test_export_rejects_unknown_dataset_and_bad_dates(self):
+        self.assertEqual(self.client.get("/money/export/users.csv").status_code, 404)
+        self.assertEqual(self.client.get("/money/export/transactions.csv?start=2025-99-01").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+# Add loadtest directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "loadtest"))
+
+from machine_sim import MachineSimulator, create_app, parse_inventory
+from scenarios import Recorder, percentile
+
+
+class TestMachineSimulator(unittest.TestCase):
+    def setUp(self):
+        self.sim = MachineSimulator(latency_ms=0, inventory={"10000": 2, "2000": 5, "100": 10}, seed=1)
+        self.client = create_app(self.sim).test_client()
+
+    def test_cashout_plan_and_request_use_inventory(self):
+        plan = self.client.post("/cashout/plan", json={"amount": 240.0}).get_json()
+        self.assertTrue(plan["success"])
+        self.assertEqual(plan["denominations"], {"10000": 2, "2000": 2, "100": 0})
+
+        done = self.client.post("/cashout/request", json={"denominations": plan["denominations"]}).get_json()
+        self.assertEqual(done["transaction_status"], "success")
+        self.assertEqual(self.sim.inventory, {"10000": 0, "2000": 3, "100": 10})
+
+        self.assertFalse(self.client.post("/cashout/plan", json={"amount": 500.0}).get_json()["success"])
+
+    def test_cashout_status_by_sale_id(self):
+        self.assertFalse(self.client.get("/cashout/status", query_string={"sale_id": "req-1"}).get_json()["found"])
+        self.client.post("/cashout/request", json={"denominations": {"10000": 1}}, headers={"X-Sale-Id": "req-1"})
+        status = self.client.get("/cashout/status", query_string={"sale_id": "req-1"}).get_json()
+        self.assertTrue(status["found"])
+        self.assertEqual(status["denominations"], {"10000": 1})
+
+    def test_deposit_session_amount_grows_until_end(self):
+        self.client.post("/replenishment/start", json={"session_id": "d-1", "seq_no": "1"})
+        first = self.client.get("/socket/latest", headers={"X-Session-Id": "d-1"}).get_json()["amount_baht"]
+        second = self.client.get("/socket/latest", headers={"X-Sale-Id": "d-1"}).get_json()["amount_baht"]
+        self.assertGreater(second, first)
+
+        ended = self.client.post("/replenishment/end", json={"session_id": "d-1"}).get_json()
+        self.assertEqual(ended["amount_baht"], second)
+        self.assertFalse(self.client.post("/replenishment/end", json={"session_id": "d-1"}).get_json()["success"])
+
+    def test_error_rate(self):
+        self.sim.error_rate = 1.0
+        response = self.client.post("/cashout/plan", json={"amount": 100.0})
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(response.get_json()["success"])
+
+    def test_parse_inventory(self):
+        self.assertEqual(parse_inventory("10000=200, 50000=100"), {"10000": 200, "50000": 100})
+
+
+class TestScenarioReport(unittest.TestCase):
+    def test_percentiles_per_step(self):
+        recorder = Recorder()
+        for ms in range(1, 101):
+            recorder.record("approve_request", ms / 1000, ok=ms != 100)
+        row = recorder.summary(elapsed=10)["approve_request"]
+
+        self.assertEqual((row["p50_ms"], row["p95_ms"], row["p99_ms"]), (50.0, 95.0, 99.0))
+        self.assertEqual((row["count"], row["errors"], row["per_second"]), (100, 1, 10.0))
+        self.assertEqual(percentile([], 99), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import log_utils
+from branch_workers import BranchWorkerPool
+from http_utils import build_correlation_headers
+from log_utils import CorrelationFilter, JsonFormatter, bind_correlation, clear_correlation, get_correlation
+
+
+class TestLogUtils(unittest.TestCase):
+    def setUp(self):
+        clear_correlation()
+
+    def _record(self, msg, *args):
+        record = logging.LogRecord("money", logging.INFO, __file__, 1, msg, args, None)
+        CorrelationFilter().filter(record)
+        return record
+
+    def test_correlation_headers_bind_ids_to_log_records(self):
+        _, meta = build_correlation_headers(sale_id="REQ-1", trace_id="t-abc")
+        entry = json.loads(JsonFormatter().format(self._record("✅ [CASHOUT] %s", "ok")))
+
+        self.assertEqual(entry["msg"], "✅ [CASHOUT] ok")
+        self.assertEqual(entry["trace_id"], "t-abc")
+        self.assertEqual(entry["sale_id"], "REQ-1")
+        self.assertEqual(entry["request_id"], meta["request_id"])
+
+    def test_worker_pool_jobs_inherit_submitter_context(self):
+        pool = BranchWorkerPool("log-test")
+        seen = []
+        done = threading.Event()
+
+        def job():
+            seen.append(dict(get_correlation()))
+            done.set()
+
+        bind_correlation(trace_id="t-job")
+        pool.submit("B1", job)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(seen[0]["trace_id"], "t-job")
+
+    def test_setup_logging_writes_json_lines_off_thread(self):
+        root = logging.getLogger()
+        saved = (list(root.handlers), root.level)
+        stream = io.StringIO()
+        try:
+            with patch.object(log_utils, "_listener", None), patch("sys.stderr", stream):
+                log_utils.setup_logging("INFO", "json")
+                bind_correlation(trace_id="t-setup")
+                logging.getLogger("money").debug("hidden %s", {"payload": 1})
+                logging.getLogger("money").info("visible")
+                log_utils.shutdown_logging()
+        finally:
+            root.handlers[:] = saved[0]
+            root.setLevel(saved[1])
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line["msg"] for line in lines], ["visible"])
+        self.assertEqual(lines[0]["trace_id"], "t-setup")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from flask import Flask
+from prometheus_client import REGISTRY
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import metrics
+from branch_client import BranchClient
+from branch_workers import BranchWorkerPool
+from circuit_breaker import CircuitOpenError
+from services.status_transition_service import transition_status
+from socket_fanout import SocketFanout
+from sse import CLOSE
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_route_latency_labelled_by_rule_and_status(self):
+        app = Flask(__name__)
+        metrics.init_app(app)
+
+        @app.route("/money/things/<thing_id>")
+        def thing(thing_id):
+            return "ok"
+
+        labels = {"method": "GET", "route": "/money/things/<thing_id>", "status": "200"}
+        before = _sample("money_http_request_duration_seconds_count", **labels)
+        client = app.test_client()
+        client.get("/money/things/1")
+        client.get("/money/things/2")
+        body = client.get("/metrics").get_data(as_text=True)
+
+        self.assertEqual(_sample("money_http_request_duration_seconds_count", **labels), before + 2)
+        self.assertIn("money_http_request_duration_seconds_bucket", body)
+        self.assertIn("money_replenishment_sessions_active", body)
+
+    def test_branch_requests_observed_per_path_and_outcome(self):
+        client = BranchClient("http://10.0.0.99:5000", name="TEST")
+        ok = {"branch": "TEST", "method": "GET", "path": "/socket/latest", "outcome": "2xx"}
+        before = _sample("money_branch_request_duration_seconds_count", **ok)
+        with patch.object(client.session, "request", return_value=Mock(status_code=200)):
+            client.get("/socket/latest")
+        self.assertEqual(_sample("money_branch_request_duration_seconds_count", **ok), before + 1)
+
+        client.breaker.before_call = Mock(side_effect=CircuitOpenError("TEST", 5))
+        with self.assertRaises(CircuitOpenError):
+            client.post("/cashout/request")
+        self.assertEqual(
+            _sample(
+                "money_branch_request_duration_seconds_count",
+                branch="TEST", method="POST", path="/cashout/request", outcome="circuit_open",
+            ),
+            1,
+        )
+
+    def test_active_replenishments_follow_socket_pollers(self):
+        before = _sample("money_replenishment_sessions_active")
+        fanout = SocketFanout(interval=60, idle_timeout=60)
+        client = Mock(base_url="http://machine")
+        client.get.return_value.json.return_value = {"success": True, "amount_baht": 0, "ts": 1}
+        q = fanout.subscribe("S-metrics", client, {})
+        fanout.subscribe("S-metrics", client, {})
+        self.assertEqual(_sample("money_replenishment_sessions_active"), before + 1)
+
+        fanout.stop("S-metrics", "completed")
+        while q.get(timeout=2) is not CLOSE:
+            pass
+        for _ in range(100):
+            if _sample("money_replenishment_sessions_active") == before:
+                break
+            time.sleep(0.01)
+        self.assertEqual(_sample("money_replenishment_sessions_active"), before)
+
+    def test_status_transitions_counted(self):
+        collection = MagicMock()
+        collection.name = "withdraw_requests"
+        collection.find_one_and_update.side_effect = [{"request_id": "R1"}, None]
+        labels = {"collection": "withdraw_requests", "to_status": "rejected"}
+        ok_before = _sample("money_status_transitions_total", result="ok", **labels)
+        conflict_before = _sample("money_status_transitions_total", result="conflict", **labels)
+
+        for _ in range(2):
+            transition_status(collection, {"request_id": "R1"}, from_status="pending", to_status="rejected", by="t")
+
+        self.assertEqual(_sample("money_status_transitions_total", result="ok", **labels), ok_before + 1)
+        self.assertEqual(_sample("money_status_transitions_total", result="conflict", **labels), conflict_before + 1)
+
+    def test_worker_pool_in_flight_gauge(self):
+        pool = BranchWorkerPool("metrics-test")
+        started, release = Mock(), threading.Event()
+
+        def job():
+            started()
+            release.wait(2)
+
+        pool.submit("B1", job)
+        labels = {"pool": "metrics-test", "branch": "B1"}
+        for _ in range(200):
+            if _sample("money_worker_pool_in_flight", **labels) == 1:
+                break
+            time.sleep(0.01)
+        self.assertEqual(_sample("money_worker_pool_in_flight", **labels), 1)
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
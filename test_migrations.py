@@ -0,0 +1,126 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from pymongo.errors import DuplicateKeyError
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import migrations
+from migrations import Migration, MigrationContext, MigrationLockedError, Throttle, discover, run_pending
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        col = MagicMock(name=name)
+        col.find.return_value = []
+        col.find_one_and_update.return_value = None
+        col.bulk_write.side_effect = lambda ops, ordered: MagicMock(modified_count=len(ops))
+        self[name] = col
+        return col
+
+
+def _docs(col, docs):
+    col.find.return_value = MagicMock()
+    col.find.return_value.sort.return_value.batch_size.return_value = docs
+
+
+def _migration(version, migrate):
+    return Migration(version, f"m{version}", SimpleNamespace(DESCRIPTION=f"m{version}", migrate=migrate))
+
+
+class TestMigrations(unittest.TestCase):
+    def test_discover_finds_backfill_as_first_migration(self):
+        found = discover()
+        self.assertEqual(found[0].version, "0001")
+        self.assertEqual(found[0].name, "backfill_created_date")
+        self.assertEqual([m.version for m in found], sorted(m.version for m in found))
+
+    def test_throttle_duty_cycle_and_rate_cap(self):
+        self.assertEqual(Throttle(duty_cycle=0.5).pause_for(500, 0.2), 0.2)
+        self.assertEqual(Throttle(duty_cycle=1.0, max_docs_per_second=1000).pause_for(500, 0.1), 0.4)
+        self.assertEqual(Throttle(duty_cycle=1.0).pause_for(500, 0.1), 0.0)
+        with self.assertRaises(ValueError):
+            Throttle(duty_cycle=0)
+
+    def test_bulk_update_batches_checkpoints_and_throttles(self):
+        db, sleep = FakeDb(), MagicMock()
+        _docs(db["withdraw_requests"], [{"_id": i, "status": "pending"} for i in range(1, 6)])
+        ctx = MigrationContext(db, "0001", batch_size=2, throttle=Throttle(duty_cycle=0.5, sleep=sleep))
+
+        stats = ctx.bulk_update(
+            "withdraw_requests", {"x": {"$exists": False}}, lambda doc: {"$set": {"x": 1}} if doc["_id"] != 3 else None
+        )
+
+        self.assertEqual(stats, {"scanned": 5, "changed": 4, "updated": 4, "batches": 3})
+        self.assertEqual([len(c[0][0]) for c in db["withdraw_requests"].bulk_write.call_args_list], [2, 1, 1])
+        saved = [c[0][1]["$set"]["checkpoints.withdraw_requests"] for c in db["migrations"].update_one.call_args_list]
+        self.assertEqual(saved, [2, 4, 5])
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_bulk_update_resumes_after_checkpoint(self):
+        db = FakeDb()
+        _docs(db["withdraw_requests"], [])
+        ctx = MigrationContext(db, "0001", checkpoints={"withdraw_requests": 41}, throttle=Throttle())
+        ctx.bulk_update("withdraw_requests", {"x": 1}, lambda doc: None)
+        self.assertEqual(db["withdraw_requests"].find.call_args[0][0], {"$and": [{"x": 1}, {"_id": {"$gt": 41}}]})
+
+    def test_run_pending_skips_applied_and_records_state(self):
+        db = FakeDb()
+        db["migrations"].find.return_value = [{"_id": "0001", "status": "applied"}]
+        first, second = MagicMock(), MagicMock()
+
+        results = run_pending(db, migrations=[_migration("0001", first), _migration("0002", second)])
+
+        first.assert_not_called()
+        second.assert_called_once()
+        self.assertEqual([r["version"] for r in results], ["0002"])
+        claim = db["migrations"].find_one_and_update.call_args
+        self.assertEqual(claim[0][0], {"_id": "0002", "status": {"$nin": ["applied", "running"]}})
+        self.assertEqual(db["migrations"].update_one.call_args[0][1]["$set"]["status"], "applied")
+
+    def test_running_migration_is_locked(self):
+        db = FakeDb()
+        db["migrations"].find_one_and_update.side_effect = DuplicateKeyError("dup")
+        with self.assertRaises(MigrationLockedError):
+            run_pending(db, migrations=[_migration("0002", MagicMock())])
+
+    def test_failed_migration_recorded_and_stops_run(self):
+        db = FakeDb()
+        later = MagicMock()
+        with self.assertRaises(RuntimeError):
+            run_pending(db, migrations=[_migration("0002", MagicMock(side_effect=RuntimeError("boom"))), _migration("0003", later)])
+        later.assert_not_called()
+        self.assertEqual(db["migrations"].update_one.call_args[0][1], {"$set": {"status": "failed", "error": "boom"}})
+
+    def test_dry_run_writes_nothing(self):
+        db = FakeDb()
+        _docs(db["withdraw_requests"], [{"_id": 1}])
+        migration = _migration("0002", lambda ctx: ctx.bulk_update("withdraw_requests", {}, lambda doc: {"$set": {"x": 1}}))
+
+        result = migrations.run_migration(db, migration, dry_run=True, throttle=Throttle())
+
+        self.assertEqual(result["stats"]["withdraw_requests"]["changed"], 1)
+        db["withdraw_requests"].bulk_write.assert_not_called()
+        db["migrations"].find_one_and_update.assert_not_called()
+        db["migrations"].update_one.assert_not_called()
+
+    def test_approved_date_backfill_uses_last_approval(self):
+        backfill = next(m for m in discover() if m.version == "0002").module
+        doc = {
+            "created_date_bkk": "2025-12-23",
+            "status_history": [
+                {"status": "pending", "date_bkk": "2025-12-23"},
+                {"status": "awaiting_machine", "date_bkk": "2025-12-23"},
+                {"status": "approved", "date_bkk": "2025-12-24"},
+            ],
+        }
+        self.assertEqual(backfill.build_update(doc), {"$set": {"approved_date_bkk": "2025-12-24"}})
+        self.assertEqual(backfill.approved_date({"created_date_bkk": "2025-12-23"}), "2025-12-23")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import unittest
+from unittest.mock import Mock
+
+from flask import Flask, render_template_string
+from prometheus_client import REGISTRY
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import metrics
+from metrics import MongoPoolMetrics
+from mongo_monitoring import CommandMetrics, command_filter, filter_shape
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _command_events(command_name, command, duration_ms, request_id=1):
+    started = Mock(command_name=command_name, command=command, connection_id=("db", 27017), request_id=request_id)
+    finished = Mock(
+        command_name=command_name, connection_id=("db", 27017), request_id=request_id, duration_micros=int(duration_ms * 1000)
+    )
+    return started, finished
+
+
+class TestMongoMonitoring(unittest.TestCase):
+    def test_filter_shape_hides_values(self):
+        query = {
+            "status": "pending",
+            "amount": {"$gte": 100},
+            "branch_id": {"$in": ["B1", "B2"]},
+            "$or": [{"user_id": "U1"}, {"sale_id": "S1"}],
+        }
+        self.assertEqual(
+            filter_shape(query),
+            {"status": "?", "amount": {"$gte": "?"}, "branch_id": {"$in": "?"}, "$or": [{"user_id": "?"}, {"sale_id": "?"}]},
+        )
+        update = {"update": "withdraw_requests", "updates": [{"q": {"request_id": "R1"}, "u": {"$set": {}}}]}
+        self.assertEqual(command_filter("update", update), {"request_id": "R1"})
+
+    def test_change_stream_get_more_not_observed(self):
+        listener = CommandMetrics(slow_ms=100)
+        command = {"getMore": 123456789, "collection": "withdraw_requests", "maxTimeMS": 1000}
+        started, succeeded = _command_events("getMore", command, 1000)
+
+        with self.assertNoLogs("mongo_monitoring", level="WARNING"):
+            listener.started(started)
+            listener.succeeded(succeeded)
+
+        self.assertEqual(listener._started, {})
+        self.assertEqual(
+            _sample("money_mongo_command_duration_seconds_count", collection="withdraw_requests", command="getMore", outcome="ok"),
+            0,
+        )
+
+    def test_get_more_observed_per_collection_but_not_logged_as_slow(self):
+        listener = CommandMetrics(slow_ms=100)
+        labels = {"collection": "transactions", "command": "getMore", "outcome": "ok"}
+        before = _sample("money_mongo_command_duration_seconds_count", **labels)
+        started, succeeded = _command_events("getMore", {"getMore": 42, "collection": "transactions"}, 250)
+
+        with self.assertNoLogs("mongo_monitoring", level="WARNING"):
+            listener.started(started)
+            listener.succeeded(succeeded)
+
+        self.assertEqual(_sample("money_mongo_command_duration_seconds_count", **labels), before + 1)
+
+    def test_command_duration_observed_per_collection(self):
+        listener = CommandMetrics(slow_ms=100)
+        labels = {"collection": "withdraw_requests", "command": "find", "outcome": "ok"}
+        before = _sample("money_mongo_command_duration_seconds_count", **labels)
+
+        started, succeeded = _command_events("find", {"find": "withdraw_requests", "filter": {"status": "pending"}}, 5)
+        listener.started(started)
+        listener.succeeded(succeeded)
+
+        self.assertEqual(_sample("money_mongo_command_duration_seconds_count", **labels), before + 1)
+        self.assertEqual(listener._started, {})
+
+    def test_slow_command_logged_with_filter_shape(self):
+        listener = CommandMetrics(slow_ms=100)
+        command = {"find": "deposit_requests", "filter": {"status": "replenishment_started", "amount": 5000}}
+        started, failed = _command_events("find", command, 250, request_id=2)
+
+        with self.assertLogs("mongo_monitoring", level="WARNING") as logs:
+            listener.started(started)
+            listener.failed(failed)
+
+        self.assertIn("deposit_requests.find", logs.output[0])
+        self.assertIn("{'status': '?', 'amount': '?'}", logs.output[0])
+        self.assertNotIn("5000", logs.output[0])
+
+    def test_internal_commands_ignored(self):
+        listener = CommandMetrics()
+        started, succeeded = _command_events("hello", {"hello": 1}, 1, request_id=3)
+        listener.started(started)
+        listener.succeeded(succeeded)
+        self.assertEqual(listener._started, {})
+
+    def test_pool_checkout_wait_recorded(self):
+        before_ok = _sample("money_mongo_pool_checkout_seconds_count", outcome="ok")
+        before_timeout = _sample("money_mongo_pool_checkout_seconds_count", outcome="timeout")
+        listener = MongoPoolMetrics()
+
+        listener.connection_checked_out(Mock(duration=0.002))
+        listener.connection_checked_in(Mock())
+        listener.connection_check_out_failed(Mock(duration=30.0, reason="timeout"))
+
+        self.assertEqual(_sample("money_mongo_pool_checkout_seconds_count", outcome="ok"), before_ok + 1)
+        self.assertEqual(_sample("money_mongo_pool_checkout_seconds_count", outcome="timeout"), before_timeout + 1)
+
+    def test_template_render_timed(self):
+        app = Flask(__name__)
+        metrics.init_app(app)
+
+        @app.route("/page")
+        def page():
+            return render_template_string("<p>{{ n }}</p>", n=1)
+
+        before = _sample("money_template_render_seconds_count", template="-")
+        app.test_client().get("/page")
+        self.assertEqual(_sample("money_template_render_seconds_count", template="-"), before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
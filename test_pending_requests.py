@@ -0,0 +1,110 @@
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from flask import Flask
+
+import approved_requests
+from approved_requests import PENDING_PROJECTION, approved_requests_bp
+from sse import CLOSE, StreamSlots
+
+
+class TestPendingRequests(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), "app", "templates"))
+        self.app.register_blueprint(approved_requests_bp)
+        self.client = self.app.test_client()
+
+        patcher = patch("approved_requests.requests_collection")
+        self.collection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.collection.aggregate.side_effect = lambda pipeline: iter(
+            [{"count": 1, "max_created": "2025-12-24T03:00:00+00:00", "max_updated": None}]
+        )
+        self.collection.find.return_value.sort.return_value = [
+            {"request_id": "R-1", "location": "โนนิโกะ", "amount": "100", "reason": "ซื้อน้ำแข็ง", "status": "pending"}
+        ]
+
+    def test_json_list_uses_projection_and_etag(self):
+        response = self.client.get("/money/api/pending-requests")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["data"][0]["request_id"], "R-1")
+        self.assertEqual(self.collection.find.call_args[0], ({"status": "pending"}, PENDING_PROJECTION))
+        self.assertNotIn("status_history", PENDING_PROJECTION)
+        self.assertTrue(response.headers["ETag"])
+
+    def test_unchanged_list_returns_304_without_reading_documents(self):
+        etag = self.client.get("/money/api/pending-requests").headers["ETag"]
+        self.collection.find.reset_mock()
+
+        response = self.client.get("/money/api/pending-requests", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.collection.find.assert_not_called()
+
+    def test_page_etag_changes_when_list_changes(self):
+        first = self.client.get("/money/approved-requests")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("R-1", first.get_data(as_text=True))
+
+        self.collection.aggregate.side_effect = lambda pipeline: iter(
+            [{"count": 2, "max_created": "2025-12-24T04:00:00+00:00", "max_updated": None}]
+        )
+        second = self.client.get("/money/approved-requests", headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second.headers["ETag"], first.headers["ETag"])
+
+    def test_page_etag_changes_on_deploy(self):
+        self.addCleanup(approved_requests._html_version.cache_clear)
+        approved_requests._html_version.cache_clear()
+        first = self.client.get("/money/approved-requests").headers["ETag"]
+
+        with patch.object(approved_requests.Config, "APP_VERSION", "v2"):
+            approved_requests._html_version.cache_clear()
+            response = self.client.get("/money/approved-requests", headers={"If-None-Match": first})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], first)
+
+    def test_reject_already_handled_request_returns_409(self):
+        self.collection.find_one_and_update.return_value = None
+        self.collection.find_one.return_value = {"status": "awaiting_machine"}
+
+        response = self.client.post("/money/reject/R-1")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["request_status"], "awaiting_machine")
+
+        self.collection.find_one.return_value = None
+        self.assertEqual(self.client.post("/money/reject/R-404").status_code, 404)
+
+    def test_pending_stream_over_worker_limit_returns_503(self):
+        watcher = Mock()
+        watcher.subscribe.return_value.get.return_value = CLOSE
+        with patch.object(approved_requests, "sse_slots", StreamSlots(1)) as slots, patch.object(
+            approved_requests, "pending_watcher", watcher
+        ):
+            first = self.client.get("/money/api/pending-stream", buffered=False)
+            self.assertEqual(first.status_code, 200)
+
+            busy = self.client.get("/money/api/pending-stream")
+            self.assertEqual(busy.status_code, 503)
+            self.assertEqual(busy.headers["Retry-After"], "5")
+            self.assertEqual(watcher.subscribe.call_count, 1)
+
+            # ปิด stream แรกแล้วคืนที่ให้ stream ถัดไป
+            first.close()
+            self.assertEqual(slots.active, 0)
+            second = self.client.get("/money/api/pending-stream")
+            self.assertEqual(second.status_code, 200)
+            second.close()
+            self.assertEqual(slots.active, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, Mock
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from pending_watcher import CHANGE_STREAM_NOT_SUPPORTED, PendingWatcher
+
+
+def _payload(message):
+    lines = message.strip().split("\n")
+    return lines[0], json.loads(lines[1][len("data: "):])
+
+
+class TestPendingWatcher(unittest.TestCase):
+    def test_change_stream_pushes_inserts_and_status_changes(self):
+        changes = iter([
+            {"operationType": "insert", "fullDocument": {"request_id": "R1", "status": "pending", "amount": 100}},
+            None,
+            {"operationType": "update", "fullDocument": {"request_id": "R1", "status": "approved"}},
+        ])
+        stream = MagicMock(alive=True, resume_token={"_data": "t"})
+        stream.__enter__.return_value = stream
+        stream.try_next.side_effect = lambda: next(changes, None)
+        collection = Mock()
+        collection.watch.return_value = stream
+
+        watcher = PendingWatcher(collection, fingerprint=Mock(), idle_timeout=0)
+        q = watcher.subscribe()
+        first = _payload(q.get(timeout=2))
+        second = _payload(q.get(timeout=2))
+        watcher.unsubscribe(q)
+
+        self.assertEqual(first[0], "event: pending")
+        self.assertEqual(first[1]["type"], "insert")
+        self.assertEqual(first[1]["request_id"], "R1")
+        self.assertEqual((second[1]["type"], second[1]["status"]), ("status", "approved"))
+        self.assertEqual(watcher.mode, "change_stream")
+        self.assertEqual(collection.watch.call_args.kwargs["full_document"], "updateLookup")
+
+    def test_falls_back_to_polling_without_replica_set(self):
+        collection = Mock()
+        collection.watch.side_effect = OperationFailure(
+            "The $changeStream stage is only supported on replica sets", code=CHANGE_STREAM_NOT_SUPPORTED
+        )
+        fingerprints = iter(["a", "a", "b"])
+        fingerprint = Mock(side_effect=lambda: next(fingerprints, "b"))
+
+        watcher = PendingWatcher(collection, fingerprint=fingerprint, poll_interval=0.01, idle_timeout=0)
+        q = watcher.subscribe()
+        event, data = _payload(q.get(timeout=2))
+        watcher.unsubscribe(q)
+
+        self.assertEqual(event, "event: pending")
+        self.assertEqual(data, {"type": "changed"})
+        self.assertEqual(watcher.mode, "polling")
+        # ไม่แจ้งซ้ำเมื่อ fingerprint ไม่เปลี่ยน
+        self.assertTrue(q.empty())
+
+    def test_transient_error_resumes_change_stream_from_token(self):
+        def stream_of(changes):
+            stream = MagicMock(alive=True)
+            stream.__enter__.return_value = stream
+
+            def try_next():
+                item = next(changes, None)
+                if isinstance(item, Exception):
+                    raise item
+                if item is not None:
+                    stream.resume_token = {"_data": item["fullDocument"]["request_id"]}
+                return item
+
+            stream.try_next.side_effect = try_next
+            return stream
+
+        first = stream_of(iter([
+            {"operationType": "insert", "fullDocument": {"request_id": "R1", "status": "pending"}},
+            AutoReconnect("primary stepped down"),
+        ]))
+        second = stream_of(iter([
+            {"operationType": "insert", "fullDocument": {"request_id": "R2", "status": "pending"}},
+        ]))
+        collection = Mock()
+        collection.watch.side_effect = [first, second]
+        fingerprint = Mock()
+
+        watcher = PendingWatcher(collection, fingerprint=fingerprint, idle_timeout=0, retry_backoff=0.01)
+        q = watcher.subscribe()
+        received = [_payload(q.get(timeout=2))[1]["request_id"] for _ in range(2)]
+        watcher.unsubscribe(q)
+
+        self.assertEqual(received, ["R1", "R2"])
+        self.assertEqual(collection.watch.call_args_list[1].kwargs["resume_after"], {"_data": "R1"})
+        self.assertEqual(watcher.mode, "change_stream")
+        fingerprint.assert_not_called()
+
+    def test_other_operation_failures_do_not_switch_to_polling(self):
+        stream = MagicMock(alive=True, resume_token=None)
+        stream.__enter__.return_value = stream
+        stream.try_next.return_value = {"operationType": "insert", "fullDocument": {"request_id": "R1"}}
+        collection = Mock()
+        collection.watch.side_effect = [OperationFailure("interrupted", code=11601), stream]
+        fingerprint = Mock()
+
+        watcher = PendingWatcher(collection, fingerprint=fingerprint, idle_timeout=0, retry_backoff=0.01)
+        q = watcher.subscribe()
+        _, data = _payload(q.get(timeout=2))
+        watcher.unsubscribe(q)
+
+        self.assertEqual(data["request_id"], "R1")
+        self.assertEqual(collection.watch.call_count, 2)
+        fingerprint.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from flask import Flask
+
+from approved_requests import approved_requests_bp
+from db_indexes import INDEX_SPECS
+from services.request_status_service import (
+    SECTIONS,
+    apply_keyset,
+    build_status_query,
+    decode_cursor,
+    encode_cursor,
+    fetch_page,
+    page_sort,
+    resolve_date_range,
+)
+
+
+def _collection_returning(docs):
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value = docs
+    return collection
+
+
+class TestRequestStatusQueries(unittest.TestCase):
+    def test_resolve_date_range(self):
+        self.assertEqual(resolve_date_range("2025-12-24", "day"), ("2025-12-24", "2025-12-24"))
+        # 2025-12-24 เป็นวันพุธ: สัปดาห์ จ. 22 - อา. 28
+        self.assertEqual(resolve_date_range("2025-12-24", "week"), ("2025-12-22", "2025-12-28"))
+        self.assertEqual(resolve_date_range("2024-02-10", "month"), ("2024-02-01", "2024-02-29"))
+        with self.assertRaises(ValueError):
+            resolve_date_range("not-a-date", "day")
+
+    def test_build_status_query(self):
+        self.assertEqual(
+            build_status_query(start_date="2025-12-24", end_date="2025-12-24", statuses=["approved"], branch="all"),
+            {"status": "approved", "created_at_bkk": {"$gte": "2025-12-24", "$lt": "2025-12-25"}},
+        )
+        self.assertEqual(
+            build_status_query(
+                start_date="2025-12-01", end_date="2025-12-31", statuses=["approved", "rejected"], branch="โนนิโกะ"
+            ),
+            {
+                "status": {"$in": ["approved", "rejected"]},
+                "created_at_bkk": {"$gte": "2025-12-01", "$lt": "2026-01-01"},
+                "location": "โนนิโกะ",
+            },
+        )
+
+    def test_section_queries_follow_an_esr_index(self):
+        # ไม่มี MongoDB จริงให้ explain(): ตรวจว่ามี index ที่ขึ้นต้นด้วย equality → sort (ทิศเดียวกันหรือกลับทั้งหมด)
+        # และ range อยู่บน field ที่เรียงแล้ว = planner ใช้ IXSCAN แบบมีขอบเขตโดยไม่มี SORT stage
+        for section, (kind, statuses, id_field) in SECTIONS.items():
+            collection = "withdraw_requests" if kind == "withdraw" else "deposit_requests"
+            for branch, start, end in (("all", "2025-12-24", "2025-12-24"), ("โนนิโกะ", "2025-12-01", "2025-12-31")):
+                query = build_status_query(start_date=start, end_date=end, statuses=statuses, branch=branch)
+                sort = page_sort(id_field)
+                equality = [f for f, v in query.items() if not isinstance(v, dict) and f != "location"]
+                ranges = [f for f, v in query.items() if isinstance(v, dict)]
+                with self.subTest(section=section, branch=branch):
+                    serving = [
+                        m.document["name"] for m in INDEX_SPECS[collection]
+                        if list(m.document["key"])[: len(equality)] == equality
+                        and list(m.document["key"].items())[len(equality): len(equality) + len(sort)]
+                        in (sort, [(f, -d) for f, d in sort])
+                    ]
+                    self.assertTrue(serving, f"no index for {equality} + sort {sort}")
+                    self.assertTrue(set(ranges) <= {f for f, _ in sort})
+
+    def test_cursor_roundtrip_and_keyset(self):
+        cursor = encode_cursor("2025-12-24T10:00:00+07:00", "R-1")
+        self.assertEqual(decode_cursor(cursor), ("2025-12-24T10:00:00+07:00", "R-1"))
+        with self.assertRaises(ValueError):
+            decode_cursor("garbage")
+
+        query = apply_keyset({"status": "approved"}, cursor, "request_id")
+        self.assertEqual(query["$and"][0], {"status": "approved"})
+        self.assertEqual(
+            query["$and"][1]["$or"][1],
+            {"created_at_bkk": "2025-12-24T10:00:00+07:00", "request_id": {"$lt": "R-1"}},
+        )
+
+    def test_fetch_page_returns_next_cursor_only_when_more_rows(self):
+        docs = [{"request_id": f"R-{i}", "created_at_bkk": f"2025-12-24T10:0{i}:00+07:00"} for i in (3, 2, 1)]
+
+        collection = _collection_returning(docs)
+        items, next_cursor = fetch_page(collection, {"status": "approved"}, id_field="request_id", limit=2)
+        self.assertEqual([d["request_id"] for d in items], ["R-3", "R-2"])
+        self.assertEqual(decode_cursor(next_cursor), ("2025-12-24T10:02:00+07:00", "R-2"))
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+
+        items, next_cursor = fetch_page(_collection_returning(docs[:2]), {}, id_field="request_id", limit=2)
+        self.assertEqual(len(items), 2)
+        self.assertIsNone(next_cursor)
+
+
+class TestRequestStatusApi(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.register_blueprint(approved_requests_bp)
+        self.client = self.app.test_client()
+
+    @patch("approved_requests.deposit_requests_collection")
+    def test_api_returns_page_with_display_fields(self, mock_deposits):
+        mock_deposits.find.return_value.sort.return_value.limit.return_value = [
+            {"deposit_request_id": "D-1", "created_at_bkk": "2025-12-24T09:05:00+07:00"}
+        ]
+
+        response = self.client.get("/money/api/request-status?section=deposit&date=2025-12-24&range=week")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["range"], {"name": "week", "start": "2025-12-22", "end": "2025-12-28"})
+        self.assertEqual(body["data"][0]["created_at_bkk_display"], "2025-12-24 09:05")
+        self.assertIsNone(body["next_cursor"])
+        query = mock_deposits.find.call_args[0][0]
+        self.assertEqual(query["status"], "completed")
+
+    def test_api_rejects_bad_params(self):
+        self.assertEqual(self.client.get("/money/api/request-status?section=nope").status_code, 400)
+        self.assertEqual(self.client.get("/money/api/request-status?date=2025-13-40").status_code, 400)
+        self.assertEqual(self.client.get("/money/api/request-status?cursor=garbage").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
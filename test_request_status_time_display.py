@@ -5,8 +5,8 @@ import unittest
 # Add app directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
 
-from time_utils import format_bkk_datetime_display
-from services.request_status_service import enrich_request_status_records
+from time_utils import _format_bkk_display_cached, format_bkk_datetime_display
+from services.request_status_service import enrich_request_status_records, iter_display_records
 
 
 class TestTimeDisplayUtils(unittest.TestCase):
@@ -30,6 +30,13 @@ class TestTimeDisplayUtils(unittest.TestCase):
         self.assertEqual(format_bkk_datetime_display(None), "")
         self.assertEqual(format_bkk_datetime_display(""), "")
 
+    def test_format_bkk_datetime_display_memoized_per_minute(self):
+        _format_bkk_display_cached.cache_clear()
+        self.assertEqual(format_bkk_datetime_display("2024-01-15T10:30:05.123+07:00"), "2024-01-15 10:30")
+        self.assertEqual(format_bkk_datetime_display("2024-01-15T10:30:59+07:00"), "2024-01-15 10:30")
+        info = _format_bkk_display_cached.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
 
 class TestRequestStatusService(unittest.TestCase):
     def test_enrich_request_status_records_adds_display_fields(self):
@@ -51,6 +58,18 @@ class TestRequestStatusService(unittest.TestCase):
         self.assertNotIn("created_at_bkk_display", approved[0])
         self.assertNotIn("created_at_bkk_display", deposit_requests[0])
 
+    def test_iter_display_records_is_lazy_and_shallow(self):
+        history = [{"status": "approved"}]
+        records = iter([{"request_id": "r1", "created_at_bkk": "2024-01-15T10:30:00+07:00", "status_history": history}])
+
+        out = iter_display_records(records)
+        first = next(out)
+
+        self.assertEqual(first["created_at_bkk_display"], "2024-01-15 10:30")
+        # nested fields are shared, not deep-copied
+        self.assertIs(first["status_history"], history)
+        self.assertEqual(list(out), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+import handlers
+from session_store import MemorySessionStore, MongoSessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemorySessionStore(unittest.TestCase):
+    def test_update_merges_and_get_returns_copy(self):
+        store = MemorySessionStore(ttl=60)
+        store.set("U1", {"state": "choosing_action", "amount": None})
+        store.update("U1", amount="100", state="choosing_reason")
+
+        session = store.get("U1")
+        self.assertEqual(session, {"state": "choosing_reason", "amount": "100"})
+        session["state"] = "mutated"
+        self.assertEqual(store.get("U1")["state"], "choosing_reason")
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        store = MemorySessionStore(ttl=10, clock=clock)
+        store.set("U1", {"state": "waiting_for_amount"})
+        clock.now = 9
+        self.assertIsNotNone(store.get("U1"))
+        clock.now = 20
+        self.assertIsNone(store.get("U1"))
+        self.assertEqual(len(store), 0)
+
+    def test_evicts_least_recently_used(self):
+        store = MemorySessionStore(ttl=60, max_entries=2)
+        store.set("U1", {"state": "a"})
+        store.set("U2", {"state": "b"})
+        store.get("U1")
+        store.set("U3", {"state": "c"})
+
+        self.assertIsNone(store.get("U2"))
+        self.assertEqual(store.get("U1"), {"state": "a"})
+        self.assertEqual(len(store), 2)
+
+
+class TestMongoSessionStore(unittest.TestCase):
+    def test_update_sets_only_changed_fields_and_refreshes_expiry(self):
+        collection = Mock()
+        collection.update_one.return_value.matched_count = 1
+        MongoSessionStore(collection, ttl=60).update("U1", state="waiting_for_location", reason="fuel")
+
+        query, update = collection.update_one.call_args[0]
+        self.assertEqual(query["_id"], "U1")
+        self.assertIn("$gt", query["expires_at"])
+        self.assertEqual(update["$set"]["session.state"], "waiting_for_location")
+        self.assertEqual(update["$set"]["session.reason"], "fuel")
+        self.assertIn("expires_at", update["$set"])
+        collection.replace_one.assert_not_called()
+
+    def test_update_of_expired_session_starts_fresh_state(self):
+        collection = Mock()
+        collection.update_one.return_value.matched_count = 0
+        MongoSessionStore(collection, ttl=60).update("U1", state="waiting_for_amount")
+
+        query, doc = collection.replace_one.call_args[0]
+        self.assertEqual(query, {"_id": "U1"})
+        self.assertEqual(doc["session"], {"state": "waiting_for_amount"})
+        self.assertIn("expires_at", doc)
+        self.assertTrue(collection.replace_one.call_args.kwargs["upsert"])
+
+    def test_get_ignores_expired_sessions(self):
+        collection = Mock()
+        collection.find_one.return_value = None
+        self.assertIsNone(MongoSessionStore(collection, ttl=60).get("U1"))
+        self.assertIn("$gt", collection.find_one.call_args[0][0]["expires_at"])
+
+
+class TestHandlersUseSessionStore(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("handlers.session_store", MemorySessionStore(ttl=60))
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _text_event(self, text):
+        return Mock(source=Mock(user_id="U1"), message=Mock(text=text), reply_token="token")
+
+    def test_text_flow_moves_through_states(self):
+        handlers.reset_state("U1")
+        handlers.update_state("U1", state="waiting_for_amount")
+
+        handlers.handle_text_input(self._text_event("250"), Mock())
+
+        session = self.store.get("U1")
+        self.assertEqual(session["amount"], "250")
+        self.assertEqual(session["state"], "choosing_reason")
+
+    def test_postback_starts_new_session(self):
+        event = Mock(postback=Mock(data="select_reason|fuel|U2"), reply_token="token")
+        handlers.handle_postback(event, Mock())
+
+        session = self.store.get("U2")
+        self.assertEqual(session["reason"], "fuel")
+        self.assertEqual(session["state"], "waiting_for_license_plate")
+
+
+if __name__ == "__main__":
+    unittest.main()
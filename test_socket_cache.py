@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from socket_cache import SingleFlightCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSingleFlightCache(unittest.TestCase):
+    def test_hit_within_ttl_and_miss_after_expiry(self):
+        clock = FakeClock()
+        cache = SingleFlightCache(1.0, clock=clock)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"amount_baht": len(calls)}
+
+        self.assertEqual(cache.get(("http://m", "S1"), loader), {"amount_baht": 1})
+        clock.now = 0.5
+        self.assertEqual(cache.get(("http://m", "S1"), loader), {"amount_baht": 1})
+        clock.now = 1.5
+        self.assertEqual(cache.get(("http://m", "S1"), loader), {"amount_baht": 2})
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_concurrent_misses_collapse_into_one_read(self):
+        cache = SingleFlightCache(1.0)
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(2)
+            return {"amount_baht": 100}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("k", loader)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        # รอให้ทุก thread เข้าคิวรอ flight เดียวกันก่อนปล่อย upstream
+        deadline = time.monotonic() + 2
+        while cache.stats()["collapsed"] + cache.stats()["misses"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join(2)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"amount_baht": 100}] * 5)
+        self.assertEqual(cache.stats()["collapsed"], 4)
+
+    def test_errors_are_not_cached(self):
+        cache = SingleFlightCache(1.0)
+
+        def failing():
+            raise ValueError("machine down")
+
+        with self.assertRaises(ValueError):
+            cache.get("k", failing)
+        self.assertEqual(cache.get("k", lambda: "ok"), "ok")
+        self.assertEqual(cache.stats()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+import time
+import unittest
+from unittest.mock import Mock
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from socket_fanout import SocketFanout
+from sse import CLOSE, Broadcaster, StreamSlots, iter_sse, sse_message
+
+
+class TestSSE(unittest.TestCase):
+    def test_sse_message_format(self):
+        message = sse_message({"amount_baht": 100}, event="amount")
+        self.assertEqual(message, 'event: amount\ndata: {"amount_baht": 100}\n\n')
+
+    def test_broadcaster_fans_out_and_closes(self):
+        broadcaster = Broadcaster()
+        q1 = broadcaster.subscribe()
+        q2 = broadcaster.subscribe()
+        broadcaster.publish("data: 1\n\n")
+        broadcaster.close()
+
+        self.assertEqual(list(iter_sse(q1, heartbeat=0.1)), ["data: 1\n\n"])
+        self.assertEqual(list(iter_sse(q2, heartbeat=0.1)), ["data: 1\n\n"])
+
+    def test_slow_subscriber_drops_oldest(self):
+        broadcaster = Broadcaster(max_queue=2)
+        q = broadcaster.subscribe()
+        for i in range(3):
+            broadcaster.publish(f"data: {i}\n\n")
+        self.assertEqual([q.get_nowait(), q.get_nowait()], ["data: 1\n\n", "data: 2\n\n"])
+
+    def test_stream_slots_limit_and_release(self):
+        slots = StreamSlots(2)
+        self.assertTrue(slots.try_acquire())
+        self.assertTrue(slots.try_acquire())
+        self.assertFalse(slots.try_acquire())
+        self.assertEqual(slots.active, 2)
+
+        slots.release()
+        self.assertTrue(slots.try_acquire())
+
+        unlimited = StreamSlots(0)
+        self.assertTrue(all(unlimited.try_acquire() for _ in range(50)))
+
+
+class TestSocketFanout(unittest.TestCase):
+    def _client(self, amounts):
+        client = Mock(base_url="http://machine")
+        responses = []
+        for amount in amounts:
+            resp = Mock()
+            resp.json.return_value = {"success": True, "amount_baht": amount, "ts": 1}
+            responses.append(resp)
+        client.get.side_effect = responses + [responses[-1]] * 100
+        return client
+
+    def test_one_poll_shared_by_all_subscribers(self):
+        fanout = SocketFanout(interval=60, idle_timeout=60)
+        client = self._client([100])
+        q1 = fanout.subscribe("S1", client, {})
+        q2 = fanout.subscribe("S1", client, {})
+
+        first = q1.get(timeout=2)
+        self.assertEqual(json.loads(first.split("data: ")[1])["amount_baht"], 100)
+        self.assertTrue(fanout.stop("S1", "completed"))
+
+        # q2 อาจ subscribe ก่อนหรือหลังรอบแรก: ได้ยอดล่าสุดเสมอ
+        self.assertIn(first, list(iter_sse(q2, heartbeat=0.1)))
+        self.assertEqual(client.get.call_count, 1)
+
+    def test_unchanged_amount_is_not_republished(self):
+        fanout = SocketFanout(interval=60, idle_timeout=60)
+        client = self._client([100])
+        q = fanout.subscribe("S2", client, {})
+        q.get(timeout=2)
+
+        poller = fanout._pollers["S2"]
+        poller.poll_once()
+        self.assertTrue(q.empty())
+        fanout.stop("S2", "cancelled")
+
+    def test_stop_sends_end_event(self):
+        fanout = SocketFanout(interval=60, idle_timeout=60)
+        q = fanout.subscribe("S3", self._client([0]), {})
+        q.get(timeout=2)
+        fanout.stop("S3", "cancelled")
+
+        messages = []
+        while True:
+            message = q.get(timeout=2)
+            if message is CLOSE:
+                break
+            messages.append(message)
+        self.assertEqual(messages, [sse_message({"reason": "cancelled"}, event="end")])
+        self.assertFalse(fanout.stop("unknown", "cancelled"))
+
+    def test_session_ended_in_another_worker_stops_poller(self):
+        # replenishment-end ถูกเรียกที่ worker อื่น: เห็นได้จากสถานะที่ใช้ร่วมกันเท่านั้น
+        statuses = iter([None, "completed"])
+        session_ended = Mock(side_effect=lambda key: next(statuses, "completed"))
+        fanout = SocketFanout(interval=0.01, idle_timeout=60, session_ended=session_ended, end_check_interval=0)
+        q = fanout.subscribe("S4", self._client([100, 150]), {})
+
+        messages = []
+        while True:
+            message = q.get(timeout=2)
+            if message is CLOSE:
+                break
+            messages.append(message)
+
+        self.assertEqual(messages[-1], sse_message({"reason": "completed"}, event="end"))
+        session_ended.assert_called_with("S4")
+        for _ in range(100):
+            if "S4" not in fanout._pollers:
+                break
+            time.sleep(0.01)
+        self.assertNotIn("S4", fanout._pollers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from linebot import WebhookHandler
+from linebot.exceptions import InvalidSignatureError
+from linebot.models import PostbackEvent
+from pymongo.errors import DuplicateKeyError
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "app"))
+
+from webhook_queue import MongoSeenSet, SeenSet, WebhookQueue
+
+SECRET = "test-channel-secret"
+
+
+def _body(*event_ids):
+    return json.dumps({
+        "destination": "Ubot",
+        "events": [
+            {
+                "type": "postback",
+                "webhookEventId": event_id,
+                "deliveryContext": {"isRedelivery": False},
+                "timestamp": 1700000000000,
+                "mode": "active",
+                "replyToken": "token",
+                "source": {"type": "user", "userId": "U1"},
+                "postback": {"data": "select_amount|40|U1"},
+            }
+            for event_id in event_ids
+        ],
+    })
+
+
+def _sign(body):
+    return base64.b64encode(hmac.new(SECRET.encode(), body.encode(), hashlib.sha256).digest()).decode()
+
+
+class TestSeenSet(unittest.TestCase):
+    def test_duplicates_until_expired(self):
+        now = [0.0]
+        seen = SeenSet(ttl=10, clock=lambda: now[0])
+        self.assertTrue(seen.add("E1"))
+        self.assertFalse(seen.add("E1"))
+        now[0] = 11
+        self.assertTrue(seen.add("E1"))
+
+    def test_bounded(self):
+        seen = SeenSet(ttl=60, max_entries=2)
+        for key in ("E1", "E2", "E3"):
+            seen.add(key)
+        self.assertEqual(len(seen), 2)
+        self.assertTrue(seen.add("E1"))
+
+
+class TestMongoSeenSet(unittest.TestCase):
+    def setUp(self):
+        self.collection = MagicMock()
+        self.seen = MongoSeenSet(self.collection, ttl=600)
+
+    def test_first_insert_wins(self):
+        self.assertTrue(self.seen.add("E1"))
+        doc = self.collection.insert_one.call_args[0][0]
+        self.assertEqual(doc["_id"], "E1")
+        self.assertGreater(doc["expires_at"], datetime.now(timezone.utc) + timedelta(seconds=590))
+
+    def test_duplicate_key_means_seen_by_another_worker(self):
+        self.collection.insert_one.side_effect = DuplicateKeyError("dup")
+        self.collection.update_one.return_value.modified_count = 0
+        self.assertFalse(self.seen.add("E1"))
+        # เอกสารที่หมดอายุแล้ว (TTL monitor ยังไม่ลบ) นับเป็น event ใหม่
+        self.collection.update_one.return_value.modified_count = 1
+        self.assertTrue(self.seen.add("E1"))
+        query = self.collection.update_one.call_args[0][0]
+        self.assertEqual(query["_id"], "E1")
+        self.assertIn("$lte", query["expires_at"])
+
+
+class TestWebhookQueue(unittest.TestCase):
+    def setUp(self):
+        self.handler = WebhookHandler(SECRET)
+        self.received = []
+        self.done = threading.Semaphore(0)
+
+        @self.handler.add(PostbackEvent)
+        def on_postback(event):
+            self.received.append(event.webhook_event_id)
+            self.done.release()
+
+    def test_events_processed_in_background_and_redeliveries_dropped(self):
+        webhook_queue = WebhookQueue(self.handler, channel_secret=SECRET)
+        body = _body("E1", "E2")
+        self.assertTrue(webhook_queue.accept(body, _sign(body)))
+        # LINE ส่งซ้ำ: E2 ถูกทิ้ง, E3 เป็น event ใหม่
+        body = _body("E2", "E3")
+        self.assertTrue(webhook_queue.accept(body, _sign(body)))
+
+        for _ in range(3):
+            self.assertTrue(self.done.acquire(timeout=2))
+        self.assertEqual(self.received, ["E1", "E2", "E3"])
+
+    def test_dedupe_runs_in_worker_not_in_request(self):
+        gate = threading.Event()
+        seen = MagicMock()
+        seen.add.side_effect = lambda key: gate.wait(2)
+        webhook_queue = WebhookQueue(self.handler, channel_secret=SECRET, seen=seen)
+        body = _body("E1")
+        # ตอบ LINE ได้ทันทีแม้ store ของ event ที่รับแล้วยังไม่ตอบ
+        self.assertTrue(webhook_queue.accept(body, _sign(body)))
+        gate.set()
+
+        self.assertTrue(self.done.acquire(timeout=2))
+        seen.add.assert_called_once_with("E1")
+
+    def test_invalid_signature_rejected_before_enqueue(self):
+        webhook_queue = WebhookQueue(self.handler, channel_secret=SECRET)
+        with self.assertRaises(InvalidSignatureError):
+            webhook_queue.accept(_body("E1"), "bad")
+        self.assertEqual(len(webhook_queue.seen), 0)
+
+    def test_full_queue_allows_redelivery(self):
+        block = threading.Event()
+        started = threading.Event()
+        handler = WebhookHandler(SECRET)
+
+        @handler.add(PostbackEvent)
+        def slow(event):
+            started.set()
+            block.wait(2)
+
+        webhook_queue = WebhookQueue(handler, channel_secret=SECRET, partitions=1, queue_size=1)
+        # worker ถือ E1 อยู่ก่อน: E2 เต็มคิว, E3 เข้าคิวไม่ได้
+        body = _body("E1")
+        self.assertTrue(webhook_queue.accept(body, _sign(body)))
+        self.assertTrue(started.wait(2))
+        body = _body("E2", "E3")
+        self.assertFalse(webhook_queue.accept(body, _sign(body)))
+        # event ที่ไม่ได้เข้าคิวต้องรับได้อีกครั้งเมื่อ LINE ส่งซ้ำ
+        self.assertTrue(webhook_queue.seen.add("E3"))
+        block.set()
+
+
+if __name__ == "__main__":
+    unittest.main()